@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import json
+import random
+import struct
+import logging
+import resource
+import subprocess
+import tracemalloc
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT_DIR, 'src'))
+
+from zarnegar_converter.zar_file import ZarFile
+from zarnegar_converter.convert import get_output_bytes
+
+
+"""
+Peak Memory Benchmark for Zarnegar Converter
+
+Measures the peak memory used for reading and converting synthetic Zar1 files
+of the given size, for every reader and output format, each in a fresh
+process.  Zar1 Binary files are capped at the 64 KiB of text that their header
+can describe.  Reports the `tracemalloc` peak and the growth of the peak RSS, per
+MB of input.  Only the `tracemalloc` peak is checked against the budget, as
+the RSS of a small input depends on the interpreter and the environment.
+"""
+
+
+_USAGE = '''\
+Peak Memory Benchmark for Zarnegar Converter
+
+Usage: %s [--check | --update-budget] [<input-size-mb>]
+
+Arguments:
+  input-size-mb      size of the generated input files (default: %s)
+
+Options:
+  --check            fail if any measurement is above its budget (the budget is
+                     stored for the default input size)
+  --update-budget    store the current measurements, plus headroom, as budget
+'''
+
+_BUDGET_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'memory_budget.json')
+_BUDGET_HEADROOM = 1.25
+
+# Metrics stored in the budget, and checked
+_BUDGET_METRICS = ['peak_per_mb']
+
+_DEFAULT_INPUT_SIZE_MB = 1
+
+_READERS = [
+    'zar1_text',
+    'zar1_binary',
+]
+
+_OUTPUT_FORMATS = [
+    'zar1_text',
+    'unicode_legacy_lro',
+    'unicode_lro',
+    'unicode_rlo',
+    'jsonl',
+]
+
+_BYTES_PER_MB = 1024 * 1024
+
+_BINARY_MAX_TEXT_LEN = 0xFFFF
+
+# Text, as Zar1 words and ASCII/box-drawing runs
+_SAMPLE_WORDS = [
+    b'\xf4\x91\xfe\xa1', b'\x96\x91\xfe\xe4\x91\x93\xa4', b'\xb4\xf9\xa4\x91\x93\xa4\xa2',
+    b'\xfc\xf7\x95\x90\xa6', b'\xa4\xe3\xaa', b'\xa4\xa2', b'\xf8\xee\xfe\x91\xfb',
+    b'|', b'(1)', b'Zarnegar', b'\xc4\xc4\xc4\xc4', b'\x81\x88\x83',
+]
+
+
+# == Input Generation ==
+
+def _generate_lines(input_size):
+    rand = random.Random(0)
+    lines = []
+    size = 0
+    while size < input_size:
+        words = []
+        while sum(map(len, words)) + len(words) < 60:
+            words.append(rand.choice(_SAMPLE_WORDS))
+        line = b' ' * rand.randrange(10) + b' '.join(words)
+        lines.append(line)
+        size += len(line) + 2
+    return lines
+
+def generate_zar1_text(input_size):
+    return b''.join([line + b'\r\n' for line in _generate_lines(input_size)])
+
+def generate_zar1_binary(input_size):
+    # The header has 16-bit text lengths, so the text is capped at 64 KiB,
+    # whatever the input size
+    lines = []
+    total_len = 0
+    for line in _generate_lines(min(input_size, _BINARY_MAX_TEXT_LEN)):
+        line = line.lstrip()
+        if total_len + len(line) > _BINARY_MAX_TEXT_LEN:
+            break
+        lines.append(line)
+        total_len += len(line)
+    data = [
+        b'\x03\xCA\xB1\xF2',
+        struct.pack('<HH10s', len(lines), total_len, b''),
+    ]
+    cumulative_len = 0
+    for line in lines:
+        data.append(struct.pack('<BHB', 0, cumulative_len, len(line)))
+        cumulative_len += len(line)
+    data.extend(lines)
+    return b''.join(data)
+
+_GENERATORS = {
+    'zar1_text': generate_zar1_text,
+    'zar1_binary': generate_zar1_binary,
+}
+
+
+# == Measurement ==
+
+def _get_max_rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, while macOS reports bytes
+    if sys.platform == 'darwin':
+        return max_rss / _BYTES_PER_MB
+    return max_rss / 1024
+
+def measure(reader, output_format, input_size_mb):
+    """
+    Measure one conversion in the current process.
+    """
+    logging.disable(logging.CRITICAL)
+    data = _GENERATORS[reader](int(input_size_mb * _BYTES_PER_MB))
+    input_mb = len(data) / _BYTES_PER_MB
+
+    base_rss_mb = _get_max_rss_mb()
+    tracemalloc.start()
+    zar_file = ZarFile.get(io.BytesIO(data))
+    output = get_output_bytes(output_format, zar_file)
+    result = {
+        'input_mb': input_mb,
+        'output_mb': len(output) / _BYTES_PER_MB,
+        'rss_per_mb': (_get_max_rss_mb() - base_rss_mb) / input_mb,
+        'peak_per_mb': tracemalloc.get_traced_memory()[1] / _BYTES_PER_MB / input_mb,
+    }
+    tracemalloc.stop()
+    return result
+
+def measure_in_subprocess(reader, output_format, input_size_mb):
+    output = subprocess.check_output([
+        sys.executable, os.path.abspath(__file__),
+        '--measure', reader, output_format, str(input_size_mb),
+    ])
+    return json.loads(output.decode('utf8'))
+
+
+# == Budget ==
+
+def _get_key(reader, output_format):
+    return '%s/%s' % (reader, output_format)
+
+def load_budget():
+    if not os.path.exists(_BUDGET_FILENAME):
+        return {}
+    with open(_BUDGET_FILENAME) as budget_file:
+        return json.load(budget_file)
+
+def save_budget(measurements):
+    budget = {}
+    for key, result in sorted(measurements.items()):
+        budget[key] = {
+            metric: round(result[metric] * _BUDGET_HEADROOM, 2)
+            for metric in _BUDGET_METRICS
+            if metric in result
+        }
+    with open(_BUDGET_FILENAME, 'w') as budget_file:
+        json.dump(budget, budget_file, indent=2, sort_keys=True, separators=(',', ': '))
+        budget_file.write('\n')
+
+def get_budget_violations(measurements, budget):
+    violations = []
+    for key, result in sorted(measurements.items()):
+        for metric, limit in sorted(budget.get(key, {}).items()):
+            if metric in _BUDGET_METRICS and metric in result and result[metric] > limit:
+                violations.append((key, metric, result[metric], limit))
+    return violations
+
+
+def main(input_size_mb=_DEFAULT_INPUT_SIZE_MB, check=False, update_budget=False):
+    budget = load_budget()
+    measurements = {}
+
+    print('%-34s %10s %14s %14s' % ('reader/format', 'input MB', 'peak MB/MB', 'RSS MB/MB'))
+    for reader in _READERS:
+        for output_format in _OUTPUT_FORMATS:
+            key = _get_key(reader, output_format)
+            result = measure_in_subprocess(reader, output_format, input_size_mb)
+            measurements[key] = result
+            print('%-34s %10.2f %14s %14.2f' % (
+                key,
+                result['input_mb'],
+                '%.2f' % result['peak_per_mb'],
+                result['rss_per_mb'],
+            ))
+
+    if update_budget:
+        save_budget(measurements)
+        print('Budget updated: %s' % _BUDGET_FILENAME)
+        return 0
+
+    violations = get_budget_violations(measurements, budget)
+    for key, metric, value, limit in violations:
+        print('Over budget: %s %s = %.2f > %.2f' % (key, metric, value, limit))
+    if check and violations:
+        return 1
+    return 0
+
+
+if __name__=='__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['--measure']:
+        print(json.dumps(measure(args[1], args[2], float(args[3]))))
+        exit(0)
+
+    check = '--check' in args
+    update_budget = '--update-budget' in args
+    args = [arg for arg in args if arg not in ('--check', '--update-budget')]
+    if len(args) > 1 or (check and update_budget):
+        sys.stderr.write(_USAGE % (os.path.basename(sys.argv[0]), _DEFAULT_INPUT_SIZE_MB))
+        exit(2)
+    exit(main(float(args[0]) if args else _DEFAULT_INPUT_SIZE_MB, check, update_budget))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT_DIR, 'src'))
+
+from zarnegar_converter import pipeline
+from zarnegar_converter.convert import convert_many
+
+from memory_benchmark import generate_zar1_text
+
+
+"""
+Scheduled Conversion Benchmark for Zarnegar Converter
+
+Measures the time for converting many small files and a few large ones, listed
+last, in a pool of processes, in the listed order with `convert_many()`, and
+the largest first with `pipeline.convert_files_scheduled()`.  In the listed
+order, the large files start last, and run alone at the end.
+"""
+
+
+_USAGE = '''\
+Scheduled Conversion Benchmark for Zarnegar Converter
+
+Usage: %s [<processes> [<small-files-count> [<large-files-count>]]]
+
+Arguments:
+  processes          number of worker processes (default: the number of CPUs)
+  small-files-count  number of files of %d KB (default: %d)
+  large-files-count  number of files of %d KB, listed last (default: %d)
+'''
+
+_SMALL_FILE_SIZE_KB = 16
+_LARGE_FILE_SIZE_KB = 2048
+_DEFAULT_SMALL_FILES_COUNT = 200
+_DEFAULT_LARGE_FILES_COUNT = 2
+
+_OUTPUT_FORMAT = 'unicode_rlo'
+
+
+def generate_files(input_dir, small_files_count, large_files_count):
+    small = generate_zar1_text(_SMALL_FILE_SIZE_KB * 1024)
+    large = generate_zar1_text(_LARGE_FILE_SIZE_KB * 1024)
+    filenames = []
+    for idx, data in enumerate([small] * small_files_count + [large] * large_files_count):
+        filename = os.path.join(input_dir, '%04d.zar' % idx)
+        with open(filename, 'wb') as in_file:
+            in_file.write(data)
+        filenames.append(filename)
+    return filenames
+
+def _read_files(filenames):
+    for filename in filenames:
+        with open(filename, 'rb') as in_file:
+            yield in_file.read()
+
+def measure_listed_order(jobs, processes):
+    start = time.perf_counter()
+    outputs = convert_many(
+        _read_files([in_filename for in_filename, _ in jobs]),
+        _OUTPUT_FORMAT,
+        batch_size=1,
+        processes=processes,
+    )
+    for (_, out_filename), output in zip(jobs, outputs):
+        with open(out_filename, 'wb') as out_file:
+            out_file.write(output)
+    return time.perf_counter() - start
+
+def measure_scheduled(jobs, processes):
+    start = time.perf_counter()
+    pipeline.convert_files_scheduled(jobs, _OUTPUT_FORMAT, processes=processes)
+    return time.perf_counter() - start
+
+
+def main(
+    processes=None,
+    small_files_count=_DEFAULT_SMALL_FILES_COUNT,
+    large_files_count=_DEFAULT_LARGE_FILES_COUNT,
+):
+    logging.disable(logging.CRITICAL)
+    processes = processes or os.cpu_count() or 1
+    temp_dir = tempfile.mkdtemp()
+    try:
+        filenames = generate_files(temp_dir, small_files_count, large_files_count)
+        jobs = [(filename, filename + '.txt') for filename in filenames]
+        print('Python %s, %d CPUs, %d processes' % (
+            sys.version.split()[0], os.cpu_count() or 1, processes,
+        ))
+        print('%d files of %d KB, and %d files of %d KB, as %s' % (
+            small_files_count, _SMALL_FILE_SIZE_KB,
+            large_files_count, _LARGE_FILE_SIZE_KB,
+            _OUTPUT_FORMAT,
+        ))
+        print()
+
+        print('%-16s %10s' % ('order', 'seconds'))
+        print('%-16s %10.2f' % ('listed', measure_listed_order(jobs, processes)))
+        print('%-16s %10.2f' % ('largest first', measure_scheduled(jobs, processes)))
+    finally:
+        shutil.rmtree(temp_dir)
+    return 0
+
+
+if __name__=='__main__':
+    args = sys.argv[1:]
+    if len(args) > 3:
+        sys.stderr.write(_USAGE % (
+            os.path.basename(sys.argv[0]),
+            _SMALL_FILE_SIZE_KB, _DEFAULT_SMALL_FILES_COUNT,
+            _LARGE_FILE_SIZE_KB, _DEFAULT_LARGE_FILES_COUNT,
+        ))
+        exit(2)
+    exit(main(*map(int, args)))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+import logging
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT_DIR, 'src'))
+
+from zarnegar_converter.convert import convert_many
+
+from memory_benchmark import generate_zar1_text, generate_zar1_binary
+
+
+"""
+Parallel Conversion Benchmark for Zarnegar Converter
+
+Measures the throughput of `convert_many()` for many synthetic Zar1 documents,
+sequentially, with a pool of threads, and with a pool of processes, for every
+number of workers up to the number of CPUs.  Threads only scale on
+free-threaded builds of Python.
+"""
+
+
+_USAGE = '''\
+Parallel Conversion Benchmark for Zarnegar Converter
+
+Usage: %s [<documents-count> [<document-size-kb>]]
+
+Arguments:
+  documents-count    number of generated documents (default: %s)
+  document-size-kb   size of every generated document (default: %s)
+'''
+
+_DEFAULT_DOCUMENTS_COUNT = 400
+_DEFAULT_DOCUMENT_SIZE_KB = 16
+
+_OUTPUT_FORMAT = 'unicode_rlo'
+
+# Documents are small, so the batches are too, to spread them over workers
+_BATCH_SIZE = 4
+
+
+def generate_documents(documents_count, document_size):
+    text = generate_zar1_text(document_size)
+    binary = generate_zar1_binary(document_size)
+    return [
+        text if idx % 2 else binary
+        for idx in range(documents_count)
+    ]
+
+def _get_worker_counts():
+    cpu_count = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cpu_count:
+        counts.append(counts[-1] * 2)
+    if cpu_count > 1:
+        counts.append(cpu_count)
+    return counts
+
+def measure(documents, **pool_options):
+    start = time.perf_counter()
+    for _ in convert_many(documents, _OUTPUT_FORMAT, batch_size=_BATCH_SIZE, **pool_options):
+        pass
+    return time.perf_counter() - start
+
+
+def main(documents_count=_DEFAULT_DOCUMENTS_COUNT, document_size_kb=_DEFAULT_DOCUMENT_SIZE_KB):
+    logging.disable(logging.CRITICAL)
+    documents = generate_documents(documents_count, int(document_size_kb * 1024))
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('Python %s, %d CPUs, GIL %s' % (
+        sys.version.split()[0], os.cpu_count() or 1, 'enabled' if is_gil_enabled else 'disabled',
+    ))
+    print('%d documents of %s KB, as %s' % (documents_count, document_size_kb, _OUTPUT_FORMAT))
+    print()
+
+    print('%-16s %10s %12s %10s' % ('mode', 'seconds', 'docs/second', 'speedup'))
+    # Warm up the caches of the conversion tables and compiled code
+    measure(documents[:_BATCH_SIZE])
+    sequential = measure(documents)
+    print('%-16s %10.2f %12.1f %10.2f' % ('sequential', sequential, documents_count / sequential, 1))
+    for pool_option in ('threads', 'processes'):
+        for workers in _get_worker_counts():
+            elapsed = measure(documents, **{pool_option: workers})
+            print('%-16s %10.2f %12.1f %10.2f' % (
+                '%s=%d' % (pool_option, workers),
+                elapsed,
+                documents_count / elapsed,
+                sequential / elapsed,
+            ))
+    return 0
+
+
+if __name__=='__main__':
+    args = sys.argv[1:]
+    if len(args) > 2:
+        sys.stderr.write(_USAGE % (
+            os.path.basename(sys.argv[0]), _DEFAULT_DOCUMENTS_COUNT, _DEFAULT_DOCUMENT_SIZE_KB,
+        ))
+        exit(2)
+    exit(main(int(args[0]) if args else _DEFAULT_DOCUMENTS_COUNT, *map(float, args[1:])))
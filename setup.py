@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # coding: utf-8
 
 # Copyright (C) 2017  Behnam Esfahbod
@@ -43,6 +43,8 @@ setup(
         "Environment :: Console",
         "License :: OSI Approved :: GNU General Public License (GPL)",
         "Natural Language :: Persian",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "Topic :: Software Development :: Internationalization",
         "Topic :: Text Editors",
     ],
@@ -50,6 +52,7 @@ setup(
     include_package_data=True,
     package_data={
         '': ['*.txt', '*.rst'],
+        'zarnegar_converter': ['profiles/*.json'],
     },
     packages=find_packages('src'),
     package_dir={
@@ -58,6 +61,5 @@ setup(
     scripts=[
         "src/zarnegar-converter.py",
     ],
-    test_suite='nose.collector',
-    tests_require=['nose'],
+    python_requires='>=3.6',
 )
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # coding: utf-8
 
 # Copyright (C) 2017  Behnam Esfahbod
@@ -26,9 +26,18 @@ from __future__ import unicode_literals
 
 import sys
 import os
+import json
 import logging
 
+from zarnegar_converter import jobs
+from zarnegar_converter import detect
+from zarnegar_converter import pipeline
+from zarnegar_converter import incremental
+from zarnegar_converter import scan
+from zarnegar_converter import sqlite_export
+from zarnegar_converter import zar1_profile
 from zarnegar_converter.zar_file import ZarFile
+from zarnegar_converter.convert import iter_output_bytes, check_output_encoding, OUTPUT_FORMATS
 
 
 """
@@ -39,61 +48,138 @@ Converter for Zarnegar Encoding and File Format to Unicode Text
 _USAGE = '''\
 Converter for Zarnegar Encoding and File Format to Unicode Text
 
-Usage: %s <output-format> [<input-file> [<output-file> [<log-file>]]]
+Usage: %(script)s [<options>] <output-format> [<input-file> [<output-file> [<log-file>]]]
+       %(script)s sqlite [<options>] <database-file> <input-file>...
+       %(script)s pipeline [<options>] <output-format> <output-dir> <input-file>...
+       %(script)s update [<options>] <output-format> <input-file> <output-file>
+       %(script)s job [<options>] <output-format> <manifest-file> <output-dir> <shard>
+       %(script)s merge <manifest-file> <output-dir>
+       %(script)s detect [<options>] <input-file>...
+       %(script)s scan [<options>] <input-path>...
 
 Arguments:
   output-format      desired output format (see list below)
   input-file         path to input file (default: stdin)
   output-file        path to output file (default: stdout)
   log-file           path to log file (default: stderr)
+  database-file      path to SQLite database file, to add the converted input
+                     files to, with a full-text search index
+  output-dir         path to directory for the output files, named after the
+                     input files
+  manifest-file      path to file listing the input files, one per line
+  input-path         path to input file, or directory of input files
+  shard              shard of the manifest to convert, as k/n for the k-th of n
+                     shards (the output directory keeps a journal of every
+                     shard, to resume after interruptions)
+
+Options:
+  --profile=NAME     mapping profile of the input files, as a profile name
+                     (%(profiles)s) or a profile file name (default: zarnegar)
+  --encoding=NAME    encoding of the Unicode output formats, as a Python codec
+                     name, like utf-16le or cp1256 (default: utf8)
+  --encoding-errors=NAME
+                     handling of characters missing from the output encoding
+                     (strict, replace, or ignore; default: strict)
+
+Pipeline Options:
+  --read-queue=N     number of read files waiting for conversion (default: %(queue_size)d)
+  --write-queue=N    number of converted files waiting for writing (default: %(queue_size)d)
+  --processes=N      convert N files at once in worker processes, the largest
+                     first, instead of overlapping reading, converting, and
+                     writing
+  --memory-budget=MB estimated memory of the files converted at once, with
+                     --processes (default: %(memory_budget_mb)d)
+
+Job Options:
+  --max-files=N      stop after converting N files
+
+Detect Options:
+  --sample-size=N    number of bytes read from every file (default: %(sample_size)d)
+
+Scan Options:
+  --threads=N        number of files scanned in parallel (default: %(scan_threads)d)
 
 Output Formats:
   * unicode_rlo          Unicode Arabic semantic (standard) encoding, in Right-to-Left Override order
   * unicode_lro          Unicode Arabic semantic (standard) encoding, in Left-to-Right Override order
   * unicode_legacy_lro   Legacy Unicoe Arabic Presentation Form encoding, in Right-to-Left Override order
-  * unicode_legacy_rlo   Legacy Unicoe Arabic Presentation Form encoding, in Left-to-Right Override order
   * zar1_text            Zar1 encoded (text file)
+  * jsonl                JSON Lines, with the number, indent, Zar1 bytes (hex), legacy
+                         text, semantic text, and unmapped bytes of every line
 '''
 
 
 
-def get_output_bytes(
-    output_format,
-    zar_file,
-):
-    # Zar1
-    if output_format == 'zar1_text':
-        return zar_file.get_zar1_text_output()
+_ENCODING_OPTION_TYPES = {'encoding': str, 'encoding-errors': str}
+
+_BYTES_PER_MB = 1024 * 1024
 
-    # Unicode Legacy
-    if output_format == 'unicode_legacy_lro':
-        return zar_file.get_unicode_legacy_lro_output().encode('utf8')
-    if output_format == 'unicode_legacy_rlo':
-        return zar_file.get_unicode_legacy_rlo_output().encode('utf8')
 
-    # Unicode Semantic
-    if output_format == 'unicode_lro':
-        return zar_file.get_unicode_lro_output().encode('utf8')
-    if output_format == 'unicode_rlo':
-        return zar_file.get_unicode_rlo_output().encode('utf8')
+def _check_output_format(output_format, output_encoding='utf8', encoding_errors='strict'):
+    if output_format not in OUTPUT_FORMATS:
+        raise UsageError("invalid output format: %s" % output_format)
+    try:
+        check_output_encoding(output_format, output_encoding, encoding_errors)
+    except ValueError as err:
+        raise UsageError(err)
 
-    raise UsageError("invalid output format: %s" % output_format)
+def _get_encoding_options(options):
+    encoding_options = {}
+    if 'encoding' in options:
+        encoding_options['output_encoding'] = options['encoding']
+    if 'encoding_errors' in options:
+        encoding_options['encoding_errors'] = options['encoding_errors']
+    return encoding_options
 
 
 def convert_and_write(
     output_format,
     in_file,
     out_file,
+    profile=None,
+    **encoding_options
 ):
-    zar_file = ZarFile.get(in_file)
-    out_file.write(get_output_bytes(output_format, zar_file))
+    _check_output_format(output_format, **encoding_options)
+    zar_file = ZarFile.get(in_file, profile)
+    for output_bytes in iter_output_bytes(output_format, zar_file, **encoding_options):
+        out_file.write(output_bytes)
+
+
+def _get_binary_stream(std_file):
+    return getattr(std_file, 'buffer', std_file)
+
 
+def _parse_options(args, option_types):
+    """
+    Parse the leading `--name=value` options, and return them with the rest
+    of the arguments.
+    """
+    options = {}
+    while args and args[0].startswith('--'):
+        name, _, value = args[0][2:].partition('=')
+        if name not in option_types or not value:
+            raise UsageError("invalid option: %s" % args[0])
+        try:
+            options[name.replace('-', '_')] = option_types[name](value)
+        except ValueError:
+            raise UsageError("invalid option: %s" % args[0])
+        args = args[1:]
+    return options, args
 
-def main(
+
+def main(*args):
+    options, args = _parse_options(args, dict(_ENCODING_OPTION_TYPES, profile=str))
+    if len(args) < 1 or len(args) > 4:
+        raise UsageError("invalid arguments")
+    _main(*args, profile=options.get('profile'), **_get_encoding_options(options))
+
+def _main(
     output_format,
     in_filename=None,
     out_filename=None,
     log_filename=None,
+    profile=None,
+    **encoding_options
 ):
     logging.basicConfig(level=logging.WARNING)
     if log_filename:
@@ -106,9 +192,9 @@ def main(
     in_file = None
     out_file = None
     try:
-        in_file = open(in_filename, 'r') if in_filename else sys.stdin
-        out_file = open(out_filename, 'w') if out_filename else sys.stdout
-        convert_and_write(output_format, in_file, out_file)
+        in_file = open(in_filename, 'rb') if in_filename else _get_binary_stream(sys.stdin)
+        out_file = open(out_filename, 'wb') if out_filename else _get_binary_stream(sys.stdout)
+        convert_and_write(output_format, in_file, out_file, profile, **encoding_options)
     except IOError:
         if not in_file:
             raise IOError("cannot read from input file: %s" % in_filename)
@@ -121,6 +207,167 @@ def main(
             out_file.close()
 
 
+def main_sqlite(*args):
+    logging.basicConfig(level=logging.WARNING)
+    options, args = _parse_options(args, {'profile': str})
+    if len(args) < 2:
+        raise UsageError("invalid arguments")
+    database_filename, in_filenames = args[0], args[1:]
+    sqlite_export.export_files_to_database(
+        database_filename,
+        in_filenames,
+        profile=options.get('profile'),
+    )
+
+
+def main_pipeline(*args):
+    logging.basicConfig(level=logging.WARNING)
+    options, args = _parse_options(args, dict(
+        _ENCODING_OPTION_TYPES,
+        profile=str,
+        processes=int,
+        **{'read-queue': int, 'write-queue': int, 'memory-budget': int}
+    ))
+    if len(args) < 3:
+        raise UsageError("invalid arguments")
+    output_format, output_dir, in_filenames = args[0], args[1], args[2:]
+    _check_output_format(output_format, **_get_encoding_options(options))
+    jobs = [
+        (in_filename, pipeline.get_output_filename(in_filename, output_dir, output_format))
+        for in_filename in in_filenames
+    ]
+    if options.get('processes', 1) < 1:
+        raise UsageError("invalid option: --processes=%d" % options['processes'])
+    if 'processes' in options or 'memory_budget' in options:
+        pipeline.convert_files_scheduled(
+            jobs,
+            output_format,
+            processes=options.get('processes'),
+            memory_budget=options.get(
+                'memory_budget', pipeline.DEFAULT_MEMORY_BUDGET // _BYTES_PER_MB,
+            ) * _BYTES_PER_MB,
+            profile=options.get('profile'),
+            **_get_encoding_options(options)
+        )
+        return
+    pipeline.convert_files_pipelined(
+        jobs,
+        output_format,
+        read_queue_size=options.get('read_queue', pipeline.DEFAULT_QUEUE_SIZE),
+        write_queue_size=options.get('write_queue', pipeline.DEFAULT_QUEUE_SIZE),
+        profile=options.get('profile'),
+        **_get_encoding_options(options)
+    )
+
+
+def main_update(*args):
+    logging.basicConfig(level=logging.WARNING)
+    options, args = _parse_options(args, dict(_ENCODING_OPTION_TYPES, profile=str))
+    if len(args) != 3:
+        raise UsageError("invalid arguments")
+    output_format, in_filename, out_filename = args
+    _check_output_format(output_format, **_get_encoding_options(options))
+    if output_format not in incremental.OUTPUT_FORMATS:
+        raise UsageError("incremental conversion is not supported for %s" % output_format)
+    reused_count, converted_count = incremental.convert_file_incremental(
+        in_filename,
+        out_filename,
+        output_format,
+        profile=options.get('profile'),
+        **_get_encoding_options(options)
+    )
+    print("%d lines reused, %d converted" % (reused_count, converted_count))
+
+
+def main_job(*args):
+    logging.basicConfig(level=logging.WARNING)
+    options, args = _parse_options(args, dict(
+        _ENCODING_OPTION_TYPES, profile=str, **{'max-files': int}
+    ))
+    if len(args) != 4:
+        raise UsageError("invalid arguments")
+    output_format, manifest_filename, output_dir, shard_spec = args
+    _check_output_format(output_format, **_get_encoding_options(options))
+    try:
+        shard, shards_count = jobs.parse_shard_spec(shard_spec)
+    except jobs.JobError as err:
+        raise UsageError(err)
+    converted_count, skipped_count, failed_count = jobs.run_shard(
+        manifest_filename,
+        output_dir,
+        output_format,
+        shard,
+        shards_count,
+        profile=options.get('profile'),
+        max_files=options.get('max_files'),
+        **_get_encoding_options(options)
+    )
+    print("Shard %d/%d: %d converted, %d skipped, %d failed" % (
+        shard, shards_count, converted_count, skipped_count, failed_count,
+    ))
+    return 3 if failed_count else 0
+
+def main_merge(*args):
+    if len(args) != 2:
+        raise UsageError("invalid arguments")
+    manifest_filename, output_dir = args
+    converted, failed, missing = jobs.merge_journals(manifest_filename, output_dir)
+    print("%d converted, %d failed, %d missing" % (len(converted), len(failed), len(missing)))
+    for path in failed:
+        print("Failed: %s" % path)
+    for path in missing:
+        print("Missing: %s" % path)
+    return 3 if failed or missing else 0
+
+
+def main_detect(*args):
+    logging.basicConfig(level=logging.WARNING)
+    options, args = _parse_options(args, {'sample-size': int})
+    if len(args) < 1:
+        raise UsageError("invalid arguments")
+    failed_count = 0
+    for in_filename in args:
+        try:
+            detection = detect.detect_filename(
+                in_filename,
+                options.get('sample_size', detect.DEFAULT_SAMPLE_SIZE),
+            )
+        except IOError as err:
+            logging.error('zar_detect: cannot read %s: %s', in_filename, err)
+            failed_count += 1
+            continue
+        print("%s\t%s\t%.2f" % (in_filename, detection.guess, detection.confidence))
+    return 3 if failed_count else 0
+
+def main_scan(*args):
+    logging.basicConfig(level=logging.WARNING)
+    options, args = _parse_options(args, {'threads': int})
+    if len(args) < 1:
+        raise UsageError("invalid arguments")
+
+    def iter_printed(metadatas):
+        for metadata in metadatas:
+            print(json.dumps(metadata))
+            yield metadata
+
+    totals = scan.get_totals(iter_printed(
+        scan.scan_files(args, options.get('threads', scan.DEFAULT_THREADS)),
+    ))
+    print(json.dumps({'totals': totals}))
+    return 3 if totals['errors_count'] else 0
+
+
+_MODES = {
+    'sqlite': main_sqlite,
+    'pipeline': main_pipeline,
+    'update': main_update,
+    'job': main_job,
+    'merge': main_merge,
+    'detect': main_detect,
+    'scan': main_scan,
+}
+
+
 class UsageError (Exception):
     pass
 
@@ -130,12 +377,19 @@ def error(err_file, err):
     err_file.write(os.linesep)
 
 def usage(err_file, script_name):
-    err_file.write(_USAGE % script_name)
+    err_file.write(_USAGE % {
+        'script': script_name,
+        'queue_size': pipeline.DEFAULT_QUEUE_SIZE,
+        'memory_budget_mb': pipeline.DEFAULT_MEMORY_BUDGET // _BYTES_PER_MB,
+        'sample_size': detect.DEFAULT_SAMPLE_SIZE,
+        'scan_threads': scan.DEFAULT_THREADS,
+        'profiles': ', '.join(zar1_profile.get_profile_names()),
+    })
 
 if __name__=='__main__':
     try:
-        if len(sys.argv) < 2 or len(sys.argv) > 5:
-            raise UsageError("invalid arguments")
+        if len(sys.argv) >= 2 and sys.argv[1] in _MODES:
+            exit(_MODES[sys.argv[1]](*sys.argv[2:]) or 0)
         main(*sys.argv[1:])
 
     except UsageError as err:
@@ -146,3 +400,15 @@ if __name__=='__main__':
     except IOError as err:
         error(sys.stderr, err)
         exit(2)
+
+    except jobs.JobError as err:
+        error(sys.stderr, err)
+        exit(2)
+
+    except zar1_profile.ProfileError as err:
+        error(sys.stderr, err)
+        exit(2)
+
+    except UnicodeEncodeError as err:
+        error(sys.stderr, "cannot write in the output encoding: %s" % err)
+        exit(2)
@@ -0,0 +1,363 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import codecs
+import functools
+import itertools
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from zarnegar_converter import unicode_bidi
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.zar1_profile import get_profile
+from zarnegar_converter.zar_file import ZarFile, OUTPUT_NEW_LINE_TEXT
+
+
+"""
+Convert Zarnegar Files and Documents to the Output Formats
+
+All conversion functions are reentrant: they keep their state in local
+variables and in the objects they create, and only read the module-level
+tables.  They can be called from many threads at the same time, as long as
+every `ZarFile` object is used by one thread at a time.
+"""
+
+
+OUTPUT_FORMATS = [
+    'unicode_rlo',
+    'unicode_lro',
+    'unicode_legacy_lro',
+    'zar1_text',
+    'jsonl',
+]
+
+_OUTPUT_EXTENSIONS = {
+    'zar1_text': '.zar',
+    'jsonl': '.jsonl',
+}
+
+# Formats with a fixed encoding: Zar1 bytes, and UTF-8 JSON
+_BINARY_OUTPUT_FORMATS = ['zar1_text', 'jsonl']
+
+DEFAULT_OUTPUT_ENCODING = 'utf8'
+
+_DEFAULT_BATCH_SIZE = 100
+
+
+def get_output_extension(output_format):
+    return _OUTPUT_EXTENSIONS.get(output_format, '.txt')
+
+def check_output_encoding(output_format, output_encoding, encoding_errors='strict'):
+    """
+    Raise ValueError if the output format is unknown, or cannot be written in
+    the encoding.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("invalid output format: %s" % output_format)
+    try:
+        codec_name = codecs.lookup(output_encoding).name
+    except LookupError:
+        raise ValueError("unknown output encoding: %s" % output_encoding)
+    try:
+        codecs.lookup_error(encoding_errors)
+    except LookupError:
+        raise ValueError("unknown encoding error handler: %s" % encoding_errors)
+    if output_format in _BINARY_OUTPUT_FORMATS and codec_name != 'utf-8':
+        raise ValueError("output format %s is only available in UTF-8" % output_format)
+
+
+# == Output Encodings ==
+
+@functools.lru_cache(maxsize=None)
+def _get_direct_legacy_table(decoding_table, output_encoding, encoding_errors):
+    """
+    Return a `bytes.translate()` table from Zar1 bytes straight to the
+    encoded legacy characters, with the encoded LRO prefix and the bytes of
+    the trailing space characters, or None if the encoding is not single-byte.
+    """
+    try:
+        prefix = unicode_bidi.LRO_CHAR.encode(output_encoding, encoding_errors)
+        encoded_chars = [
+            char.encode(output_encoding, encoding_errors)
+            for char in decoding_table
+        ]
+    except UnicodeEncodeError:
+        return None
+    if any(len(encoded_char) != 1 for encoded_char in encoded_chars):
+        return None
+    space_bytes = bytes([
+        byte for byte, char in enumerate(decoding_table) if char.isspace()
+    ])
+    return b''.join(encoded_chars), prefix, space_bytes
+
+def _has_direct_output(output_format, profile, output_encoding, encoding_errors):
+    return output_format == 'unicode_legacy_lro' and _get_direct_legacy_table(
+        profile.decoding_table, output_encoding, encoding_errors,
+    ) is not None
+
+def _get_direct_legacy_lro_output(zar_file, output_encoding, encoding_errors):
+    direct_table = _get_direct_legacy_table(
+        zar_file.profile.decoding_table, output_encoding, encoding_errors,
+    )
+    if direct_table is None:
+        return None
+    table, prefix, space_bytes = direct_table
+    new_line = OUTPUT_NEW_LINE_TEXT.encode(output_encoding, encoding_errors)
+
+    # Lines with unmapped bytes go through the text conversion, which reports
+    # them
+    output = []
+    for line_no, zar1_line in enumerate(zar_file.get_zar1_text_lines(), start=1):
+        if zar_file.profile.has_unmapped_zar_bytes(zar1_line):
+            unicode_line = zar1_encoding.convert_zar1_line_to_unicode_legacy_lro(
+                zar1_line, line_no, zar_file.profile,
+            )
+            output.append(unicode_line.rstrip().encode(output_encoding, encoding_errors))
+        else:
+            output.append(prefix + zar1_line.rstrip(space_bytes).translate(table))
+        output.append(new_line)
+    return b''.join(output)
+
+
+def get_output_bytes(
+    output_format,
+    zar_file,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Return the output, with the text formats in `output_encoding`.  Legacy
+    text in single-byte encodings is translated straight from the Zar1 bytes.
+    """
+    # Zar1
+    if output_format == 'zar1_text':
+        return zar_file.get_zar1_text_output()
+
+    # Unicode Legacy
+    if output_format == 'unicode_legacy_lro':
+        output = _get_direct_legacy_lro_output(zar_file, output_encoding, encoding_errors)
+        if output is not None:
+            return output
+        return zar_file.get_unicode_legacy_lro_output().encode(output_encoding, encoding_errors)
+
+    # Unicode Semantic
+    if output_format == 'unicode_lro':
+        return zar_file.get_unicode_lro_output().encode(output_encoding, encoding_errors)
+    if output_format == 'unicode_rlo':
+        return zar_file.get_unicode_rlo_output().encode(output_encoding, encoding_errors)
+
+    # JSON Lines
+    if output_format == 'jsonl':
+        return b''.join(iter_output_bytes(output_format, zar_file))
+
+    raise ValueError("invalid output format: %s" % output_format)
+
+def iter_output_bytes(
+    output_format,
+    zar_file,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Yield the output in chunks.  Streaming formats are generated one line at a
+    time.
+    """
+    if output_format == 'jsonl':
+        for record in zar_file.iter_line_records():
+            yield get_json_line(record)
+        return
+
+    yield get_output_bytes(output_format, zar_file, output_encoding, encoding_errors)
+
+def get_json_line(record):
+    """
+    Return a line record as a line of the `jsonl` output, with its new-line.
+    """
+    json_line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+    return json_line.encode('utf8') + b'\n'
+
+
+# == Batch Conversion ==
+
+# Converters of a Zar1 line to the Unicode formats, taking the line, its line
+# number, and the compiled profile
+LINE_CONVERTERS = {
+    'unicode_legacy_lro': zar1_encoding.convert_zar1_line_to_unicode_legacy_lro,
+    'unicode_lro': zar1_encoding.convert_zar1_line_to_unicode_lro,
+    'unicode_rlo': zar1_encoding.convert_zar1_line_to_unicode_rlo,
+}
+
+
+class _CachedLineConverter(object):
+    """
+    Converts Zar1 lines, reusing the result for the lines already seen in the
+    batch.  Lines with unmapped bytes are always converted, so the errors are
+    reported for every line.
+    """
+
+    def __init__(self, convert_line, profile):
+        self._convert_line = convert_line
+        self._profile = profile
+        self._cache = {}
+
+    def __call__(self, zar1_line, line_no):
+        unicode_line = self._cache.get(zar1_line)
+        if unicode_line is None:
+            unicode_line = self._convert_line(zar1_line, line_no, self._profile)
+            if not self._profile.has_unmapped_zar_bytes(zar1_line):
+                self._cache[zar1_line] = unicode_line
+        return unicode_line
+
+
+def convert_batch(batch):
+    """
+    Convert a batch, a tuple of the documents (bytes), the output format, the
+    compiled profile, the output encoding, and the encoding errors handling,
+    and return the outputs of the documents.
+    """
+    documents, output_format, profile, output_encoding, encoding_errors = batch
+    if output_format not in LINE_CONVERTERS or _has_direct_output(*batch[1:]):
+        return [
+            get_output_bytes(
+                output_format,
+                ZarFile.from_bytes(data, profile),
+                output_encoding,
+                encoding_errors,
+            )
+            for data in documents
+        ]
+
+    convert_line = _CachedLineConverter(LINE_CONVERTERS[output_format], profile)
+    results = []
+    for data in documents:
+        zar_file = ZarFile.from_bytes(data)
+        results.append(''.join([
+            convert_line(zar1_line, line_no).rstrip() + OUTPUT_NEW_LINE_TEXT
+            for line_no, zar1_line in enumerate(zar_file.get_zar1_text_lines(), start=1)
+        ]).encode(output_encoding, encoding_errors))
+    return results
+
+def _iter_batches(documents, batch_size, *options):
+    # Other bytes-like documents, like bytearray and memoryview, are copied to
+    # bytes, as lines are hashed, and parsed with bytes methods
+    documents = map(bytes, documents)
+    while True:
+        batch = list(itertools.islice(documents, batch_size))
+        if not batch:
+            return
+        yield (batch,) + options
+
+
+def _iter_thread_results(batches, threads):
+    # Only a few batches are queued ahead of the results, so the documents
+    # are not all read into memory
+    executor = ThreadPoolExecutor(threads)
+    pending = collections.deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(convert_batch, batch))
+            if len(pending) > 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def convert_bytes(
+    data,
+    output_format,
+    profile=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+    limits=None,
+):
+    """
+    Convert a Zar1 binary or text document, given as bytes.  Untrusted
+    documents can be parsed with `limits` (see `zar_file.ParseLimits`).
+    """
+    return get_output_bytes(
+        output_format,
+        ZarFile.from_bytes(data, profile, limits),
+        output_encoding,
+        encoding_errors,
+    )
+
+def convert_many(
+    documents,
+    output_format,
+    batch_size=_DEFAULT_BATCH_SIZE,
+    processes=None,
+    threads=None,
+    profile=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Convert Zar1 binary or text documents, given as an iterable of bytes (or
+    other bytes-like objects), and yield the converted documents in the same
+    order.
+
+    Documents are converted in batches of `batch_size`, sharing the converted
+    lines between the documents of each batch.  If `processes` is set, batches
+    are converted in parallel by a pool of that many worker processes, which
+    get the documents and return the outputs through shared memory (see
+    `process_pool`), and if `threads` is set, by a pool of that many threads
+    instead.  Threads avoid copying the documents at all, but only run in
+    parallel on free-threaded builds of Python.
+
+    All documents are converted with the mapping `profile` (see
+    `zar1_profile`), which is compiled once for all batches, and written in
+    `output_encoding` (see `get_output_bytes()`).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("invalid output format: %s" % output_format)
+    if processes and threads:
+        raise ValueError("cannot use both processes and threads")
+    check_output_encoding(output_format, output_encoding, encoding_errors)
+
+    profile = get_profile(profile)
+    batches = _iter_batches(
+        documents, batch_size, output_format, profile, output_encoding, encoding_errors,
+    )
+    if threads:
+        for results in _iter_thread_results(batches, threads):
+            for result in results:
+                yield result
+        return
+    if not processes:
+        for batch in batches:
+            for result in convert_batch(batch):
+                yield result
+        return
+
+    # Imported only here, so the shared memory modules are not loaded for
+    # conversions in one process
+    from zarnegar_converter import process_pool
+    for results in process_pool.iter_process_results(convert_batch, batches, processes):
+        for result in results:
+            yield result
@@ -0,0 +1,189 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import re
+import codecs
+
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.zar_file import PeekableFile, get_file_type, get_magic_size
+from zarnegar_converter.zar1_file import Zar1BinaryFile
+
+
+"""
+Detect the Encoding of Zarnegar and Related Files
+
+Guesses the kind of a file from a sample of its first bytes, to triage many
+files before converting them.  Zar1 binary files are recognized by their magic
+number.  Other files are scored by the bytes they use:
+
+* Zar1 text and Iran System files share the letters, and only differ in the
+  Zarnegar overrides, which are box-drawing characters in Iran System.  An
+  override byte next to a letter byte is taken as Zarnegar (a diacritic or a
+  quotation mark), and a box-drawing byte without a Zarnegar override as Iran
+  System.
+
+* Files without any bytes above 0x7F are plain ASCII, and valid UTF-8 files
+  with non-ASCII characters are Unicode text.
+
+* Files with many control bytes are not text, and their kind is unknown.
+"""
+
+
+DEFAULT_SAMPLE_SIZE = 4096
+
+GUESS_ZAR1_BINARY = 'zar1_binary'
+GUESS_ZAR1_TEXT = 'zar1_text'
+GUESS_IRAN_SYSTEM = 'iran_system'
+GUESS_ASCII = 'ascii'
+GUESS_UTF8 = 'utf8'
+GUESS_UNKNOWN = 'unknown'
+
+# Mapping profiles to convert the files of every guess with
+_GUESS_PROFILES = {
+    GUESS_ZAR1_BINARY: 'zarnegar',
+    GUESS_ZAR1_TEXT: 'zarnegar',
+    GUESS_IRAN_SYSTEM: 'iran_system',
+    GUESS_ASCII: 'zarnegar',
+}
+
+# Samples with a smaller ratio of text bytes are not text
+_MIN_TEXT_RATIO = 0.98
+
+
+# == Byte Classes ==
+
+def _get_byte_class(predicate):
+    return bytes([byte for byte in range(0x100) if predicate(byte)])
+
+def _is_arabic_codepoint(codepoint):
+    return 0x0600 <= codepoint <= 0x06FF or 0xFB50 <= codepoint <= 0xFEFF
+
+def _is_box_drawing_codepoint(codepoint):
+    return 0x2500 <= codepoint <= 0x259F
+
+_OVERRIDES_MAP = zar1_encoding.ZARNEGAR_OVERRIDES_MAP
+_IRAN_SYSTEM_MAP = zar1_encoding.IRAN_SYSTEM_MAP
+
+_LETTER_BYTES = _get_byte_class(lambda byte: (
+    byte not in _OVERRIDES_MAP
+    and _is_arabic_codepoint(_IRAN_SYSTEM_MAP.get(byte, byte))
+))
+_OVERRIDE_CONTROL_BYTES = _get_byte_class(lambda byte: (
+    byte < 0x20 and _OVERRIDES_MAP.get(byte, byte) != byte
+))
+_OVERRIDE_HIGH_BYTES = _get_byte_class(lambda byte: byte >= 0x80 and byte in _OVERRIDES_MAP)
+_BOX_DRAWING_ONLY_BYTES = _get_byte_class(lambda byte: (
+    byte not in _OVERRIDES_MAP
+    and _is_box_drawing_codepoint(_IRAN_SYSTEM_MAP.get(byte, byte))
+))
+_HIGH_BYTES = _get_byte_class(lambda byte: byte >= 0x80)
+_TEXT_CONTROL_BYTES = b'\t\n\x0c\r\x1a'
+_NON_TEXT_BYTES = _get_byte_class(lambda byte: (
+    (byte < 0x20 or byte == 0x7F)
+    and byte not in _TEXT_CONTROL_BYTES
+    and byte not in _OVERRIDE_CONTROL_BYTES
+))
+
+_OVERRIDE_NEXT_TO_LETTER_RE = re.compile(b'(?<=[%s])[%s]|[%s](?=[%s])' % (
+    re.escape(_LETTER_BYTES),
+    re.escape(_OVERRIDE_HIGH_BYTES),
+    re.escape(_OVERRIDE_HIGH_BYTES),
+    re.escape(_LETTER_BYTES),
+))
+
+def _count_bytes(sample, byte_class):
+    return len(sample) - len(sample.translate(None, byte_class))
+
+
+# == Detection ==
+
+class Detection(object):
+
+    def __init__(self, guess, confidence):
+        self.guess = guess
+        self.confidence = confidence
+
+    @property
+    def profile(self):
+        """
+        Name of the mapping profile to convert the file with, or None if the
+        file is not in a Zarnegar or related encoding.
+        """
+        return _GUESS_PROFILES.get(self.guess)
+
+    def __repr__(self):
+        return 'Detection(%r, %.2f)' % (self.guess, self.confidence)
+
+
+def _get_utf8_chars_count(sample):
+    # The sample may end in the middle of a character
+    try:
+        text = codecs.getincrementaldecoder('utf8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return None
+    return len(text) - len(text.encode('ascii', 'ignore'))
+
+def detect_bytes(sample):
+    """
+    Return the detection of a file from a sample of its first bytes, with a
+    confidence between 0 and 1.
+    """
+    if not sample:
+        return Detection(GUESS_UNKNOWN, 0.0)
+    if get_file_type(sample[:get_magic_size()]) is Zar1BinaryFile:
+        return Detection(GUESS_ZAR1_BINARY, 1.0)
+
+    text_ratio = 1 - _count_bytes(sample, _NON_TEXT_BYTES) / len(sample)
+    if text_ratio < _MIN_TEXT_RATIO:
+        return Detection(GUESS_UNKNOWN, min(1.0, (1 - text_ratio) / (2 * (1 - _MIN_TEXT_RATIO))))
+    if not _count_bytes(sample, _HIGH_BYTES):
+        return Detection(GUESS_ASCII, text_ratio)
+
+    utf8_chars_count = _get_utf8_chars_count(sample)
+    if utf8_chars_count:
+        # Legacy text is very unlikely to be valid UTF-8 by accident
+        return Detection(GUESS_UTF8, text_ratio * (1 - 0.5 ** utf8_chars_count))
+
+    zarnegar_evidence = (
+        len(_OVERRIDE_NEXT_TO_LETTER_RE.findall(sample))
+        + _count_bytes(sample, _OVERRIDE_CONTROL_BYTES)
+    )
+    iran_system_evidence = _count_bytes(sample, _BOX_DRAWING_ONLY_BYTES)
+    zarnegar_share = (zarnegar_evidence + 1) / (zarnegar_evidence + iran_system_evidence + 2)
+    if zarnegar_share >= 0.5:
+        return Detection(GUESS_ZAR1_TEXT, text_ratio * zarnegar_share)
+    return Detection(GUESS_IRAN_SYSTEM, text_ratio * (1 - zarnegar_share))
+
+def detect_file(in_file, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Return the detection of a binary file, reading at most `sample_size`
+    bytes.  A `PeekableFile` is not advanced, so it can be converted after.
+    """
+    if isinstance(in_file, PeekableFile):
+        return detect_bytes(in_file.peek(sample_size))
+    return detect_bytes(in_file.read(sample_size))
+
+def detect_filename(filename, sample_size=DEFAULT_SAMPLE_SIZE):
+    with open(filename, 'rb') as in_file:
+        return detect_file(in_file, sample_size)
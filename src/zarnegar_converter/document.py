@@ -0,0 +1,254 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import mmap
+import array
+import struct
+import itertools
+
+from zarnegar_converter import convert
+from zarnegar_converter import zar1_codec  # Registers the Zar1 codecs
+from zarnegar_converter.convert import check_output_encoding, DEFAULT_OUTPUT_ENCODING
+from zarnegar_converter.output import LineEncoder, write_file_atomic
+from zarnegar_converter.zar_file import ZarFile
+
+
+"""
+Converted Documents, Indexed by Line
+
+A `ConvertedDocument` holds the output of a conversion in one contiguous
+buffer, the same bytes as `convert.get_output_bytes()`, with the offsets of
+its lines, so any line or range of lines is served as a `memoryview` of the
+buffer, without splitting or copying the output.
+
+Documents are saved in one file, with the index before the buffer, and loaded
+with `mmap`, so both are read from the page cache on demand:
+
+    magic (8 bytes) | header | line offsets (8 bytes each) | output buffer
+"""
+
+
+_FILE_MAGIC = b'ZARDOC1\x00'
+
+_FILE_HEADER_FMT = (
+    '<' + # Little-Endian
+    'Q' + # Lines Count
+    'Q' + # Buffer Offset
+    'Q' + # Buffer Size
+    'I' + # New-Line Size
+    '32s' # Output Encoding (ASCII, zero-padded)
+)
+_file_header_struct = struct.Struct(_FILE_HEADER_FMT)
+
+# Line offsets are 8-byte aligned in the file, for `memoryview.cast()`
+_FILE_INDEX_OFFSET = (len(_FILE_MAGIC) + _file_header_struct.size + 7) // 8 * 8
+
+_OFFSET_TYPECODE = 'Q'
+
+# Encoding of the lines of `zar1_text` documents, for `get_text()`
+_ZAR1_TEXT_ENCODING = 'zar1_legacy'
+
+
+class DocumentFileError(Exception):
+    pass
+
+
+class ConvertedDocument(object):
+
+    def __init__(self, buffer, offsets, new_line_size, output_encoding=DEFAULT_OUTPUT_ENCODING):
+        """
+        Wrap an output buffer, and the offsets of its lines, with the end of
+        the last line as the last offset.  Lines end with a new-line of
+        `new_line_size` bytes.
+        """
+        self._buffer = memoryview(buffer)
+        self._offsets = offsets
+        self._new_line_size = new_line_size
+        self.output_encoding = output_encoding
+        self._mmap = None
+
+    @classmethod
+    def from_zar_file(
+        cls,
+        zar_file,
+        output_format,
+        output_encoding=DEFAULT_OUTPUT_ENCODING,
+        encoding_errors='strict',
+    ):
+        if output_format not in convert.OUTPUT_FORMATS:
+            raise ValueError("invalid output format: %s" % output_format)
+        check_output_encoding(output_format, output_encoding, encoding_errors)
+        line_encoder = LineEncoder(output_format, zar_file.profile, output_encoding, encoding_errors)
+        new_line = line_encoder.new_line
+
+        chunks = [line_encoder.preamble]
+        lengths = [len(line_encoder.preamble)]
+        for line_no, zar1_line in enumerate(zar_file.get_zar1_text_lines(), start=1):
+            line = line_encoder.encode(zar1_line, line_no)
+            chunks.append(line)
+            chunks.append(new_line)
+            lengths.append(len(line) + len(new_line))
+        offsets = array.array(_OFFSET_TYPECODE, itertools.accumulate(lengths))
+        if output_format == 'zar1_text':
+            output_encoding = _ZAR1_TEXT_ENCODING
+        return cls(b''.join(chunks), offsets, len(new_line), output_encoding)
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data,
+        output_format,
+        profile=None,
+        output_encoding=DEFAULT_OUTPUT_ENCODING,
+        encoding_errors='strict',
+    ):
+        """
+        Convert a Zar1 binary or text document, given as bytes.
+        """
+        return cls.from_zar_file(
+            ZarFile.from_bytes(data, profile),
+            output_format,
+            output_encoding,
+            encoding_errors,
+        )
+
+    # == Lines ==
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    @property
+    def output(self):
+        return self._buffer
+
+    def get_line(self, line_no):
+        """
+        Return a line, without its new-line, by its (1-based) number.
+        """
+        if not 1 <= line_no <= len(self):
+            raise IndexError("line number out of range: %d" % line_no)
+        return self._buffer[self._offsets[line_no - 1]:self._offsets[line_no] - self._new_line_size]
+
+    def get_lines(self, first_line_no, last_line_no):
+        """
+        Return a range of lines, with their new-lines, by the (1-based)
+        numbers of the first and the last line.
+        """
+        if not 1 <= first_line_no <= last_line_no + 1 <= len(self) + 1:
+            raise IndexError("line range out of range: %d-%d" % (first_line_no, last_line_no))
+        return self._buffer[self._offsets[first_line_no - 1]:self._offsets[last_line_no]]
+
+    def get_text(self, line_no):
+        """
+        Return a line, decoded from the output encoding.
+        """
+        return str(self.get_line(line_no), self.output_encoding)
+
+    # == Files ==
+
+    def save(self, filename):
+        """
+        Write the document to a file, replacing it atomically.
+        """
+        offsets = array.array(_OFFSET_TYPECODE, self._offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        index = offsets.tobytes()
+        buffer_offset = _FILE_INDEX_OFFSET + len(index)
+        header = _FILE_MAGIC + _file_header_struct.pack(
+            len(self),
+            buffer_offset,
+            len(self._buffer),
+            self._new_line_size,
+            self.output_encoding.encode('ascii'),
+        )
+
+        write_file_atomic(filename, [
+            header.ljust(_FILE_INDEX_OFFSET, b'\x00'),
+            index,
+            self._buffer,
+        ])
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Open a saved document with `mmap`.  The lines are served from the
+        mapping until the document is closed.
+        """
+        with io.open(filename, 'rb') as in_file:
+            if os.fstat(in_file.fileno()).st_size < _FILE_INDEX_OFFSET:
+                raise DocumentFileError("Not a converted document file: %s" % filename)
+            mapping = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls._from_mapping(mapping, filename)
+        except Exception:
+            mapping.close()
+            raise
+
+    @classmethod
+    def _from_mapping(cls, mapping, filename):
+        if mapping[:len(_FILE_MAGIC)] != _FILE_MAGIC:
+            raise DocumentFileError("Not a converted document file: %s" % filename)
+        lines_count, buffer_offset, buffer_size, new_line_size, output_encoding = (
+            _file_header_struct.unpack_from(mapping, len(_FILE_MAGIC))
+        )
+        index_end = _FILE_INDEX_OFFSET + (lines_count + 1) * 8
+        if index_end != buffer_offset or buffer_offset + buffer_size > len(mapping):
+            raise DocumentFileError("Truncated converted document file: %s" % filename)
+
+        view = memoryview(mapping)
+        if sys.byteorder == 'little':
+            offsets = view[_FILE_INDEX_OFFSET:index_end].cast(_OFFSET_TYPECODE)
+        else:
+            offsets = array.array(_OFFSET_TYPECODE, view[_FILE_INDEX_OFFSET:index_end].tobytes())
+            offsets.byteswap()
+        document = cls(
+            view[buffer_offset:buffer_offset + buffer_size],
+            offsets,
+            new_line_size,
+            output_encoding.rstrip(b'\x00').decode('ascii'),
+        )
+        document._mmap = mapping
+        return document
+
+    def close(self):
+        """
+        Release the buffer, and the mapping of a loaded document.  The lines
+        returned before must be released first.
+        """
+        self._buffer.release()
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
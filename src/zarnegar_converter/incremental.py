@@ -0,0 +1,227 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import json
+import array
+import codecs
+import struct
+import hashlib
+
+from zarnegar_converter import unicode_arabic
+from zarnegar_converter.convert import check_output_encoding, DEFAULT_OUTPUT_ENCODING
+from zarnegar_converter.output import LineEncoder, write_file_atomic, LINE_OUTPUT_FORMATS
+from zarnegar_converter.zar1_profile import get_profile
+from zarnegar_converter.zar_file import ZarFile
+
+
+"""
+Incremental Reconversion of Edited Documents
+
+Next to every output file, a lines file keeps the hash of every Zar1 line of
+the input, and the size of its output.  When the edited input is converted
+again, only the lines that are new or changed are converted, and the output of
+the other lines is copied from the previous output:
+
+    magic (8 bytes) | header | line hashes (16 bytes each) | output sizes (8 bytes each)
+
+The header has a digest of the conversion options, including the mapping
+profile, so the output is converted again in full when they change.  Lines with unmapped bytes are always
+converted, so their errors are reported every time.
+"""
+
+
+LINES_FILENAME_SUFFIX = '.lines'
+
+_FILE_MAGIC = b'ZARLIN1\x00'
+
+_FILE_HEADER_FMT = (
+    '<' + # Little-Endian
+    'Q' + # Lines Count
+    'Q' + # Output Size
+    '20s' # Options Digest
+)
+_file_header_struct = struct.Struct(_FILE_HEADER_FMT)
+
+_HASH_SIZE = 16
+
+_SIZE_TYPECODE = 'Q'
+
+# Version of the line conversion, to be increased whenever the output of a line
+# changes for the same options
+_CONVERSION_VERSION = 1
+
+_SEMANTIC_TABLE_DIGEST = hashlib.sha1(json.dumps(
+    sorted(unicode_arabic.LEGACY_TO_SEMANTIC_TABLE.items())
+).encode('utf8')).hexdigest()
+
+OUTPUT_FORMATS = LINE_OUTPUT_FORMATS
+
+# Formats with the line number in the output of every line, reused only for
+# the lines that did not move
+_POSITIONAL_OUTPUT_FORMATS = ['jsonl']
+
+
+def get_lines_filename(out_filename):
+    return out_filename + LINES_FILENAME_SUFFIX
+
+def _get_line_hash(zar1_line):
+    return hashlib.blake2b(zar1_line, digest_size=_HASH_SIZE).digest()
+
+def _get_options_digest(output_format, profile, output_encoding, encoding_errors):
+    # The profile digest covers its decoding table and unmapped bytes, which
+    # decide the lines converted every time
+    options = [
+        _CONVERSION_VERSION,
+        output_format,
+        profile.digest,
+        _SEMANTIC_TABLE_DIGEST,
+        codecs.lookup(output_encoding).name,
+        encoding_errors,
+    ]
+    return hashlib.sha1(json.dumps(options).encode('utf8')).digest()
+
+
+# == Lines Files ==
+
+def _read_lines_file(lines_filename, options_digest):
+    """
+    Return the line hashes and output sizes of the previous conversion, and
+    its output size, or None if there is no valid lines file for the same
+    options.
+    """
+    try:
+        with io.open(lines_filename, 'rb') as lines_file:
+            data = lines_file.read()
+    except IOError:
+        return None
+    header_size = len(_FILE_MAGIC) + _file_header_struct.size
+    if data[:len(_FILE_MAGIC)] != _FILE_MAGIC or len(data) < header_size:
+        return None
+    lines_count, output_size, digest = _file_header_struct.unpack_from(data, len(_FILE_MAGIC))
+    sizes_offset = header_size + lines_count * _HASH_SIZE
+    if digest != options_digest or len(data) != sizes_offset + lines_count * 8:
+        return None
+
+    hashes = [
+        data[offset:offset + _HASH_SIZE]
+        for offset in range(header_size, sizes_offset, _HASH_SIZE)
+    ]
+    sizes = array.array(_SIZE_TYPECODE, data[sizes_offset:])
+    if sys.byteorder != 'little':
+        sizes.byteswap()
+    return hashes, sizes, output_size
+
+def _remove_file(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+# == Reconversion ==
+
+def _get_previous_lines(out_filename, lines_filename, options_digest, is_positional):
+    """
+    Return the output of every previous line, with its new-line, by its hash
+    (and its line number, for positional formats).
+    """
+    previous = _read_lines_file(lines_filename, options_digest)
+    if previous is None:
+        return {}
+    hashes, sizes, output_size = previous
+    try:
+        with io.open(out_filename, 'rb') as out_file:
+            output = memoryview(out_file.read())
+    except IOError:
+        return {}
+    if len(output) != output_size or sum(sizes) > output_size:
+        return {}
+
+    previous_lines = {}
+    offset = output_size - sum(sizes)
+    for line_no, (line_hash, size) in enumerate(zip(hashes, sizes), start=1):
+        key = (line_no, line_hash) if is_positional else line_hash
+        previous_lines.setdefault(key, output[offset:offset + size])
+        offset += size
+    return previous_lines
+
+def convert_file_incremental(
+    in_filename,
+    out_filename,
+    output_format,
+    profile=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Convert a file, reusing the output of the lines not changed since the
+    previous conversion to the same output file.  The output is the same as
+    of a full conversion.
+
+    Returns the numbers of reused and converted lines.
+    """
+    check_output_encoding(output_format, output_encoding, encoding_errors)
+    profile = get_profile(profile)
+    line_encoder = LineEncoder(output_format, profile, output_encoding, encoding_errors)
+    with io.open(in_filename, 'rb') as in_file:
+        zar1_lines = ZarFile.get(in_file, profile).get_zar1_text_lines()
+
+    lines_filename = get_lines_filename(out_filename)
+    options_digest = _get_options_digest(output_format, profile, output_encoding, encoding_errors)
+    is_positional = output_format in _POSITIONAL_OUTPUT_FORMATS
+    previous_lines = _get_previous_lines(out_filename, lines_filename, options_digest, is_positional)
+
+    chunks = [line_encoder.preamble]
+    hashes = []
+    sizes = array.array(_SIZE_TYPECODE)
+    reused_count = 0
+    for line_no, zar1_line in enumerate(zar1_lines, start=1):
+        line_hash = _get_line_hash(zar1_line)
+        line_output = previous_lines.get((line_no, line_hash) if is_positional else line_hash)
+        if line_output is not None and not profile.has_unmapped_zar_bytes(zar1_line):
+            reused_count += 1
+        else:
+            line_output = line_encoder.encode(zar1_line, line_no) + line_encoder.new_line
+        chunks.append(line_output)
+        hashes.append(line_hash)
+        sizes.append(len(line_output))
+    output = b''.join(chunks)
+    previous_lines.clear()
+
+    # The lines file is removed first, so an interrupted conversion is
+    # converted again in full
+    _remove_file(lines_filename)
+    write_file_atomic(out_filename, [output])
+    if sys.byteorder != 'little':
+        sizes.byteswap()
+    write_file_atomic(lines_filename, [
+        _FILE_MAGIC,
+        _file_header_struct.pack(len(hashes), len(output), options_digest),
+        b''.join(hashes),
+        sizes.tobytes(),
+    ])
+    return reused_count, len(zar1_lines) - reused_count
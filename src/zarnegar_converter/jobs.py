@@ -0,0 +1,260 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import json
+import hashlib
+import logging
+
+from zarnegar_converter.convert import convert_bytes, get_output_extension
+from zarnegar_converter.convert import check_output_encoding, DEFAULT_OUTPUT_ENCODING
+from zarnegar_converter.output import write_file_atomic
+from zarnegar_converter.zar1_profile import get_profile
+
+
+"""
+Sharded, Resumable Conversion Jobs
+
+A job converts the files listed in a manifest (one input path per line) into
+an output directory, mirroring the input paths.  The files are split into `n`
+shards by a stable hash of their paths, so every node can run one shard,
+`k/n`, of the same manifest, without any coordination.
+
+Every shard appends a record for every converted (or failed) file to its own
+journal in the output directory, after the output file is in place.  A
+killed or preempted shard, when run again, skips the files already recorded
+as converted.  Finally, `merge_journals()` combines the journals of all
+shards into one manifest of the outputs, and reports the missing files.
+"""
+
+
+MERGED_MANIFEST_FILENAME = 'converted.jsonl'
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+_JOURNAL_PREFIX = 'shard-'
+_JOURNAL_SUFFIX = '.journal'
+
+
+class JobError(Exception):
+    pass
+
+
+# == Manifests and Shards ==
+
+def read_manifest(manifest_filename):
+    """
+    Return the input paths of a manifest, skipping blank and comment (`#`)
+    lines.
+    """
+    with io.open(manifest_filename, encoding='utf8') as manifest_file:
+        return [
+            line.strip()
+            for line in manifest_file
+            if line.strip() and not line.lstrip().startswith('#')
+        ]
+
+def parse_shard_spec(shard_spec):
+    """
+    Parse a `k/n` shard spec, for the k-th of n shards (1 <= k <= n).
+    """
+    try:
+        shard, shards_count = [int(number) for number in shard_spec.split('/')]
+    except ValueError:
+        raise JobError("invalid shard: %s" % shard_spec)
+    if not 1 <= shard <= shards_count:
+        raise JobError("invalid shard: %s" % shard_spec)
+    return shard, shards_count
+
+def get_shard(path, shards_count):
+    """
+    Return the (1-based) shard of an input path.  The hash is stable across
+    processes, machines, and Python versions.
+    """
+    digest = hashlib.sha1(path.encode('utf8')).hexdigest()
+    return int(digest[:16], 16) % shards_count + 1
+
+def get_shard_paths(paths, shard, shards_count):
+    return [path for path in paths if get_shard(path, shards_count) == shard]
+
+def check_output_collisions(paths, output_dir, output_format):
+    """
+    Fail if two input paths map to the same output file, like `a/x.zar` and
+    `a/x.txt`, or `/a/x.zar` and `a/x.zar`.
+    """
+    inputs = {}
+    for path in paths:
+        out_filename = get_job_output_filename(path, output_dir, output_format)
+        if inputs.setdefault(out_filename, path) != path:
+            raise JobError("inputs %s and %s have the same output: %s" % (
+                inputs[out_filename], path, out_filename,
+            ))
+
+def get_job_output_filename(path, output_dir, output_format):
+    """
+    Mirror an input path, relative or absolute, under the output directory.
+    """
+    path = os.path.splitdrive(os.path.normpath(path))[1]
+    parts = [
+        part for part in path.split(os.sep)
+        if part not in ('', os.curdir, os.pardir)
+    ]
+    base_name = os.path.splitext(parts.pop())[0] + get_output_extension(output_format)
+    return os.path.join(output_dir, 'files', *(parts + [base_name]))
+
+
+# == Journals ==
+
+def get_journal_filename(output_dir, shard, shards_count):
+    return os.path.join(output_dir, '%s%d-of-%d%s' % (
+        _JOURNAL_PREFIX, shard, shards_count, _JOURNAL_SUFFIX,
+    ))
+
+def read_journal(journal_filename):
+    """
+    Return the records of a journal.  A partial last record, from a shard
+    killed while writing it, is ignored.
+    """
+    if not os.path.exists(journal_filename):
+        return []
+    records = []
+    with io.open(journal_filename, 'rb') as journal_file:
+        for line in journal_file:
+            if not line.endswith(b'\n'):
+                break
+            records.append(json.loads(line.decode('utf8')))
+    return records
+
+def _truncate_partial_record(journal_filename):
+    # Drop a partial last record, so the next one starts on its own line
+    if not os.path.exists(journal_filename):
+        return
+    with io.open(journal_filename, 'rb+') as journal_file:
+        data = journal_file.read()
+        if data and not data.endswith(b'\n'):
+            journal_file.truncate(data.rfind(b'\n') + 1)
+
+def _append_record(journal_file, record):
+    journal_file.write(json.dumps(record, sort_keys=True).encode('utf8') + b'\n')
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+
+def _write_output(out_filename, output):
+    # Both the file and its directory entry are synced before the output is
+    # journaled, so a done record never points to an output lost in a crash
+    os.makedirs(os.path.dirname(out_filename), exist_ok=True)
+    write_file_atomic(out_filename, [output], sync=True)
+
+
+# == Running and Merging ==
+
+def run_shard(
+    manifest_filename,
+    output_dir,
+    output_format,
+    shard,
+    shards_count,
+    profile=None,
+    max_files=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Convert the files of one shard of a manifest, resuming after the files
+    already converted according to the shard journal.  Files that fail to
+    convert are recorded, and retried the next time.  At most `max_files`
+    files are converted, if set.
+
+    Returns the numbers of converted, skipped, and failed files.  Fails with
+    `JobError` if two input paths have the same output file.
+    """
+    check_output_encoding(output_format, output_encoding, encoding_errors)
+    profile = get_profile(profile)
+    paths = read_manifest(manifest_filename)
+    # Checked on the whole manifest, so all shards fail the same way
+    check_output_collisions(paths, output_dir, output_format)
+    paths = get_shard_paths(paths, shard, shards_count)
+    # Shards may start at the same time, on the same output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    journal_filename = get_journal_filename(output_dir, shard, shards_count)
+    done_paths = set(
+        record['input'] for record in read_journal(journal_filename)
+        if record['status'] == STATUS_DONE
+    )
+    _truncate_partial_record(journal_filename)
+
+    skipped_count = len([path for path in paths if path in done_paths])
+    converted_count = 0
+    failed_count = 0
+    with io.open(journal_filename, 'ab') as journal_file:
+        for path in paths:
+            if path in done_paths:
+                continue
+            if max_files is not None and converted_count + failed_count >= max_files:
+                break
+            out_filename = get_job_output_filename(path, output_dir, output_format)
+            record = {'input': path, 'output': out_filename, 'status': STATUS_DONE}
+            try:
+                with io.open(path, 'rb') as in_file:
+                    output = convert_bytes(
+                        in_file.read(), output_format, profile, output_encoding, encoding_errors,
+                    )
+                _write_output(out_filename, output)
+                converted_count += 1
+            except Exception as err:
+                logging.error('zar_jobs: cannot convert %s: %s', path, err)
+                record.update(status=STATUS_FAILED, error=str(err))
+                failed_count += 1
+            _append_record(journal_file, record)
+            done_paths.add(path)
+    return converted_count, skipped_count, failed_count
+
+def merge_journals(manifest_filename, output_dir):
+    """
+    Combine the journals of all shards in the output directory into one
+    manifest of the converted files, as JSON lines sorted by input path.  The
+    last record of every input path wins.
+
+    Returns the lists of converted, failed, and missing input paths.
+    """
+    records = {}
+    for filename in sorted(os.listdir(output_dir)):
+        if filename.startswith(_JOURNAL_PREFIX) and filename.endswith(_JOURNAL_SUFFIX):
+            for record in read_journal(os.path.join(output_dir, filename)):
+                records[record['input']] = record
+
+    paths = read_manifest(manifest_filename)
+    merged_filename = os.path.join(output_dir, MERGED_MANIFEST_FILENAME)
+    with io.open(merged_filename, 'wb') as merged_file:
+        for path in sorted(set(paths) & set(records)):
+            merged_file.write(json.dumps(records[path], sort_keys=True).encode('utf8') + b'\n')
+
+    return (
+        [path for path in paths if records.get(path, {}).get('status') == STATUS_DONE],
+        [path for path in paths if records.get(path, {}).get('status') == STATUS_FAILED],
+        [path for path in paths if path not in records],
+    )
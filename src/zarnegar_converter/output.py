@@ -0,0 +1,116 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import codecs
+import tempfile
+
+from zarnegar_converter.convert import get_json_line, LINE_CONVERTERS
+from zarnegar_converter.zar1_file import get_line_record
+from zarnegar_converter.zar_file import OUTPUT_NEW_LINE, OUTPUT_NEW_LINE_TEXT
+
+
+"""
+Output Lines and Output Files
+
+Conversion of Zar1 lines to the output formats one line at a time, for the
+outputs which keep the output of every line, and atomic writes of output
+files.
+"""
+
+
+# == Output Lines ==
+
+# Formats which can be converted one line at a time
+LINE_OUTPUT_FORMATS = ['zar1_text', 'jsonl'] + sorted(LINE_CONVERTERS)
+
+
+class LineEncoder(object):
+    """
+    Converts Zar1 lines to an output format, one line at a time.  The output
+    starts with the `preamble` (byte order mark) of the encoding, and every
+    line ends with the encoded `new_line`.  Lines must be encoded in order.
+    """
+
+    def __init__(self, output_format, profile, output_encoding, encoding_errors):
+        if output_format not in LINE_OUTPUT_FORMATS:
+            raise ValueError("line-by-line conversion is not supported for %s" % output_format)
+        self._output_format = output_format
+        self._profile = profile
+        if output_format == 'zar1_text':
+            self.preamble = b''
+            self.new_line = OUTPUT_NEW_LINE
+        elif output_format == 'jsonl':
+            self.preamble = b''
+            self.new_line = b'\n'
+        else:
+            self._convert_line = LINE_CONVERTERS[output_format]
+            self._encoder = codecs.getincrementalencoder(output_encoding)(encoding_errors)
+            self.preamble = self._encoder.encode('')
+            self.new_line = self._encoder.encode(OUTPUT_NEW_LINE_TEXT)
+
+    def encode(self, zar1_line, line_no):
+        """
+        Return the output of a line, without its new-line.
+        """
+        if self._output_format == 'zar1_text':
+            return zar1_line.rstrip()
+        if self._output_format == 'jsonl':
+            return get_json_line(get_line_record(zar1_line, line_no, self._profile))[:-1]
+        unicode_line = self._convert_line(zar1_line, line_no, self._profile)
+        return self._encoder.encode(unicode_line.rstrip())
+
+
+# == Output Files ==
+
+def _sync_dir(dir_name):
+    fd = os.open(dir_name, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_file_atomic(filename, chunks, sync=False):
+    """
+    Write the chunks to a file, replacing it atomically.  They are written to
+    a temporary file first, so no partial file is left under the final name.
+
+    With `sync`, the file and its directory entry are synced to the disk
+    before returning.
+    """
+    dir_name = os.path.dirname(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=dir_name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out_file:
+            for chunk in chunks:
+                out_file.write(chunk)
+            if sync:
+                out_file.flush()
+                os.fsync(out_file.fileno())
+        os.rename(temp_filename, filename)
+    except Exception:
+        os.remove(temp_filename)
+        raise
+    if sync and os.name == 'posix':
+        _sync_dir(dir_name)
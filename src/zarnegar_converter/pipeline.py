@@ -0,0 +1,352 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import queue
+import bisect
+import threading
+
+from zarnegar_converter import zar1_file
+from zarnegar_converter.convert import convert_batch, convert_bytes, get_output_extension
+from zarnegar_converter.convert import check_output_encoding, DEFAULT_OUTPUT_ENCODING
+from zarnegar_converter.zar1_profile import get_profile
+
+
+"""
+Convert Many Files, with Overlapped Reading, Converting, and Writing
+
+Reader, converter, and writer stages run in separate threads, joined by
+bounded queues, so that reading and writing files, which may be slow on
+network file systems, overlap with converting other files.
+
+For files of very different sizes, `convert_files_scheduled()` converts the
+files in a pool of processes, the largest first, so that no large file is left
+running alone at the end, and only as many at once as fit in a memory budget.
+"""
+
+
+DEFAULT_QUEUE_SIZE = 4
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+# Peak memory for converting a line: the padded line, its conversions, and
+# its output, as measured by `benchmarks/memory_benchmark.py`
+_MEMORY_PER_LINE = 800
+
+# Average size of the lines of text files, for estimating their lines count
+_TEXT_LINE_SIZE = 64
+
+_POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+def get_output_filename(in_filename, output_dir, output_format):
+    base_name = os.path.splitext(os.path.basename(in_filename))[0]
+    return os.path.join(output_dir, base_name + get_output_extension(output_format))
+
+
+def _read_file(opener, filename):
+    with opener(filename, 'rb') as in_file:
+        return in_file.read()
+
+def _write_file(opener, filename, data):
+    with opener(filename, 'wb') as out_file:
+        out_file.write(data)
+
+
+def convert_files(
+    jobs,
+    output_format,
+    opener=open,
+    profile=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Convert the (input filename, output filename) jobs one after another.
+    """
+    check_output_encoding(output_format, output_encoding, encoding_errors)
+    profile = get_profile(profile)
+    files_count = 0
+    for in_filename, out_filename in jobs:
+        data = _read_file(opener, in_filename)
+        output = convert_bytes(data, output_format, profile, output_encoding, encoding_errors)
+        _write_file(opener, out_filename, output)
+        files_count += 1
+    return files_count
+
+
+class _Pipeline(object):
+
+    def __init__(self, output_format, opener, profile, encoding, read_queue_size, write_queue_size):
+        self._output_format = output_format
+        self._profile = profile
+        self._output_encoding, self._encoding_errors = encoding
+        self._opener = opener
+        self._read_queue = queue.Queue(read_queue_size)
+        self._write_queue = queue.Queue(write_queue_size)
+        self._stopped = threading.Event()
+        self._errors = []
+        self.files_count = 0
+
+    def _put(self, items, item):
+        while not self._stopped.is_set():
+            try:
+                items.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, items):
+        while not self._stopped.is_set():
+            try:
+                return items.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _run_stage(self, stage, *args):
+        try:
+            stage(*args)
+        except Exception as err:
+            self._errors.append(err)
+            self._stopped.set()
+
+    def _read(self, jobs):
+        for in_filename, out_filename in jobs:
+            data = _read_file(self._opener, in_filename)
+            if not self._put(self._read_queue, (out_filename, data)):
+                return
+        self._put(self._read_queue, _DONE)
+
+    def _convert(self):
+        while True:
+            item = self._get(self._read_queue)
+            if item is _DONE:
+                break
+            out_filename, data = item
+            output = convert_bytes(
+                data,
+                self._output_format,
+                self._profile,
+                self._output_encoding,
+                self._encoding_errors,
+            )
+            if not self._put(self._write_queue, (out_filename, output)):
+                return
+        self._put(self._write_queue, _DONE)
+
+    def _write(self):
+        while True:
+            item = self._get(self._write_queue)
+            if item is _DONE:
+                break
+            out_filename, output = item
+            _write_file(self._opener, out_filename, output)
+            self.files_count += 1
+
+    def run(self, jobs):
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self._read, jobs)),
+            threading.Thread(target=self._run_stage, args=(self._convert,)),
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        self._run_stage(self._write)
+        self._stopped.set()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.files_count
+
+
+def convert_files_pipelined(
+    jobs,
+    output_format,
+    opener=open,
+    read_queue_size=DEFAULT_QUEUE_SIZE,
+    write_queue_size=DEFAULT_QUEUE_SIZE,
+    profile=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Convert the (input filename, output filename) jobs, reading, converting,
+    and writing in separate threads.  At most `read_queue_size` files are
+    kept after reading, and `write_queue_size` outputs before writing.
+
+    Files are opened with `opener(filename, mode)`.  Returns the number of
+    converted files.
+    """
+    check_output_encoding(output_format, output_encoding, encoding_errors)
+    pipeline = _Pipeline(
+        output_format,
+        opener,
+        get_profile(profile),
+        (output_encoding, encoding_errors),
+        read_queue_size,
+        write_queue_size,
+    )
+    return pipeline.run(jobs)
+
+
+# == Scheduled ==
+
+def estimate_memory(in_filename, opener=open):
+    """
+    Estimate the peak memory for converting a file, from the lines count and
+    the text length in the header of binary files, and from the size of text
+    files.
+    """
+    with opener(in_filename, 'rb') as in_file:
+        head = in_file.read(zar1_file.BINARY_HEADER_SIZE)
+        counts = zar1_file.get_binary_header_counts(head)
+        if counts is not None:
+            lines_count, text_length = counts
+            return text_length + lines_count * _MEMORY_PER_LINE
+        try:
+            file_size = in_file.seek(0, io.SEEK_END)
+        except (AttributeError, IOError, ValueError):
+            file_size = len(head) + len(in_file.read())
+    return file_size + file_size // _TEXT_LINE_SIZE * _MEMORY_PER_LINE
+
+
+class JobScheduler(object):
+    """
+    Admit (cost, input filename, output filename) jobs, the largest first,
+    while the costs of the running jobs fit in a budget.
+
+    When the largest job does not fit, a smaller one that fits is admitted
+    instead.  A job larger than the whole budget is admitted only when no
+    other job is running.
+    """
+
+    def __init__(self, jobs, budget):
+        # In the order of cost, so the largest one that fits is found by bisection
+        self._jobs = sorted(jobs, key=lambda job: job[0])
+        self._costs = [job[0] for job in self._jobs]
+        self._budget = budget
+        self.running_cost = 0
+        self.running_count = 0
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def pop_admitted(self):
+        """
+        Return the next admitted job, or None if no pending job fits.
+        """
+        idx = bisect.bisect_right(self._costs, self._budget - self.running_cost) - 1
+        if idx < 0:
+            if self.running_count or not self._jobs:
+                return None
+            idx = len(self._jobs) - 1
+        job = self._jobs.pop(idx)
+        self._costs.pop(idx)
+        self.running_cost += job[0]
+        self.running_count += 1
+        return job
+
+    def release(self, job):
+        self.running_cost -= job[0]
+        self.running_count -= 1
+
+
+def schedule_jobs(jobs, opener=open, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Return a `JobScheduler` for the (input filename, output filename) jobs,
+    with the estimated memory of every file as its cost.  The cost of files
+    that cannot be read is zero, and their errors are left to the conversion.
+    """
+    scheduled_jobs = []
+    for in_filename, out_filename in jobs:
+        try:
+            cost = estimate_memory(in_filename, opener)
+        except IOError:
+            cost = 0
+        scheduled_jobs.append((cost, in_filename, out_filename))
+    return JobScheduler(scheduled_jobs, memory_budget)
+
+
+def convert_files_scheduled(
+    jobs,
+    output_format,
+    processes=None,
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    opener=open,
+    profile=None,
+    output_encoding=DEFAULT_OUTPUT_ENCODING,
+    encoding_errors='strict',
+):
+    """
+    Convert the (input filename, output filename) jobs in a pool of
+    `processes` worker processes (default: the number of CPUs), the largest
+    files first, and at most as many at once as fit in `memory_budget` bytes,
+    by the estimated memory of every file.
+
+    Files are read and written in this process, opened with
+    `opener(filename, mode)`, and converted in the workers (see
+    `process_pool`).  Returns the number of converted files.
+    """
+    # Imported only here, so the shared memory modules are not loaded for
+    # conversions in one process
+    from zarnegar_converter import process_pool
+    check_output_encoding(output_format, output_encoding, encoding_errors)
+    profile = get_profile(profile)
+    processes = processes or os.cpu_count() or 1
+    scheduler = schedule_jobs(jobs, opener, memory_budget)
+    options = (output_format, profile, output_encoding, encoding_errors)
+
+    files_count = 0
+    running = {}
+    converted_batches = queue.Queue()
+    pool = process_pool.create_pool(processes)
+    try:
+        while scheduler or running:
+            while len(running) < processes:
+                job = scheduler.pop_admitted()
+                if job is None:
+                    break
+                documents = [_read_file(opener, job[1])]
+                batch = process_pool.submit_batch(
+                    pool, convert_batch, (documents,) + options, converted_batches.put,
+                )
+                running[batch] = job
+            batch = converted_batches.get()
+            job = running.pop(batch)
+            scheduler.release(job)
+            output, = batch.get()
+            _write_file(opener, job[2], output)
+            files_count += 1
+    finally:
+        for batch in running:
+            batch.discard()
+        pool.terminate()
+        pool.join()
+    return files_count
@@ -0,0 +1,200 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import collections
+import multiprocessing
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+
+"""
+Process Pool for Batches of Documents, with Shared Memory Hand-Off
+
+A batch is a list of documents (bytes), and the options of their conversion.
+The documents of every batch are copied once into a shared memory segment,
+and only its name and the document sizes are sent to the worker process,
+which converts the documents into another segment, and only returns its name
+and the output sizes.  Segments are unlinked by the parent process, as soon
+as they are read.
+
+Without `multiprocessing.shared_memory` (before Python 3.8), the documents
+and the outputs are pickled instead.
+"""
+
+
+def is_shared_memory_available():
+    return shared_memory is not None
+
+
+# == Shared Memory Segments ==
+
+def _create_segment(chunks):
+    size = sum([len(chunk) for chunk in chunks])
+    segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    offset = 0
+    for chunk in chunks:
+        segment.buf[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    return segment
+
+def _read_segment(segment, sizes):
+    chunks = []
+    offset = 0
+    for size in sizes:
+        chunks.append(bytes(segment.buf[offset:offset + size]))
+        offset += size
+    return chunks
+
+# == Workers ==
+
+def _convert_shared_batch(convert_batch, descriptor):
+    name, sizes, options = descriptor
+    segment = shared_memory.SharedMemory(name)
+    try:
+        documents = _read_segment(segment, sizes)
+    finally:
+        segment.close()
+
+    outputs = convert_batch((documents,) + options)
+    segment = _create_segment(outputs)
+    segment.close()
+    return segment.name, [len(output) for output in outputs]
+
+
+def _get_result_callback(batch, callback):
+    if callback is None:
+        return None
+    return lambda _: callback(batch)
+
+
+class _SharedBatch(object):
+
+    def __init__(self, pool, convert_batch, batch, callback=None):
+        documents, options = batch[0], tuple(batch[1:])
+        self._segment = _create_segment(documents)
+        descriptor = (self._segment.name, [len(document) for document in documents], options)
+        result_callback = _get_result_callback(self, callback)
+        self._result = pool.apply_async(
+            _convert_shared_batch,
+            (convert_batch, descriptor),
+            callback=result_callback,
+            error_callback=result_callback,
+        )
+
+    def get(self):
+        try:
+            name, sizes = self._result.get()
+        finally:
+            self.release()
+        segment = shared_memory.SharedMemory(name)
+        try:
+            return _read_segment(segment, sizes)
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def release(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+    def discard(self):
+        """
+        Release the segments of a batch whose outputs are not read, after
+        the batch is converted.
+        """
+        self.release()
+        self._result.wait()
+        if self._result.successful():
+            name, _ = self._result.get()
+            segment = shared_memory.SharedMemory(name)
+            segment.close()
+            segment.unlink()
+
+
+class _PickledBatch(object):
+
+    def __init__(self, pool, convert_batch, batch, callback=None):
+        result_callback = _get_result_callback(self, callback)
+        self._result = pool.apply_async(
+            convert_batch, (batch,), callback=result_callback, error_callback=result_callback,
+        )
+
+    def get(self):
+        return self._result.get()
+
+    def discard(self):
+        pass
+
+
+# == Pool ==
+
+def create_pool(processes):
+    if shared_memory is not None and os.name == 'posix':
+        # Start the resource tracker before the workers, so they share it, and
+        # the segments created by the workers are not unlinked when they exit
+        resource_tracker.ensure_running()
+    return multiprocessing.Pool(processes)
+
+def submit_batch(pool, convert_batch, batch, callback=None):
+    """
+    Submit a batch to a pool of `create_pool()`, to be converted with
+    `convert_batch(batch)`, a module-level function.  Returns the submitted
+    batch, with `get()` returning its outputs, and `discard()` releasing it
+    without reading them.  `callback(submitted batch)` is called from another
+    thread when the batch is converted, or fails.
+    """
+    batch_class = _SharedBatch if shared_memory is not None else _PickledBatch
+    return batch_class(pool, convert_batch, batch, callback)
+
+def iter_process_results(convert_batch, batches, processes):
+    """
+    Convert the batches with `convert_batch(batch)`, a module-level function,
+    in a pool of processes, and yield the outputs of every batch in order.
+    """
+    # Only a few batches are queued ahead of the results, so the documents
+    # are not all read into memory
+    pool = create_pool(processes)
+    pending = collections.deque()
+    try:
+        for batch in batches:
+            pending.append(submit_batch(pool, convert_batch, batch))
+            if len(pending) > 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        # The pending batches, at most two per process, are waited for rather
+        # than terminated, so their output segments are not left behind
+        for pending_batch in pending:
+            pending_batch.discard()
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,118 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from zarnegar_converter.zar_file import ZarFile, ZarFileTypeError
+
+
+"""
+Scan the Metadata of Many Zarnegar Files
+
+Reports the format, lines count, and text length of every file, without
+converting it.  Binary files are scanned from their header and line info
+table only, and text files by counting their lines.  Files are scanned by a
+pool of threads, as scanning is mostly waiting for the file system.
+"""
+
+
+DEFAULT_THREADS = 8
+
+
+def iter_paths(paths):
+    """
+    Yield the given file paths, and the files under the given directories,
+    in sorted order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                yield os.path.join(dir_path, file_name)
+
+
+def scan_file(path):
+    """
+    Return the metadata of a file, or its error if it cannot be scanned.
+    """
+    metadata = collections.OrderedDict([('path', path)])
+    try:
+        with open(path, 'rb') as in_file:
+            metadata['file_size'] = os.fstat(in_file.fileno()).st_size
+            metadata.update(ZarFile.scan(in_file))
+    except (IOError, ZarFileTypeError) as err:
+        metadata['error'] = str(err)
+    return metadata
+
+def scan_files(paths, threads=DEFAULT_THREADS):
+    """
+    Scan files (and directories) in parallel, and yield their metadata in
+    order.
+    """
+    # Only a few files are queued ahead of the results, so the paths can be
+    # a long-running iterator
+    executor = ThreadPoolExecutor(threads)
+    pending = collections.deque()
+    try:
+        for path in iter_paths(paths):
+            pending.append(executor.submit(scan_file, path))
+            if len(pending) > 4 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+def get_totals(metadatas):
+    """
+    Return the number of files, lines, and text length of the scanned files,
+    in total, and by format.
+    """
+    def new_totals():
+        return collections.OrderedDict([
+            ('files_count', 0),
+            ('lines_count', 0),
+            ('text_length', 0),
+        ])
+
+    totals = new_totals()
+    totals['errors_count'] = 0
+    totals['formats'] = collections.OrderedDict()
+    for metadata in metadatas:
+        if 'error' in metadata:
+            totals['errors_count'] += 1
+            continue
+        format_totals = totals['formats'].setdefault(metadata['format'], new_totals())
+        for counts in (totals, format_totals):
+            counts['files_count'] += 1
+            counts['lines_count'] += metadata['lines_count']
+            counts['text_length'] += metadata['text_length']
+    return totals
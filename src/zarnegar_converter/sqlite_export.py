@@ -0,0 +1,190 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sqlite3
+import itertools
+import collections
+
+from zarnegar_converter import unicode_bidi
+from zarnegar_converter import unicode_joining
+from zarnegar_converter.zar_file import ZarFile
+from zarnegar_converter.zar1_profile import get_profile
+
+
+"""
+Export Zarnegar Files to a SQLite Database, with Full-Text Search
+
+Documents and their lines, as semantic Unicode text in logical order, are
+loaded into the `documents` and `lines` tables.  The `lines_fts` FTS5 table
+indexes the lines, with the joining control characters (ZWNJ and ZWJ) removed,
+so that words match whether or not they are written with them.
+"""
+
+
+_DEFAULT_BATCH_SIZE = 100
+
+_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        lines_count INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS lines (
+        id INTEGER PRIMARY KEY,
+        document_id INTEGER NOT NULL REFERENCES documents (id),
+        line_no INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        search_text TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS lines_document_id ON lines (document_id, line_no)
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5 (
+        search_text,
+        content='lines',
+        content_rowid='id'
+    )
+    ''',
+]
+
+
+def get_search_text(text):
+    return unicode_joining.remove_joining_control_chars(text)
+
+def _get_logical_lines(zar_file):
+    return [
+        line[len(unicode_bidi.RLO_CHAR):].rstrip()
+        for line in zar_file.get_unicode_rlo_lines()
+    ]
+
+def _get_next_id(connection, table):
+    row = connection.execute('SELECT MAX(id) FROM %s' % table).fetchone()
+    return (row[0] or 0) + 1
+
+
+def create_schema(connection):
+    for statement in _SCHEMA:
+        connection.execute(statement)
+
+def _delete_documents(connection, paths):
+    document_ids = [
+        (document_id,)
+        for path in paths
+        for (document_id,) in connection.execute(
+            'SELECT id FROM documents WHERE path = ?', (path,),
+        )
+    ]
+    connection.executemany('''
+        INSERT INTO lines_fts (lines_fts, rowid, search_text)
+        SELECT 'delete', id, search_text FROM lines WHERE document_id = ?
+    ''', document_ids)
+    connection.executemany('DELETE FROM lines WHERE document_id = ?', document_ids)
+    connection.executemany('DELETE FROM documents WHERE id = ?', document_ids)
+
+def _export_batch(connection, documents):
+    # A path repeated in the batch is exported once, with its last lines
+    documents = list(collections.OrderedDict(documents).items())
+    with connection:
+        _delete_documents(connection, [path for path, _ in documents])
+
+        document_id = _get_next_id(connection, 'documents')
+        line_id = _get_next_id(connection, 'lines')
+        document_rows = []
+        line_rows = []
+        for path, lines in documents:
+            document_rows.append((document_id, path, len(lines)))
+            for line_no, text in enumerate(lines, start=1):
+                line_rows.append((line_id, document_id, line_no, text, get_search_text(text)))
+                line_id += 1
+            document_id += 1
+
+        connection.executemany(
+            'INSERT OR REPLACE INTO documents (id, path, lines_count) VALUES (?, ?, ?)',
+            document_rows,
+        )
+        connection.executemany(
+            'INSERT INTO lines (id, document_id, line_no, text, search_text) VALUES (?, ?, ?, ?, ?)',
+            line_rows,
+        )
+        connection.executemany(
+            'INSERT INTO lines_fts (rowid, search_text) VALUES (?, ?)',
+            [(row[0], row[4]) for row in line_rows],
+        )
+
+
+def export_files(connection, paths, batch_size=_DEFAULT_BATCH_SIZE, profile=None):
+    """
+    Convert Zar1 files and load them into the database, replacing any
+    previous export of the same paths.  Every batch of files is loaded in one
+    transaction.  Returns the number of exported files.
+    """
+    create_schema(connection)
+    profile = get_profile(profile)
+    paths = iter(paths)
+    files_count = 0
+    while True:
+        batch_paths = list(itertools.islice(paths, batch_size))
+        if not batch_paths:
+            break
+        documents = []
+        for path in batch_paths:
+            with open(path, 'rb') as in_file:
+                documents.append((path, _get_logical_lines(ZarFile.get(in_file, profile))))
+        _export_batch(connection, documents)
+        files_count += len(documents)
+
+    with connection:
+        connection.execute("INSERT INTO lines_fts (lines_fts) VALUES ('optimize')")
+    return files_count
+
+def search(connection, query):
+    """
+    Return the (path, line_no, text) rows of the lines matching an FTS5
+    query, in the order of their relevance.
+    """
+    return connection.execute('''
+        SELECT documents.path, lines.line_no, lines.text
+        FROM lines_fts
+        JOIN lines ON lines.id = lines_fts.rowid
+        JOIN documents ON documents.id = lines.document_id
+        WHERE lines_fts MATCH ?
+        ORDER BY lines_fts.rank
+    ''', (get_search_text(query),)).fetchall()
+
+def export_files_to_database(
+    database_filename,
+    paths,
+    batch_size=_DEFAULT_BATCH_SIZE,
+    profile=None,
+):
+    connection = sqlite3.connect(database_filename)
+    try:
+        return export_files(connection, paths, batch_size, profile)
+    finally:
+        connection.close()
@@ -0,0 +1,251 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import io
+import os
+import json
+import random
+import logging
+import threading
+from unittest import TestCase
+
+from zarnegar_converter import convert
+from zarnegar_converter import process_pool
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.convert import convert_many, get_output_bytes, iter_output_bytes
+from zarnegar_converter.zar_file import ZarFile
+
+from test_zar1 import make_zar1_binary
+
+
+class TestConvert(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            sample = in_file.read()
+        self.documents = [
+            sample,
+            make_zar1_binary([(4, b'\x93\xa4'), (0, b'')]),
+            b'',
+            sample.split(b'\r\n')[1],
+            make_zar1_binary([]),
+        ] * 3
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def _get_expected(self, output_format):
+        return [
+            get_output_bytes(output_format, ZarFile.get(io.BytesIO(data)))
+            for data in self.documents
+        ]
+
+    def test_convert_many(self):
+        for output_format in ('zar1_text', 'unicode_legacy_lro', 'unicode_lro', 'unicode_rlo'):
+            self.assertEqual(
+                list(convert_many(self.documents, output_format, batch_size=4)),
+                self._get_expected(output_format),
+            )
+
+    def test_convert_many_processes(self):
+        self.assertEqual(
+            list(convert_many(iter(self.documents), 'unicode_rlo', batch_size=2, processes=2)),
+            self._get_expected('unicode_rlo'),
+        )
+
+    def _get_shared_memory_names(self):
+        return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+    def test_convert_many_shared_memory(self):
+        shared_memory_names = self._get_shared_memory_names()
+        for output_format in ('zar1_text', 'unicode_legacy_lro', 'jsonl'):
+            self.assertEqual(
+                list(convert_many(self.documents, output_format, batch_size=3, processes=2)),
+                self._get_expected(output_format),
+            )
+
+        # A failing batch, with other batches pending
+        documents = self.documents * 2 + [make_zar1_binary([(0, b'abc')])[:20]] + self.documents
+        self.assertRaises(Exception, list, convert_many(documents, 'unicode_rlo', batch_size=1, processes=2))
+        self.assertEqual(self._get_shared_memory_names(), shared_memory_names)
+
+    def test_convert_many_pickled(self):
+        # Without shared memory, before Python 3.8
+        shared_memory = process_pool.shared_memory
+        process_pool.shared_memory = None
+        try:
+            self.assertEqual(
+                list(convert_many(self.documents, 'unicode_rlo', batch_size=3, processes=2)),
+                self._get_expected('unicode_rlo'),
+            )
+        finally:
+            process_pool.shared_memory = shared_memory
+
+    def test_convert_many_bytes_like(self):
+        for output_format in ('zar1_text', 'unicode_rlo', 'jsonl'):
+            for documents in (
+                [bytearray(data) for data in self.documents],
+                [memoryview(data) for data in self.documents],
+            ):
+                self.assertEqual(
+                    list(convert_many(documents, output_format, batch_size=4)),
+                    self._get_expected(output_format),
+                )
+
+    def test_convert_many_threads(self):
+        for output_format in ('zar1_text', 'unicode_lro', 'unicode_rlo', 'jsonl'):
+            self.assertEqual(
+                list(convert_many(iter(self.documents * 4), output_format, batch_size=1, threads=4)),
+                self._get_expected(output_format) * 4,
+            )
+
+    def test_concurrent_conversion(self):
+        expected = {
+            output_format: self._get_expected(output_format)
+            for output_format in ('unicode_legacy_lro', 'unicode_rlo', 'jsonl')
+        }
+        results = []
+
+        def convert(output_format):
+            for _ in range(5):
+                results.append(self._get_expected(output_format) == expected[output_format])
+
+        threads = [
+            threading.Thread(target=convert, args=(output_format,))
+            for output_format in sorted(expected) * 3
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 45)
+
+    def test_convert_many_invalid_format(self):
+        self.assertRaises(ValueError, list, convert_many(self.documents, 'unknown'))
+        self.assertRaises(ValueError, list, convert_many(self.documents, 'unicode_rlo', processes=2, threads=2))
+
+    def test_jsonl(self):
+        zar_file = ZarFile.get(io.BytesIO(make_zar1_binary([(4, b'\x93\xa4\xb7'), (0, b'')])))
+        records = [
+            json.loads(json_line.decode('utf8'))
+            for json_line in iter_output_bytes('jsonl', zar_file)
+        ]
+        self.assertEqual(records, [
+            {
+                'line_no': 1,
+                'indent': 4,
+                'zar1': '20202020' + '93a4b7',
+                'legacy': zar_file.get_unicode_legacy_lro_lines()[0][1:].rstrip(),
+                'semantic': zar_file.get_unicode_rlo_lines()[0][1:].rstrip(),
+                'unmapped': [{'column': 6, 'byte': '0xB7'}],
+            },
+            {
+                'line_no': 2,
+                'indent': 0,
+                'zar1': '',
+                'legacy': '',
+                'semantic': '',
+                'unmapped': [],
+            },
+        ])
+        self.assertEqual(
+            get_output_bytes('jsonl', zar_file),
+            b''.join(iter_output_bytes('jsonl', zar_file)),
+        )
+
+    def test_output_encoding(self):
+        for output_format in ('unicode_legacy_lro', 'unicode_lro', 'unicode_rlo'):
+            expected = [
+                output.decode('utf8').encode('utf-16le')
+                for output in self._get_expected(output_format)
+            ]
+            self.assertEqual(
+                [
+                    get_output_bytes(output_format, ZarFile.get(io.BytesIO(data)), 'utf-16le')
+                    for data in self.documents
+                ],
+                expected,
+            )
+            self.assertEqual(
+                list(convert_many(self.documents, output_format, threads=2, output_encoding='utf-16le')),
+                expected,
+            )
+
+        zar_file = ZarFile.get(io.BytesIO(self.documents[0]))
+        self.assertRaises(UnicodeEncodeError, get_output_bytes, 'unicode_rlo', zar_file, 'cp1256')
+        self.assertEqual(
+            get_output_bytes('unicode_rlo', zar_file, 'cp1256', 'replace'),
+            zar_file.get_unicode_rlo_output().encode('cp1256', 'replace'),
+        )
+
+        self.assertRaises(ValueError, convert.check_output_encoding, 'unicode_rlo', 'unknown')
+        self.assertRaises(ValueError, convert.check_output_encoding, 'unicode_rlo', 'utf8', 'unknown')
+        self.assertRaises(ValueError, convert.check_output_encoding, 'jsonl', 'utf-16le')
+        convert.check_output_encoding('zar1_text', 'UTF-8')
+
+        # Legacy RLO output is not implemented
+        self.assertNotIn('unicode_legacy_rlo', convert.OUTPUT_FORMATS)
+        self.assertRaises(ValueError, convert.check_output_encoding, 'unicode_legacy_rlo', 'utf8')
+        self.assertRaises(ValueError, get_output_bytes, 'unicode_legacy_rlo', zar_file)
+
+    def test_direct_legacy_output(self):
+        # Random lines, with some blank and unmapped bytes, compared to the
+        # text conversion
+        rng = random.Random(41)
+        documents = [
+            make_zar1_binary([
+                (rng.randrange(10), bytes(
+                    rng.choice([0x20, 0xFF, rng.randrange(0x100)])
+                    for _ in range(rng.randrange(70))
+                ))
+                for _ in range(20)
+            ])
+            for _ in range(10)
+        ]
+        for profile in (None, 'iran_system'):
+            for output_encoding, encoding_errors in (
+                ('cp864', 'replace'),
+                ('cp1256', 'replace'),
+                ('latin-1', 'backslashreplace'),
+                ('cp864', 'ignore'),
+            ):
+                for data in documents:
+                    zar_file = ZarFile.from_bytes(data, profile)
+                    self.assertEqual(
+                        get_output_bytes('unicode_legacy_lro', zar_file, output_encoding, encoding_errors),
+                        zar_file.get_unicode_legacy_lro_output().encode(output_encoding, encoding_errors),
+                    )
+                self.assertEqual(
+                    list(convert_many(
+                        documents, 'unicode_legacy_lro', profile=profile,
+                        output_encoding=output_encoding, encoding_errors=encoding_errors,
+                    )),
+                    [
+                        ZarFile.from_bytes(data, profile).get_unicode_legacy_lro_output().encode(
+                            output_encoding, encoding_errors,
+                        )
+                        for data in documents
+                    ],
+                )
+
+        # Single-byte encodings are translated directly
+        decoding_table = zar1_encoding.ZAR1_LEGACY_DECODING_TABLE
+        self.assertNotEqual(convert._get_direct_legacy_table(decoding_table, 'cp864', 'replace'), None)
+        self.assertEqual(convert._get_direct_legacy_table(decoding_table, 'cp864', 'strict'), None)
+        self.assertEqual(convert._get_direct_legacy_table(decoding_table, 'utf8', 'strict'), None)
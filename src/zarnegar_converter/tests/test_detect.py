@@ -0,0 +1,78 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import io
+from unittest import TestCase
+
+from zarnegar_converter import detect
+from zarnegar_converter.zar_file import ZarFile, PeekableFile
+from zarnegar_converter.zar1_file import Zar1BinaryFile
+
+from test_zar1 import NonSeekableFile, make_zar1_binary
+
+
+# Persian words in a box, drawn with Iran System box-drawing characters
+_IRAN_SYSTEM_BOX = (
+    b'\xda\xc4\xc4\xc4\xc4\xc4\xc4\xc4\xc4\xbf\r\n'
+    b'\xb3 \xf4\x91\xfe\xa1 \x96\x91 \xb3\r\n'
+    b'\xc0\xc4\xc4\xc4\xc4\xc4\xc4\xc4\xc4\xd9\r\n'
+)
+
+
+class TestDetect(TestCase):
+    def setUp(self):
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            self.sample = in_file.read()
+
+    def assertDetection(self, data, guess, min_confidence=0.5):
+        detection = detect.detect_bytes(data)
+        self.assertEqual(detection.guess, guess)
+        self.assertTrue(min_confidence <= detection.confidence <= 1, detection)
+
+    def test_detect_bytes(self):
+        self.assertDetection(make_zar1_binary([(0, b'\x93\xa4')]), detect.GUESS_ZAR1_BINARY, 1)
+        self.assertDetection(self.sample, detect.GUESS_ZAR1_TEXT)
+        self.assertDetection(b'\x03\x93\xa4\x04\r\n', detect.GUESS_ZAR1_TEXT)
+        self.assertDetection(_IRAN_SYSTEM_BOX, detect.GUESS_IRAN_SYSTEM, 0.8)
+        self.assertDetection(b'Hello\r\nWorld\r\n\x1a', detect.GUESS_ASCII, 1)
+        self.assertDetection('سلام\n'.encode('utf8'), detect.GUESS_UTF8, 0.9)
+        self.assertDetection(bytes(range(0x100)) * 4, detect.GUESS_UNKNOWN, 1)
+        self.assertDetection(b'', detect.GUESS_UNKNOWN, 0)
+
+    def test_ambiguous(self):
+        # Letters only, without any override or box-drawing bytes
+        detection = detect.detect_bytes(b'\x93\xa4 \xf4\x91\r\n')
+        self.assertEqual(detection.guess, detect.GUESS_ZAR1_TEXT)
+        self.assertEqual(detection.confidence, 0.5)
+
+    def test_profile(self):
+        self.assertEqual(detect.detect_bytes(self.sample).profile, 'zarnegar')
+        self.assertEqual(detect.detect_bytes(_IRAN_SYSTEM_BOX).profile, 'iran_system')
+        self.assertEqual(detect.detect_bytes(b'\x00' * 10).profile, None)
+
+    def test_detect_file(self):
+        data = make_zar1_binary([(0, b'\x93\xa4')])
+        in_file = PeekableFile(NonSeekableFile(data))
+        self.assertEqual(detect.detect_file(in_file).guess, detect.GUESS_ZAR1_BINARY)
+        # Not advanced by the detection
+        self.assertTrue(isinstance(ZarFile.get(in_file), Zar1BinaryFile))
+
+        in_file = io.BytesIO(b'Hello, ' * 1000 + self.sample)
+        self.assertEqual(detect.detect_file(in_file, 100).guess, detect.GUESS_ASCII)
+        self.assertEqual(in_file.tell(), 100)
@@ -0,0 +1,340 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+"""
+Differential tests of the conversion engines against the reference per-byte
+implementation, on random and adversarial input.
+
+Set ZARNEGAR_DIFFERENTIAL_SEED and ZARNEGAR_DIFFERENTIAL_ITERATIONS in the
+environment to run with other random inputs, or for longer.  Mismatches are
+shrunk to a minimal reproducer before reporting.
+"""
+
+import io
+import os
+import struct
+import logging
+from random import Random
+from unittest import TestCase
+
+import zarnegar_converter.zar1_codec
+from zarnegar_converter import unicode_bidi
+from zarnegar_converter import unicode_arabic
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.zar_file import ZarFile, ParseLimits, OUTPUT_NEW_LINE
+from zarnegar_converter.convert import convert_many
+
+from test_zar1 import NonSeekableFile, make_zar1_binary
+
+
+_SEED = int(os.environ.get('ZARNEGAR_DIFFERENTIAL_SEED', 0))
+_ITERATIONS = int(os.environ.get('ZARNEGAR_DIFFERENTIAL_ITERATIONS', 100))
+
+_LINE_WIDTH = 80
+_BINARY_MAGIC = b'\x03\xCA\xB1\xF2'
+
+# Bytes whose semantic text starts or ends with ZWNJ/ZWJ, and their usual
+# neighbors
+_JOINING_BYTES = bytearray(
+    b'\x8b\x8d\x8e\x90\x91\x92\x93\x94\x95\xa2\xa4\xe1\xe2\xe3\xe4\xe5\xe6' +
+    b'\xe7\xe8\xf1\xf2\xf3\xf8\xf9\xfa\xfb\xfc\xfd\xfe\xb4\xb1 |(),'
+)
+
+# Bytes of ASCII and box-drawing lines
+_PLAIN_BYTES = bytearray(b' ()<>[]{}|-+=.:Zar019' + b'\xb3\xba\xc4\xcd\xda\xdb\xdf')
+
+def _to_bytes(values):
+    return bytes(bytearray(values))
+
+
+# == Reference ==
+
+def _reference_semantic_lro(zar1_line, line_no):
+    legacy_text = zar1_encoding.convert_zar1_line_to_legacy_lro_per_byte(zar1_line, line_no)
+    return unicode_arabic.convert_legacy_line_to_semantic_lro(legacy_text, line_no)
+
+def _reference_reversed(text):
+    return ''.join([
+        chr(unicode_bidi.MIRROR_MAP.get(ord(char), ord(char)))
+        for char in reversed(text)
+    ])
+
+def _reference_legacy_lro(zar1_line, line_no):
+    legacy_text = zar1_encoding.convert_zar1_line_to_legacy_lro_per_byte(zar1_line, line_no)
+    return unicode_bidi.LRO_CHAR + legacy_text
+
+def _reference_lro(zar1_line, line_no):
+    return unicode_bidi.LRO_CHAR + _reference_semantic_lro(zar1_line, line_no)
+
+def _reference_rlo(zar1_line, line_no):
+    return unicode_bidi.RLO_CHAR + _reference_reversed(_reference_semantic_lro(zar1_line, line_no))
+
+REFERENCE_LINE_ENGINES = {
+    'unicode_legacy_lro': _reference_legacy_lro,
+    'unicode_lro': _reference_lro,
+    'unicode_rlo': _reference_rlo,
+}
+
+def read_reference_lines(data):
+    """
+    Straightforward reader of Zar1 binary and text data, as lines of
+    80 bytes.
+    """
+    if data.startswith(_BINARY_MAGIC):
+        offset = len(_BINARY_MAGIC)
+        lines_count = struct.unpack('<H', data[offset:offset + 2])[0]
+        struct.unpack('<HH10s', data[offset:offset + 14])
+        offset += 14
+        line_infos = []
+        for _ in range(lines_count):
+            line_infos.append(struct.unpack('<BHB', data[offset:offset + 4]))
+            offset += 4
+        texts = []
+        for left_indent, _, text_len in line_infos:
+            texts.append(b' ' * left_indent + data[offset:offset + text_len])
+            offset += text_len
+    else:
+        texts = [line.rstrip() for line in io.BytesIO(data).readlines()]
+    return [text + b' ' * (_LINE_WIDTH - len(text)) for text in texts]
+
+def get_reference_outputs(data):
+    lines = read_reference_lines(data)
+    outputs = {
+        'zar1_text': b''.join([line.rstrip() + OUTPUT_NEW_LINE for line in lines]),
+    }
+    for output_format, convert in REFERENCE_LINE_ENGINES.items():
+        outputs[output_format] = ''.join([
+            convert(line, line_no).rstrip() + OUTPUT_NEW_LINE.decode('ascii')
+            for line_no, line in enumerate(lines, start=1)
+        ])
+    return outputs
+
+
+# == Engines ==
+
+def _codec_legacy_lro(zar1_line, line_no):
+    return unicode_bidi.LRO_CHAR + zar1_line.decode('zar1_legacy')
+
+def _codec_lro(zar1_line, line_no):
+    return unicode_bidi.LRO_CHAR + zar1_line.decode('zar1')
+
+def _codec_rlo(zar1_line, line_no):
+    return unicode_bidi.RLO_CHAR + unicode_bidi.get_reversed(zar1_line.decode('zar1'))
+
+def _round_trip_lro(zar1_line, line_no):
+    lro_line = zar1_encoding.convert_zar1_line_to_unicode_lro(zar1_line, line_no)
+    zar1_line = zar1_encoding.convert_unicode_lro_line_to_zar1(lro_line)
+    return zar1_encoding.convert_zar1_line_to_unicode_lro(zar1_line, line_no)
+
+LINE_ENGINES = {
+    'unicode_legacy_lro': {
+        'codec': _codec_legacy_lro,
+        'plain_lines': zar1_encoding.convert_zar1_line_to_unicode_legacy_lro,
+    },
+    'unicode_lro': {
+        'codec': _codec_lro,
+        'round_trip': _round_trip_lro,
+        'plain_lines': zar1_encoding.convert_zar1_line_to_unicode_lro,
+    },
+    'unicode_rlo': {
+        'codec': _codec_rlo,
+        'plain_lines': zar1_encoding.convert_zar1_line_to_unicode_rlo,
+    },
+}
+
+_OUTPUT_FORMATS = ['zar1_text', 'unicode_legacy_lro', 'unicode_lro', 'unicode_rlo']
+
+def _get_file_outputs(zar_file):
+    return {
+        'zar1_text': zar_file.get_zar1_text_output(),
+        'unicode_legacy_lro': zar_file.get_unicode_legacy_lro_output(),
+        'unicode_lro': zar_file.get_unicode_lro_output(),
+        'unicode_rlo': zar_file.get_unicode_rlo_output(),
+    }
+
+def _get_batch_outputs(data):
+    outputs = {}
+    for output_format in _OUTPUT_FORMATS:
+        output = next(convert_many([data], output_format))
+        if output_format != 'zar1_text':
+            output = output.decode('utf8')
+        outputs[output_format] = output
+    return outputs
+
+def _get_validated_outputs(data):
+    return _get_file_outputs(ZarFile.from_bytes(data, limits=ParseLimits()))
+
+FILE_ENGINES = {
+    'seekable': lambda data: _get_file_outputs(ZarFile.get(io.BytesIO(data))),
+    'non_seekable': lambda data: _get_file_outputs(ZarFile.get(NonSeekableFile(data))),
+    'from_bytes': lambda data: _get_file_outputs(ZarFile.from_bytes(data)),
+    'batch': _get_batch_outputs,
+}
+
+
+def _get_outcome(function, *args):
+    try:
+        return function(*args)
+    except Exception as err:
+        return ('error', type(err).__name__)
+
+
+# == Shrinking ==
+
+def shrink(data, is_failing):
+    """
+    Reduce a failing input to a (locally) minimal one, by removing chunks
+    of it and simplifying its bytes, while it still fails.
+    """
+    chunk_len = max(len(data) // 2, 1)
+    while chunk_len >= 1:
+        idx = 0
+        while idx < len(data):
+            candidate = data[:idx] + data[idx + chunk_len:]
+            if candidate != data and is_failing(candidate):
+                data = candidate
+            else:
+                idx += chunk_len
+        chunk_len //= 2
+    for idx in range(len(data)):
+        for simple_byte in (b' ', b'a'):
+            candidate = data[:idx] + simple_byte + data[idx + 1:]
+            if candidate < data and is_failing(candidate):
+                data = candidate
+                break
+    return data
+
+
+# == Generators ==
+
+def generate_line(random):
+    kind = random.randrange(5)
+    if kind == 0:
+        length = random.randrange(_LINE_WIDTH * 3)
+        return _to_bytes([random.randrange(0x100) for _ in range(length)])
+    if kind == 1:
+        length = random.randrange(_LINE_WIDTH)
+        return _to_bytes([random.choice(_JOINING_BYTES) for _ in range(length)])
+    if kind == 2:
+        values = list(range(0x100))
+        random.shuffle(values)
+        return _to_bytes(values)
+    if kind == 3:
+        return b' ' * random.randrange(_LINE_WIDTH) + _to_bytes(
+            [random.choice(_JOINING_BYTES) for _ in range(random.randrange(8))]
+        )
+    # Plain line, possibly with one other byte
+    line = bytearray([random.choice(_PLAIN_BYTES) for _ in range(random.randrange(_LINE_WIDTH))])
+    if line and random.randrange(2):
+        line[random.randrange(len(line))] = random.randrange(0x100)
+    return bytes(line)
+
+def generate_text_line(random):
+    return generate_line(random).replace(b'\r', b'').replace(b'\n', b'')
+
+def generate_text_file(random):
+    return b''.join([
+        generate_text_line(random) + random.choice([b'\r\n', b'\n', b''])
+        for _ in range(random.randrange(6))
+    ])
+
+def generate_binary_file(random):
+    lines = [
+        (random.randrange(20), generate_line(random)[:random.randrange(1, 0x100)])
+        for _ in range(random.randrange(6))
+    ]
+    data = make_zar1_binary(lines)
+    kind = random.randrange(4)
+    if kind == 1:
+        # Truncated file
+        return data[:random.randrange(len(data) + 1)]
+    if kind == 2:
+        # Corrupt header or line-info table
+        data = bytearray(data)
+        for _ in range(random.randrange(1, 4)):
+            idx = random.randrange(len(_BINARY_MAGIC), min(len(data), 18 + 4 * len(lines)))
+            data[idx] = random.randrange(0x100)
+        return bytes(data)
+    if kind == 3:
+        # Trailing garbage
+        return data + generate_line(random)
+    return data
+
+
+class TestDifferential(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.random = Random(_SEED)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def _assert_same_line_outputs(self, zar1_line):
+        for output_format, engines in LINE_ENGINES.items():
+            reference = REFERENCE_LINE_ENGINES[output_format]
+            for engine_name, engine in engines.items():
+                def is_failing(line):
+                    return _get_outcome(engine, line, 1) != _get_outcome(reference, line, 1)
+                if is_failing(zar1_line):
+                    self.fail("%s engine differs for %s: %r" % (
+                        engine_name, output_format, shrink(zar1_line, is_failing),
+                    ))
+
+    def _assert_same_file_outputs(self, data):
+        for engine_name, engine in FILE_ENGINES.items():
+            def is_failing(data):
+                return _get_outcome(engine, data) != _get_outcome(get_reference_outputs, data)
+            if is_failing(data):
+                self.fail("%s file engine differs: %r" % (
+                    engine_name, shrink(data, is_failing),
+                ))
+
+    def _assert_validated_file_outputs(self, data):
+        # Validation only adds format errors
+        def is_failing(data):
+            outcome = _get_outcome(_get_validated_outputs, data)
+            return (
+                outcome != ('error', 'ZarFileFormatError') and
+                outcome != _get_outcome(get_reference_outputs, data)
+            )
+        if is_failing(data):
+            self.fail("validated file engine differs: %r" % (shrink(data, is_failing),))
+
+    def test_all_byte_values(self):
+        for byte in range(0x100):
+            for neighbor in _JOINING_BYTES:
+                self._assert_same_line_outputs(_to_bytes([neighbor, byte, neighbor]))
+        self._assert_same_line_outputs(_to_bytes(range(0x100)))
+
+    def test_random_lines(self):
+        for _ in range(_ITERATIONS):
+            self._assert_same_line_outputs(generate_line(self.random))
+
+    def test_random_text_files(self):
+        for _ in range(_ITERATIONS):
+            self._assert_same_file_outputs(generate_text_file(self.random))
+
+    def test_random_binary_files(self):
+        for _ in range(_ITERATIONS):
+            data = generate_binary_file(self.random)
+            self._assert_same_file_outputs(data)
+            self._assert_validated_file_outputs(data)
+
+    def test_shrink(self):
+        self.assertEqual(shrink(b'abc\xe1xyz', lambda data: b'\xe1' in data), b'\xe1')
@@ -0,0 +1,113 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import os
+import mmap
+import shutil
+import logging
+import tempfile
+from unittest import TestCase
+
+from zarnegar_converter.convert import convert_bytes
+from zarnegar_converter.document import ConvertedDocument, DocumentFileError
+from zarnegar_converter.zar_file import ZarFile
+
+from test_zar1 import make_zar1_binary
+
+
+class TestDocument(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.temp_dir = tempfile.mkdtemp()
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            self.sample = in_file.read()
+        self.documents = [
+            self.sample,
+            make_zar1_binary([(4, b'\x93\xa4'), (0, b''), (0, b'abc  ')]),
+            b'',
+        ]
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.temp_dir)
+
+    def test_lines(self):
+        for output_format, output_encoding in (
+            ('unicode_rlo', 'utf8'),
+            ('unicode_rlo', 'utf-16'),
+            ('unicode_lro', 'utf-16le'),
+            ('unicode_legacy_lro', 'utf8'),
+            ('zar1_text', 'utf8'),
+            ('jsonl', 'utf8'),
+        ):
+            for data in self.documents:
+                document = ConvertedDocument.from_bytes(data, output_format, output_encoding=output_encoding)
+                output = convert_bytes(data, output_format, output_encoding=output_encoding)
+                self.assertEqual(document.output, output)
+                self.assertEqual(len(document), len(ZarFile.from_bytes(data).get_zar1_text_lines()))
+                if len(document):
+                    self.assertIs(document.get_lines(1, len(document)).obj, document.output.obj)
+
+        document = ConvertedDocument.from_bytes(self.documents[1], 'unicode_rlo')
+        rlo_lines = ZarFile.from_bytes(self.documents[1]).get_unicode_rlo_lines()
+        self.assertEqual(
+            [document.get_text(line_no) for line_no in range(1, 4)],
+            [line.rstrip() for line in rlo_lines],
+        )
+        self.assertEqual(
+            document.get_lines(2, 3),
+            (rlo_lines[1].rstrip() + '\r\n' + rlo_lines[2].rstrip() + '\r\n').encode('utf8'),
+        )
+        self.assertEqual(document.get_lines(2, 1), b'')
+        self.assertRaises(IndexError, document.get_line, 0)
+        self.assertRaises(IndexError, document.get_line, 4)
+        self.assertRaises(IndexError, document.get_lines, 3, 4)
+
+        # Lines are decoded from the output encoding
+        document = ConvertedDocument.from_bytes(self.sample, 'unicode_rlo', output_encoding='utf-16')
+        self.assertEqual(document.get_text(1), ZarFile.from_bytes(self.sample).get_unicode_rlo_lines()[0].rstrip())
+        document = ConvertedDocument.from_bytes(self.sample, 'zar1_text')
+        self.assertEqual(document.get_line(2), self.sample.split(b'\r\n')[1].rstrip())
+        self.assertEqual(
+            document.get_text(2),
+            ZarFile.from_bytes(self.sample).get_unicode_legacy_lro_lines()[1][1:].rstrip(),
+        )
+
+    def test_save_load(self):
+        filename = os.path.join(self.temp_dir, 'document.zardoc')
+        for data in self.documents:
+            document = ConvertedDocument.from_bytes(data, 'unicode_rlo', output_encoding='utf-16le')
+            document.save(filename)
+            with ConvertedDocument.load(filename) as loaded:
+                self.assertEqual(len(loaded), len(document))
+                self.assertEqual(loaded.output_encoding, 'utf-16le')
+                self.assertEqual(loaded.output, document.output)
+                for line_no in range(1, len(document) + 1):
+                    line = loaded.get_line(line_no)
+                    self.assertEqual(line, document.get_line(line_no))
+                    self.assertTrue(isinstance(line.obj, mmap.mmap))
+                    self.assertEqual(loaded.get_text(line_no), document.get_text(line_no))
+                    line.release()
+
+        with open(filename, 'r+b') as doc_file:
+            doc_file.truncate(os.path.getsize(filename) - 1)
+        self.assertRaises(DocumentFileError, ConvertedDocument.load, filename)
+        with open(filename, 'wb') as doc_file:
+            doc_file.write(self.sample)
+        self.assertRaises(DocumentFileError, ConvertedDocument.load, filename)
@@ -0,0 +1,116 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+from unittest import TestCase, mock
+
+from zarnegar_converter import incremental
+from zarnegar_converter.convert import convert_bytes
+
+from test_zar1 import make_zar1_binary
+
+
+class TestIncremental(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.temp_dir = tempfile.mkdtemp()
+        self.in_filename = os.path.join(self.temp_dir, 'document.zar')
+        self.out_filename = os.path.join(self.temp_dir, 'document.txt')
+        self.lines = [(idx % 5, b'\x91\x93 %d |' % idx) for idx in range(20)]
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.temp_dir)
+
+    def _convert(self, lines, output_format='unicode_rlo', **options):
+        data = make_zar1_binary(lines)
+        with open(self.in_filename, 'wb') as in_file:
+            in_file.write(data)
+        counts = incremental.convert_file_incremental(
+            self.in_filename, self.out_filename, output_format, **options
+        )
+        with open(self.out_filename, 'rb') as out_file:
+            self.assertEqual(out_file.read(), convert_bytes(data, output_format, **options))
+        return counts
+
+    def test_convert_file_incremental(self):
+        for output_format, options in (
+            ('unicode_rlo', {}),
+            ('unicode_lro', {'output_encoding': 'utf-16'}),
+            ('unicode_legacy_lro', {'output_encoding': 'cp1256', 'encoding_errors': 'replace'}),
+            ('zar1_text', {}),
+        ):
+            self.assertEqual(self._convert(self.lines, output_format, **options), (0, 20))
+            self.assertEqual(self._convert(self.lines, output_format, **options), (20, 0))
+
+            # Changed, inserted, and removed lines
+            lines = list(self.lines)
+            lines[3] = (0, b'\xa4\xa2 |')
+            lines.insert(10, (2, b'abc'))
+            del lines[15]
+            self.assertEqual(self._convert(lines, output_format, **options), (18, 2))
+            self.assertEqual(self._convert([], output_format, **options), (0, 0))
+
+    def test_positional_output(self):
+        self.assertEqual(self._convert(self.lines, 'jsonl'), (0, 20))
+        lines = list(self.lines)
+        lines.insert(10, (2, b'abc'))
+        self.assertEqual(self._convert(lines, 'jsonl'), (10, 11))
+
+    def test_full_reconversion(self):
+        self.assertEqual(self._convert(self.lines), (0, 20))
+        # Other options
+        self.assertEqual(self._convert(self.lines, output_encoding='utf-16'), (0, 20))
+        self.assertEqual(self._convert(self.lines, output_encoding='utf-16'), (20, 0))
+
+        # Output changed since the previous conversion
+        with open(self.out_filename, 'ab') as out_file:
+            out_file.write(b'\x00\x00')
+        self.assertEqual(self._convert(self.lines, output_encoding='utf-16'), (0, 20))
+
+        # Lines with unmapped bytes
+        lines = self.lines + [(0, b'\x02abc')]
+        self.assertEqual(self._convert(lines, output_encoding='utf-16'), (20, 1))
+        self.assertEqual(self._convert(lines, output_encoding='utf-16'), (20, 1))
+
+        os.remove(incremental.get_lines_filename(self.out_filename))
+        self.assertEqual(self._convert(self.lines), (0, 20))
+
+        self.assertRaises(ValueError, self._convert, self.lines, 'unicode_legacy_rlo')
+
+    def test_changed_conversion(self):
+        self.assertEqual(self._convert(self.lines), (0, 20))
+        with mock.patch.object(incremental, '_CONVERSION_VERSION', 0):
+            self.assertEqual(self._convert(self.lines), (0, 20))
+        self.assertEqual(self._convert(self.lines), (0, 20))
+
+        # Profiles changing only their unmapped bytes
+        profiles = []
+        for idx, unmapped in enumerate([['0x91'], []]):
+            filename = os.path.join(self.temp_dir, 'variant-%d.json' % idx)
+            with open(filename, 'w') as profile_file:
+                json.dump({'name': 'variant', 'extends': 'zarnegar', 'unmapped': unmapped}, profile_file)
+            profiles.append(filename)
+        self.assertEqual(self._convert(self.lines, 'jsonl', profile=profiles[0]), (0, 20))
+        self.assertEqual(self._convert(self.lines, 'jsonl', profile=profiles[1]), (0, 20))
+        self.assertEqual(self._convert(self.lines, 'jsonl', profile=profiles[1]), (20, 0))
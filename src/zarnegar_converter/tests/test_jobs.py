@@ -0,0 +1,150 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import os
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from unittest import TestCase
+
+from zarnegar_converter import jobs
+from zarnegar_converter.convert import convert_bytes
+
+from test_zar1 import make_zar1_binary
+
+
+_SHARDS_COUNT = 3
+
+
+class TestJobs(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, 'output')
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            sample = in_file.read()
+
+        self.inputs = {}
+        for idx in range(12):
+            data = sample if idx % 2 else make_zar1_binary([(idx, b'\x93\xa4'), (0, b'abc')])
+            self.inputs[os.path.join(self.temp_dir, 'input', 'dir%d' % (idx % 3), '%d.zar' % idx)] = data
+        # Truncated binary file
+        self.bad_path = os.path.join(self.temp_dir, 'input', 'x-bad.zar')
+        self.inputs[self.bad_path] = make_zar1_binary([(0, b'abc')])[:10]
+
+        for path, data in self.inputs.items():
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as in_file:
+                in_file.write(data)
+        self.manifest_filename = os.path.join(self.temp_dir, 'manifest.txt')
+        with open(self.manifest_filename, 'w') as manifest_file:
+            manifest_file.write('# Inputs\n\n')
+            for path in sorted(self.inputs):
+                manifest_file.write(path + '\n')
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.temp_dir)
+
+    def _run_shard(self, shard, **options):
+        return jobs.run_shard(
+            self.manifest_filename, self.output_dir, 'unicode_rlo', shard, _SHARDS_COUNT, **options
+        )
+
+    def _assert_outputs(self):
+        converted, failed, missing = jobs.merge_journals(self.manifest_filename, self.output_dir)
+        self.assertEqual(failed, [self.bad_path])
+        self.assertEqual(missing, [])
+        self.assertEqual(sorted(converted), sorted(set(self.inputs) - set([self.bad_path])))
+        for path in converted:
+            out_filename = jobs.get_job_output_filename(path, self.output_dir, 'unicode_rlo')
+            with open(out_filename, 'rb') as out_file:
+                self.assertEqual(out_file.read(), convert_bytes(self.inputs[path], 'unicode_rlo'))
+        with open(os.path.join(self.output_dir, jobs.MERGED_MANIFEST_FILENAME)) as merged_file:
+            self.assertEqual(len(merged_file.readlines()), len(self.inputs))
+
+    def test_shards(self):
+        self.assertEqual(jobs.parse_shard_spec('2/3'), (2, 3))
+        for shard_spec in ['0/3', '4/3', '2', 'a/b', '1/2/3']:
+            self.assertRaises(jobs.JobError, jobs.parse_shard_spec, shard_spec)
+
+        paths = jobs.read_manifest(self.manifest_filename)
+        self.assertEqual(paths, sorted(self.inputs))
+        self.assertEqual(jobs.get_shard('samples/zar1-sample-text-01.zar', 1000), 988)
+        paths = ['archive/%d.zar' % idx for idx in range(30)]
+        shards = [jobs.get_shard_paths(paths, shard, _SHARDS_COUNT) for shard in (1, 2, 3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(paths))
+        self.assertEqual([len(shard_paths) for shard_paths in shards], [6, 14, 10])
+
+    def test_output_filenames(self):
+        self.assertEqual(
+            jobs.get_job_output_filename('/archive/a/b.zar', 'out', 'unicode_rlo'),
+            os.path.join('out', 'files', 'archive', 'a', 'b.txt'),
+        )
+        self.assertEqual(
+            jobs.get_job_output_filename('../a/./b.zar', 'out', 'zar1_text'),
+            os.path.join('out', 'files', 'a', 'b.zar'),
+        )
+
+        jobs.check_output_collisions(['a/x.zar', 'a/y.zar', 'a/x.zar'], 'out', 'unicode_rlo')
+        for paths in (['a/x.zar', 'a/x.txt'], ['/abs/p.zar', 'abs/p.zar']):
+            self.assertRaises(jobs.JobError, jobs.check_output_collisions, paths, 'out', 'unicode_rlo')
+
+        with open(self.manifest_filename, 'a') as manifest_file:
+            manifest_file.write(os.path.splitext(self.bad_path)[0] + '.txt\n')
+        self.assertRaises(jobs.JobError, self._run_shard, 1)
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_processes(self):
+        # Processes stand in for nodes, each running one shard
+        processes = [
+            multiprocessing.Process(target=self._run_shard, args=(shard,))
+            for shard in range(1, _SHARDS_COUNT + 1)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0] * _SHARDS_COUNT)
+        self._assert_outputs()
+
+    def test_resume(self):
+        def run_single_shard(**options):
+            return jobs.run_shard(
+                self.manifest_filename, self.output_dir, 'unicode_rlo', 1, 1, **options
+            )
+
+        self.assertEqual(run_single_shard(max_files=2), (2, 0, 0))
+        converted, failed, missing = jobs.merge_journals(self.manifest_filename, self.output_dir)
+        self.assertEqual((len(converted), len(failed), len(missing)), (2, 0, len(self.inputs) - 2))
+
+        # Shard killed while writing a record
+        journal_filename = jobs.get_journal_filename(self.output_dir, 1, 1)
+        with open(journal_filename, 'ab') as journal_file:
+            journal_file.write(b'{"input": "/partial')
+        self.assertEqual(len(jobs.read_journal(journal_filename)), 2)
+
+        self.assertEqual(run_single_shard(), (len(self.inputs) - 3, 2, 1))
+        # Failed files are retried
+        self.assertEqual(run_single_shard(), (0, len(self.inputs) - 1, 1))
+        records = jobs.read_journal(journal_filename)
+        self.assertEqual(len(records), len(self.inputs) + 1)
+        self._assert_outputs()
@@ -0,0 +1,78 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import os
+import shutil
+import logging
+import tempfile
+from unittest import TestCase
+
+from zarnegar_converter.convert import convert_bytes
+from zarnegar_converter.output import LineEncoder, write_file_atomic, LINE_OUTPUT_FORMATS
+from zarnegar_converter.zar1_profile import get_profile
+from zarnegar_converter.zar_file import ZarFile
+
+from test_zar1 import make_zar1_binary
+
+
+class TestOutput(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.temp_dir)
+
+    def test_line_encoder(self):
+        data = make_zar1_binary([(0, b'\x91\x93 abc'), (2, b'\x02\xa4\xa2 |'), (0, b'')])
+        for output_format, output_encoding in (
+            ('unicode_rlo', 'utf8'),
+            ('unicode_lro', 'utf-16'),
+            ('unicode_legacy_lro', 'utf-16le'),
+            ('zar1_text', 'utf8'),
+            ('jsonl', 'utf8'),
+        ):
+            self.assertIn(output_format, LINE_OUTPUT_FORMATS)
+            line_encoder = LineEncoder(output_format, get_profile(), output_encoding, 'strict')
+            chunks = [line_encoder.preamble]
+            lines = ZarFile.from_bytes(data).get_zar1_text_lines()
+            for line_no, zar1_line in enumerate(lines, start=1):
+                chunks.append(line_encoder.encode(zar1_line, line_no) + line_encoder.new_line)
+            self.assertEqual(
+                b''.join(chunks),
+                convert_bytes(data, output_format, output_encoding=output_encoding),
+            )
+        self.assertRaises(ValueError, LineEncoder, 'unicode_legacy_rlo', get_profile(), 'utf8', 'strict')
+
+    def test_write_file_atomic(self):
+        filename = os.path.join(self.temp_dir, 'output.txt')
+        write_file_atomic(filename, [b'abc', b'def'])
+        write_file_atomic(filename, [b'ghi'], sync=True)
+        with open(filename, 'rb') as out_file:
+            self.assertEqual(out_file.read(), b'ghi')
+
+        # A failed write keeps the previous file, and no temporary file
+        def iter_chunks():
+            yield b'jkl'
+            raise IOError('failed')
+        self.assertRaises(IOError, write_file_atomic, filename, iter_chunks())
+        with open(filename, 'rb') as out_file:
+            self.assertEqual(out_file.read(), b'ghi')
+        self.assertEqual(os.listdir(self.temp_dir), ['output.txt'])
@@ -0,0 +1,160 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import io
+import time
+import threading
+from unittest import TestCase
+
+from zarnegar_converter import pipeline
+from zarnegar_converter.convert import convert_bytes
+
+from test_zar1 import make_zar1_binary, NonSeekableFile
+
+
+class SlowFileSystem(object):
+    """
+    In-memory stand-in for a network file system, where every open file
+    takes `delay` seconds to read or write.
+    """
+
+    def __init__(self, files, delay):
+        self.files = dict(files)
+        self._delay = delay
+        self._lock = threading.Lock()
+
+    def open(self, filename, mode):
+        file_system = self
+
+        class SlowFile(io.BytesIO):
+            def read(self, *args):
+                time.sleep(file_system._delay)
+                return io.BytesIO.read(self, *args)
+
+            def close(self):
+                if 'w' in mode and not self.closed:
+                    time.sleep(file_system._delay)
+                    with file_system._lock:
+                        file_system.files[filename] = self.getvalue()
+                io.BytesIO.close(self)
+
+        if 'w' in mode:
+            return SlowFile()
+        with self._lock:
+            if filename not in self.files:
+                raise IOError("No such file: %s" % filename)
+            return SlowFile(self.files[filename])
+
+
+class TestPipeline(TestCase):
+    def setUp(self):
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            self.sample = in_file.read()
+        self.jobs = [('in/%d.zar' % idx, 'out/%d.txt' % idx) for idx in range(8)]
+
+    def _get_file_system(self, delay):
+        return SlowFileSystem([(in_filename, self.sample) for in_filename, _ in self.jobs], delay)
+
+    def test_convert_files_pipelined(self):
+        file_system = self._get_file_system(0)
+        self.assertEqual(pipeline.convert_files_pipelined(
+            self.jobs, 'unicode_rlo', opener=file_system.open,
+            read_queue_size=1, write_queue_size=2,
+        ), len(self.jobs))
+        expected = convert_bytes(self.sample, 'unicode_rlo')
+        for _, out_filename in self.jobs:
+            self.assertEqual(file_system.files[out_filename], expected)
+
+    def test_overlapped_io(self):
+        delay = 0.05
+        file_system = self._get_file_system(delay)
+        start = time.time()
+        pipeline.convert_files_pipelined(self.jobs, 'unicode_rlo', opener=file_system.open)
+        elapsed = time.time() - start
+        # Reads and writes alone take `2 * delay` per file, when not overlapped
+        self.assertLess(elapsed, 0.75 * 2 * delay * len(self.jobs))
+
+    def test_errors(self):
+        file_system = self._get_file_system(0)
+        jobs = self.jobs + [('missing.zar', 'out/missing.txt')] + self.jobs
+        self.assertRaises(
+            IOError,
+            pipeline.convert_files_pipelined, jobs, 'unicode_rlo', opener=file_system.open,
+        )
+        self.assertRaises(
+            ValueError,
+            pipeline.convert_files_pipelined, self.jobs, 'unknown', opener=file_system.open,
+        )
+
+    def test_estimate_memory(self):
+        binary = make_zar1_binary([(0, b'abc'), (4, b'de')])
+        file_system = SlowFileSystem([('a.zar', binary), ('b.zar', self.sample)], 0)
+        self.assertEqual(pipeline.estimate_memory('a.zar', file_system.open), 5 + 2 * 800)
+        expected = len(self.sample) + len(self.sample) // 64 * 800
+        self.assertEqual(pipeline.estimate_memory('b.zar', file_system.open), expected)
+        self.assertEqual(pipeline.estimate_memory(
+            'b.zar', lambda filename, mode: NonSeekableFile(self.sample),
+        ), expected)
+
+    def test_job_scheduler(self):
+        scheduler = pipeline.JobScheduler([
+            (cost, 'in/%d.zar' % cost, 'out/%d.txt' % cost)
+            for cost in (5, 50, 20, 100, 200)
+        ], 120)
+
+        def pop_costs():
+            costs = []
+            job = scheduler.pop_admitted()
+            while job is not None:
+                costs.append(job[0])
+                job = scheduler.pop_admitted()
+            return costs
+
+        self.assertEqual(pop_costs(), [100, 20])
+        scheduler.release((100,))
+        self.assertEqual(pop_costs(), [50, 5])
+        scheduler.release((20,))
+        scheduler.release((50,))
+        self.assertEqual(pop_costs(), [])
+        # Larger than the budget, so only when no other job is running
+        scheduler.release((5,))
+        self.assertEqual(pop_costs(), [200])
+        self.assertEqual(len(scheduler), 0)
+
+    def test_convert_files_scheduled(self):
+        binary = make_zar1_binary([(0, b'\x91\x93 |')] * 500)
+        files = [('in/%d.zar' % idx, binary if idx % 3 else self.sample) for idx in range(9)]
+        jobs = [(in_filename, in_filename.replace('in/', 'out/')) for in_filename, _ in files]
+        for memory_budget in (1, 1024 * 1024):
+            file_system = SlowFileSystem(files, 0)
+            self.assertEqual(pipeline.convert_files_scheduled(
+                jobs, 'unicode_rlo', processes=2, memory_budget=memory_budget, opener=file_system.open,
+            ), len(jobs))
+            for in_filename, out_filename in jobs:
+                self.assertEqual(
+                    file_system.files[out_filename],
+                    convert_bytes(file_system.files[in_filename], 'unicode_rlo'),
+                )
+
+        file_system = SlowFileSystem(files, 0)
+        self.assertRaises(
+            IOError,
+            pipeline.convert_files_scheduled,
+            jobs + [('missing.zar', 'out/missing.txt')], 'unicode_rlo', opener=file_system.open,
+        )
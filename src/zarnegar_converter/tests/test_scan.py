@@ -0,0 +1,103 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from zarnegar_converter import scan
+from zarnegar_converter.zar_file import ZarFile
+
+from test_zar1 import NonSeekableFile, make_zar1_binary
+
+
+_BINARY_LINES = [(2, b'abc'), (0, b'\x93\xa4'), (10, b'')]
+
+
+class TestScan(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            self.sample = in_file.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as out_file:
+            out_file.write(data)
+        return path
+
+    def test_scan_binary(self):
+        data = make_zar1_binary(_BINARY_LINES)
+        in_file = io.BytesIO(data)
+        self.assertEqual(dict(ZarFile.scan(in_file)), {
+            'format': 'zar1_binary',
+            'lines_count': 3,
+            'text_length': 5,
+        })
+        # The text is not read
+        self.assertEqual(in_file.tell(), len(data) - 5)
+        self.assertEqual(len(ZarFile.from_bytes(data).get_zar1_text_lines()), 3)
+
+    def test_scan_text(self):
+        self.assertEqual(dict(ZarFile.scan(NonSeekableFile(self.sample))), {
+            'format': 'zar1_text',
+            'lines_count': 2,
+            'text_length': 42,
+        })
+        self.assertEqual(
+            ZarFile.scan(NonSeekableFile(self.sample))['lines_count'],
+            len(ZarFile.from_bytes(self.sample).get_zar1_text_lines()),
+        )
+        self.assertEqual(ZarFile.scan(NonSeekableFile(b'a\r\nb'))['lines_count'], 2)
+        self.assertEqual(ZarFile.scan(NonSeekableFile(b''))['lines_count'], 0)
+
+    def test_scan_files(self):
+        # Files of a directory come before its subdirectories
+        paths = [
+            self._write('c.zar', self.sample),
+            self._write('a/1.zar', make_zar1_binary(_BINARY_LINES)),
+            self._write('a/2.zar', self.sample),
+            self._write('b/3.zar', make_zar1_binary(_BINARY_LINES)[:20]),
+        ]
+        missing_path = os.path.join(self.temp_dir, 'missing.zar')
+
+        for threads in (1, 3):
+            metadatas = list(scan.scan_files([self.temp_dir, missing_path], threads))
+            self.assertEqual([metadata['path'] for metadata in metadatas], paths + [missing_path])
+            self.assertEqual(metadatas[1]['file_size'], len(make_zar1_binary(_BINARY_LINES)))
+            self.assertEqual(metadatas[3]['error'], 'Truncated Zar1 Binary File')
+            self.assertTrue('error' in metadatas[4])
+
+        totals = scan.get_totals(metadatas)
+        self.assertEqual(
+            (totals['files_count'], totals['lines_count'], totals['text_length'], totals['errors_count']),
+            (3, 7, 89, 2),
+        )
+        self.assertEqual(dict(totals['formats']['zar1_text']), {
+            'files_count': 2,
+            'lines_count': 4,
+            'text_length': 84,
+        })
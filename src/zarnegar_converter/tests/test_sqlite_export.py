@@ -0,0 +1,59 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import sqlite3
+from unittest import TestCase
+
+from zarnegar_converter import sqlite_export
+
+
+_SAMPLE_PATH = 'samples/zar1-sample-text-01.zar'
+
+
+class TestSqliteExport(TestCase):
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_export_and_search(self):
+        self.assertEqual(sqlite_export.export_files(self.connection, [_SAMPLE_PATH]), 1)
+        self.assertEqual(sqlite_export.search(self.connection, u'رباعیات'), [
+            (_SAMPLE_PATH, 1, u'| دربارهٔ رباعیات خیام'),
+        ])
+        # Words match with or without joining control characters
+        self.assertEqual(
+            sqlite_export.search(self.connection, u'\u0698\u0627\u200c\u067e\u0646\u06cc'),
+            sqlite_export.search(self.connection, u'ژاپنی'),
+        )
+        self.assertEqual(len(sqlite_export.search(self.connection, u'ژاپنی')), 1)
+
+    def test_export_again(self):
+        sqlite_export.export_files(self.connection, [_SAMPLE_PATH])
+        sqlite_export.export_files(self.connection, [_SAMPLE_PATH], batch_size=1)
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM documents').fetchone(), (1,))
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM lines').fetchone(), (2,))
+        self.assertEqual(len(sqlite_export.search(self.connection, u'خیام')), 1)
+
+    def test_export_same_path_twice(self):
+        self.assertEqual(sqlite_export.export_files(self.connection, [_SAMPLE_PATH] * 2), 2)
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM documents').fetchone(), (1,))
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM lines').fetchone(), (2,))
+        self.assertEqual(len(sqlite_export.search(self.connection, u'خیام')), 1)
@@ -17,24 +17,62 @@
 #
 # Author(s): Behnam Esfahbod <behnam@zwnj.org>
 
+import io
+import struct
+import logging
 from unittest import TestCase
 
-from zarnegar_converter.zar1_file import Zar1File
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.zar_file import ZarFile, ParseLimits, ZarFileFormatError
+from zarnegar_converter.zar1_file import Zar1File, Zar1BinaryFile, Zar1TextFile, Zar1BinaryWriter
+
+
+class NonSeekableFile(object):
+    def __init__(self, data):
+        self._file = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self):
+        return self._file.readline()
+
+    def seek(self, offset, whence=0):
+        raise IOError("Illegal seek")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def make_zar1_binary(lines, user_data=b''):
+    data = b'\x03\xCA\xB1\xF2'
+    data += struct.pack('<HH10s', len(lines), sum(len(text) for _, text in lines), user_data)
+    cumulative_len = 0
+    for left_indent, text in lines:
+        data += struct.pack('<BHB', left_indent, cumulative_len, len(text))
+        cumulative_len += len(text)
+    for _, text in lines:
+        data += text
+    return data
+
 
 class TestZar1(TestCase):
     def test_zar1_text(self):
-        sample = Zar1File.get(open('samples/zar1-sample-text-01.zar', 'r'))
+        sample = Zar1File.get(open('samples/zar1-sample-text-01.zar', 'rb'))
 
         input_lines = sample.get_zar1_text_lines()
         self.assertEqual(input_lines, [
-            '                                                          \xf4\x91\xfe\xa1 \x96\x91\xfe\xe4\x91\x93\xa4 \xb4\xf9\xa4\x91\x93\xa4\xa2 |',
-            '                                                            \xfc\xf7\x95\x90\xa6 \xa4\xe3\xaa \xa4\xa2 \xf8\xee\xfe\x91\xfb |',
+            b'                                                          \xf4\x91\xfe\xa1 \x96\x91\xfe\xe4\x91\x93\xa4 \xb4\xf9\xa4\x91\x93\xa4\xa2 |',
+            b'                                                            \xfc\xf7\x95\x90\xa6 \xa4\xe3\xaa \xa4\xa2 \xf8\xee\xfe\x91\xfb |',
         ])
 
         zar1_text_lines = sample.get_zar1_text_lines()
         self.assertEqual(zar1_text_lines, [
-            '                                                          \xf4\x91\xfe\xa1 \x96\x91\xfe\xe4\x91\x93\xa4 \xb4\xf9\xa4\x91\x93\xa4\xa2 |',
-            '                                                            \xfc\xf7\x95\x90\xa6 \xa4\xe3\xaa \xa4\xa2 \xf8\xee\xfe\x91\xfb |',
+            b'                                                          \xf4\x91\xfe\xa1 \x96\x91\xfe\xe4\x91\x93\xa4 \xb4\xf9\xa4\x91\x93\xa4\xa2 |',
+            b'                                                            \xfc\xf7\x95\x90\xa6 \xa4\xe3\xaa \xa4\xa2 \xf8\xee\xfe\x91\xfb |',
         ])
 
         unicode_legacy_lro_lines = sample.get_unicode_legacy_lro_lines()
@@ -42,3 +80,142 @@ class TestZar1(TestCase):
             u'‭                                                          ﻡﺎﯾﺧ ﺕﺎﯾﻋﺎﺑﺭ ﻩﺭﺎﺑﺭﺩ |',
             u'‭                                                            ﯽﻧﭘﺍﮊ ﺭﻌﺷ ﺭﺩ ﻭﮐﯾﺎﻫ |',
         ])
+
+    def test_zar1_text_non_seekable(self):
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            data = in_file.read()
+        sample = ZarFile.get(NonSeekableFile(data))
+        self.assertIsInstance(sample, Zar1TextFile)
+        self.assertEqual(
+            sample.get_zar1_text_lines(),
+            Zar1File.get(io.BytesIO(data)).get_zar1_text_lines(),
+        )
+
+    def test_zar1_binary_non_seekable(self):
+        data = make_zar1_binary([(2, b'\x93\xa4'), (0, b''), (0, b'abc')])
+        sample = ZarFile.get(NonSeekableFile(data))
+        self.assertIsInstance(sample, Zar1BinaryFile)
+        self.assertEqual(sample.get_zar1_text_lines(), [
+            (b'  \x93\xa4').ljust(80),
+            b' ' * 80,
+            b'abc'.ljust(80),
+        ])
+
+    def assertFormatError(self, reason, data, limits=None, offset=None):
+        for get in (
+            lambda: ZarFile.from_bytes(data, limits=limits or ParseLimits()),
+            lambda: ZarFile.get(NonSeekableFile(data), limits=limits or ParseLimits()),
+        ):
+            with self.assertRaises(ZarFileFormatError) as context:
+                get()
+            self.assertEqual(context.exception.reason, reason)
+            if offset is not None:
+                self.assertEqual(context.exception.offset, offset)
+
+    def test_zar1_binary_validated(self):
+        lines = [(2, b'\x93\xa4'), (0, b''), (0, b'abc')]
+        data = make_zar1_binary(lines)
+        self.assertEqual(
+            ZarFile.from_bytes(data, limits=ParseLimits()).get_zar1_text_lines(),
+            ZarFile.from_bytes(data).get_zar1_text_lines(),
+        )
+        # Trailing data is allowed
+        ZarFile.from_bytes(data + b'\x00', limits=ParseLimits())
+
+        self.assertFormatError('truncated_header', data[:10], offset=10)
+        self.assertFormatError('truncated_line_table', data[:25], offset=25)
+        self.assertFormatError('truncated_text', data[:-1])
+        self.assertFormatError('text_length_mismatch', data[:6] + b'\x06' + data[7:])
+        # Cumulative length of the second line beyond the total, and of the
+        # third line out of order
+        self.assertFormatError('invalid_cumulative_length', data[:23] + b'\xff\xff' + data[25:], offset=22)
+        self.assertFormatError('invalid_cumulative_length', data[:27] + b'\x01\x00' + data[29:], offset=26)
+
+        # Header of 65,535 lines, without any line table
+        huge = make_zar1_binary([])[:4] + b'\xff\xff' + make_zar1_binary([])[6:]
+        self.assertFormatError('truncated_line_table', huge)
+        self.assertFormatError('too_many_lines', huge, ParseLimits(max_lines=1000))
+        self.assertFormatError('too_many_lines', data, ParseLimits(max_lines=2))
+        self.assertFormatError('too_large', data, ParseLimits(max_bytes=len(data) - 1))
+        self.assertFormatError('timeout', data, ParseLimits(max_seconds=-1))
+
+    def test_zar1_text_validated(self):
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            data = in_file.read()
+        ZarFile.from_bytes(data, limits=ParseLimits(max_bytes=len(data), max_lines=2))
+        self.assertFormatError('too_many_lines', data, ParseLimits(max_lines=1))
+        self.assertFormatError('too_many_lines', data + b'x', ParseLimits(max_lines=2))
+        self.assertFormatError('too_large', data, ParseLimits(max_bytes=100), offset=100)
+        self.assertFormatError('timeout', data, ParseLimits(max_seconds=-1))
+        self.assertFormatError('timeout', data * 1000, ParseLimits(max_seconds=-1), offset=512 * len(data))
+
+        # Reading stops right after the limit
+        in_file = io.BytesIO(data * 1000)
+        self.assertRaises(ZarFileFormatError, ZarFile.get, in_file, limits=ParseLimits(max_bytes=100))
+        self.assertEqual(in_file.tell(), 101)
+
+    def test_zar1_text_round_trip(self):
+        sample = Zar1File.get(open('samples/zar1-sample-text-01.zar', 'rb'))
+        zar1_lines = sample.get_zar1_text_lines()
+        self.assertEqual([
+            zar1_encoding.convert_unicode_rlo_line_to_zar1(line)
+            for line in sample.get_unicode_rlo_lines()
+        ], zar1_lines)
+        self.assertEqual([
+            zar1_encoding.convert_unicode_legacy_lro_line_to_zar1(line)
+            for line in sample.get_unicode_legacy_lro_lines()
+        ], zar1_lines)
+
+    def test_zar1_binary_writer(self):
+        data = make_zar1_binary([(2, b'\x91\x93 |'), (0, b''), (70, b'abc')])
+        zar1_lines = Zar1File.get(io.BytesIO(data)).get_zar1_text_lines()
+        self.assertEqual(Zar1BinaryWriter(zar1_lines).get_bytes(), data)
+
+        out_file = io.BytesIO()
+        Zar1BinaryWriter(zar1_lines).write(out_file)
+        self.assertEqual(out_file.getvalue(), data)
+
+        sample = Zar1File.get(open('samples/zar1-sample-text-01.zar', 'rb'))
+        data = Zar1BinaryWriter(sample.get_zar1_text_lines(), user_data=b'user').get_bytes()
+        self.assertEqual(data[8:18], b'user' + b'\x00' * 6)
+        written = Zar1File.get(io.BytesIO(data), limits=ParseLimits())
+        self.assertIsInstance(written, Zar1BinaryFile)
+        self.assertEqual(written.get_zar1_text_lines(), sample.get_zar1_text_lines())
+
+        # Read and written back, with the user data of the header
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            lines = [
+                (len(line) - len(line.lstrip()), line.strip())
+                for line in in_file.read().split(b'\r\n') if line
+            ]
+        data = make_zar1_binary(lines, user_data=b'\x07USER\x00\x01\x00\x00\xff')
+        binary_file = Zar1File.get(io.BytesIO(data))
+        self.assertEqual(binary_file.user_data, b'\x07USER\x00\x01\x00\x00\xff')
+        self.assertEqual(
+            Zar1BinaryWriter(binary_file.get_zar1_text_lines(), binary_file.user_data).get_bytes(),
+            data,
+        )
+
+        self.assertEqual(Zar1BinaryWriter([]).get_bytes(), make_zar1_binary([]))
+        self.assertRaises(ValueError, Zar1BinaryWriter, [b'x' * 81])
+        self.assertRaises(ValueError, Zar1BinaryWriter, [b'x' * 80] * 820)
+        self.assertRaises(ValueError, Zar1BinaryWriter, [b''], user_data=b'x' * 11)
+
+    def test_plain_lines(self):
+        self.assertEqual(zar1_encoding.get_plain_line_kind(b' ' * 80), zar1_encoding.LINE_KIND_ASCII)
+        self.assertEqual(zar1_encoding.get_plain_line_kind(b'(1) abc |'), zar1_encoding.LINE_KIND_ASCII)
+        self.assertEqual(zar1_encoding.get_plain_line_kind(b'\xda\xcd\xcd\xbf'), zar1_encoding.LINE_KIND_BOX_DRAWING)
+        self.assertEqual(zar1_encoding.get_plain_line_kind(b'\xda\x93\xa4\xbf'), None)
+        self.assertEqual(zar1_encoding.get_plain_line_kind(b'\x03abc'), None)
+        self.assertEqual(
+            zar1_encoding.convert_zar1_line_to_unicode_rlo(b'(1) <a>', 1),
+            u'\u202e<a> (1)',
+        )
+        logging.disable(logging.CRITICAL)
+        try:
+            self.assertEqual(
+                zar1_encoding.convert_zar1_line_to_unicode_lro(b'\xda\xcd\xbf', 1),
+                u'\u202d\u250c\u2550\u2510',
+            )
+        finally:
+            logging.disable(logging.NOTSET)
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import io
+import codecs
+from random import Random
+from unittest import TestCase
+
+import zarnegar_converter.zar1_codec
+from zarnegar_converter import zar1_encoding
+
+
+def _chunks(data, size):
+    return [data[idx:idx + size] for idx in range(0, len(data), size)]
+
+
+class TestZar1Codec(TestCase):
+    def setUp(self):
+        with open('samples/zar1-sample-text-01.zar', 'rb') as in_file:
+            self.data = in_file.read()
+
+    def test_legacy_decode(self):
+        lines = self.data.decode('zar1_legacy').split(u'\r\n')
+        self.assertEqual(lines[:2], [
+            zar1_encoding.convert_zar1_line_to_unicode_legacy_lro(zar1_line, line_no)[1:]
+            for line_no, zar1_line in enumerate(self.data.split(b'\r\n')[:2], start=1)
+        ])
+        self.assertEqual(self.data.decode('zar1_legacy').encode('zar1-legacy'), self.data)
+
+    def test_semantic_decode(self):
+        lines = self.data.decode('zar1').split(u'\r\n')
+        self.assertEqual(lines[:2], [
+            zar1_encoding.convert_zar1_line_to_semantic_lro(zar1_line, line_no)
+            for line_no, zar1_line in enumerate(self.data.split(b'\r\n')[:2], start=1)
+        ])
+
+    def test_semantic_incremental_decode(self):
+        # AIN/GHAIN/HEH/YEH forms and separators, with joining control
+        # characters at both ends of their semantic text
+        data = b'\xe1\xe2\xe3\xe4 \xfa\xfb\xfc\xfd\xfe\x91\x90|\xe3\xe3\xe3' * 7
+        expected = data.decode('zar1')
+        for size in range(1, 9):
+            self.assertEqual(
+                u''.join(codecs.iterdecode(_chunks(data, size), 'zar1')),
+                expected,
+            )
+            reader = codecs.getreader('zar1')(io.BytesIO(data))
+            self.assertEqual(u''.join(iter(lambda: reader.read(size), u'')), expected)
+
+    def test_text_io_wrapper(self):
+        wrapper = io.TextIOWrapper(io.BytesIO(self.data), encoding='zar1_semantic', newline='')
+        self.assertEqual(wrapper.read(), self.data.decode('zar1'))
+
+    def test_semantic_encode(self):
+        text = self.data.decode('zar1')
+        self.assertEqual(text.encode('zar1').decode('zar1'), text)
+
+        random = Random(0)
+        for _ in range(200):
+            data = bytearray([random.randrange(0x100) for _ in range(random.randrange(1, 40))])
+            text = bytes(data).decode('zar1')
+            encoded = text.encode('zar1')
+            self.assertEqual(encoded.decode('zar1'), text, repr(bytes(data)))
+            for size in range(1, 5):
+                self.assertEqual(
+                    b''.join(codecs.iterencode(_chunks(text, size), 'zar1')),
+                    encoded,
+                )
@@ -0,0 +1,137 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+import os
+import json
+import shutil
+import pickle
+import logging
+import tempfile
+from unittest import TestCase
+
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter import zar1_profile
+from zarnegar_converter.zar_file import ZarFile
+from zarnegar_converter.convert import convert_bytes, convert_many
+
+
+def _clear_profiles():
+    zar1_profile._PROFILES.clear()
+    zar1_profile._PROFILE_SOURCES.clear()
+
+
+class TestZar1Profile(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.temp_dir = tempfile.mkdtemp()
+        # Compiled again, and not reused from other tests
+        _clear_profiles()
+        self.addCleanup(_clear_profiles)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.temp_dir)
+
+    def _write_profile(self, filename, source):
+        filename = os.path.join(self.temp_dir, filename)
+        with open(filename, 'w') as profile_file:
+            json.dump(source, profile_file)
+        return filename
+
+    def test_default_profile(self):
+        self.assertIs(zar1_profile.get_profile(), zar1_encoding.DEFAULT_PROFILE)
+        self.assertIs(zar1_profile.get_profile('zarnegar'), zar1_encoding.DEFAULT_PROFILE)
+        profile = zar1_profile.compile_profile(*zar1_profile.resolve_profile_source('zarnegar'))
+        self.assertEqual(profile.decoding_table, zar1_encoding.ZAR1_LEGACY_DECODING_TABLE)
+        self.assertEqual(profile.unmapped_bytes, zar1_encoding.ZAR1_UNMAPPED_BYTES)
+        self.assertEqual(profile.digest, zar1_encoding.DEFAULT_PROFILE.digest)
+        for zar1_line in [b'\x93\xa4 abc', b'\xb3\x03\x1f\xb4', b'(1) abc', b'\xda\xcd\xbf']:
+            self.assertEqual(
+                zar1_encoding.convert_zar1_line_to_unicode_rlo(zar1_line, 1, profile),
+                zar1_encoding.convert_zar1_line_to_unicode_rlo(zar1_line, 1),
+            )
+
+    def test_builtin_profiles(self):
+        self.assertIn('iran_system', zar1_profile.get_profile_names())
+        profile = zar1_profile.get_profile('iran_system')
+        self.assertEqual(profile.name, 'iran_system')
+        self.assertEqual(profile.convert_zar1_line_to_legacy_lro(b'\xb4\xc4a', 1), u'┤─a')
+        self.assertEqual(profile.get_unmapped_zar_bytes(b'\x03\xb3'), [])
+        self.assertEqual(profile.convert_unicode_legacy_text_to_zar1(u'┤─a'), b'\xb4\xc4a')
+
+    def test_profile_cache(self):
+        filename = self._write_profile('variant.json', {
+            'name': 'variant',
+            'extends': 'iran_system',
+            'map': {'0xB0': 'U+06F0'},
+        })
+        profile = zar1_profile.get_profile(filename)
+        self.assertEqual(profile.decoding_table[0xB0], u'۰')
+        self.assertIs(zar1_profile.get_profile(filename), profile)
+
+        # Kept in memory, without reading the sources again
+        load_source = zar1_profile._load_source
+        zar1_profile._load_source = None
+        try:
+            self.assertIs(zar1_profile.get_profile(filename), profile)
+            self.assertIs(zar1_profile.get_profile(os.path.relpath(filename)), profile)
+        finally:
+            zar1_profile._load_source = load_source
+
+        # Changed profiles are compiled again
+        self._write_profile('variant.json', {
+            'name': 'variant',
+            'extends': 'iran_system',
+            'map': {'0xB0': 'U+06F1'},
+        })
+        mtime = os.stat(filename).st_mtime
+        os.utime(filename, (mtime + 1, mtime + 1))
+        changed_profile = zar1_profile.get_profile(filename)
+        self.assertNotEqual(changed_profile.digest, profile.digest)
+        self.assertEqual(changed_profile.decoding_table[0xB0], u'۱')
+
+    def test_invalid_profiles(self):
+        self.assertRaises(zar1_profile.ProfileError, zar1_profile.get_profile, 'missing')
+        for source in [
+            {'map': {'0xB0': 'U+06F0'}},
+            {'extends': 'zarnegar', 'map': {'0x100': 'U+06F0'}},
+            {'extends': 'zarnegar', 'map': {'0xB0': 1776}},
+            {'extends': 'zarnegar', 'unmapped': ['B0']},
+        ]:
+            filename = self._write_profile('invalid.json', source)
+            self.assertRaises(zar1_profile.ProfileError, zar1_profile.get_profile, filename)
+        filename = os.path.join(self.temp_dir, 'circular.json')
+        self._write_profile('circular.json', {'extends': filename})
+        self.assertRaises(zar1_profile.ProfileError, zar1_profile.get_profile, filename)
+
+    def test_profile_per_file_and_batch(self):
+        data = b'\xb4\x93\xa4\r\n\xc4\xc4\r\n'
+        profile = zar1_profile.get_profile('iran_system')
+        self.assertEqual(pickle.loads(pickle.dumps(profile)).decoding_table, profile.decoding_table)
+
+        self.assertNotEqual(
+            ZarFile.from_bytes(data, 'iran_system').get_unicode_lro_lines(),
+            ZarFile.from_bytes(data).get_unicode_lro_lines(),
+        )
+        expected = convert_bytes(data, 'unicode_rlo', 'iran_system')
+        self.assertEqual(list(convert_many([data] * 3, 'unicode_rlo', profile='iran_system')), [expected] * 3)
+        self.assertEqual(
+            list(convert_many([data] * 3, 'unicode_rlo', batch_size=1, processes=2, profile=profile)),
+            [expected] * 3,
+        )
@@ -22,8 +22,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from zarnegar_converter import unicode_bidi
 from zarnegar_converter.unicode_joining import remove_useless_joining_control_chars, ZWNJ, ZWJ as ZWJ_
+from zarnegar_converter.unicode_joining import LEFT_JOINER, RIGHT_JOINER, ZWJ_CHAR
 
 
 """
@@ -147,14 +147,22 @@ _LEGACY_TO_SEMANTIC_MAP = {
     _AHAIF: 0x0654, # ARABIC HAMZA ABOVE (mark)
 }
 
+LEGACY_TO_SEMANTIC_TABLE = {
+    legacy_cp: (
+        chr(codepoints) if type(codepoints) is int else
+        ''.join(map(chr, codepoints))
+    )
+    for legacy_cp, codepoints in _LEGACY_TO_SEMANTIC_MAP.items()
+}
+
 
 def convert_legacy_char_to_semantic_lro(legacy_char, line_no):
     codepoints = _LEGACY_TO_SEMANTIC_MAP.get(ord(legacy_char), ord(legacy_char))
     if type(codepoints) is int:
-        return unichr(codepoints)
+        return chr(codepoints)
     if type(codepoints) is list:
-        return ''.join(map(lambda cp: unichr(cp), codepoints))
-    raise Error("invalid map value")
+        return ''.join(map(chr, codepoints))
+    raise ValueError("invalid map value")
 
 def convert_legacy_line_to_semantic_lro(legacy_text, line_no):
     semantic_text = ''.join([
@@ -162,3 +170,159 @@ def convert_legacy_line_to_semantic_lro(legacy_text, line_no):
         for legacy_char in legacy_text
     ])
     return remove_useless_joining_control_chars(semantic_text)
+
+def convert_legacy_text_to_semantic_lro(legacy_text):
+    """
+    Table-driven equivalent of `convert_legacy_line_to_semantic_lro()`, which
+    also accepts multi-line text.
+    """
+    semantic_text = legacy_text.translate(LEGACY_TO_SEMANTIC_TABLE)
+    return remove_useless_joining_control_chars(semantic_text)
+
+
+# == Semantic to Legacy ==
+
+_JOINING_CONTROL_CHARS = frozenset([chr(ZWNJ), chr(ZWJ_)])
+_LEFT_JOINER_CHARS = frozenset(map(chr, LEFT_JOINER))
+_RIGHT_JOINER_CHARS = frozenset(map(chr, RIGHT_JOINER))
+
+def _get_joining_constraint(codepoint):
+    if codepoint == ZWJ_:
+        return True
+    if codepoint == ZWNJ:
+        return False
+    return None
+
+def _get_joining_score(constraint, is_joined):
+    if constraint is None:
+        return 0
+    return 1 if constraint == is_joined else -1
+
+def _build_semantic_to_legacy_tables():
+    candidates = {}
+    sequences = {}
+    for legacy_cp, codepoints in sorted(_LEGACY_TO_SEMANTIC_MAP.items()):
+        if type(codepoints) is int:
+            codepoints = [codepoints]
+        letters = ''.join([
+            chr(cp) for cp in codepoints if cp not in (ZWNJ, ZWJ_)
+        ])
+        if len(letters) > 1:
+            sequences[letters] = chr(legacy_cp)
+            continue
+        candidates.setdefault(letters, []).append((
+            _get_joining_constraint(codepoints[0]),
+            _get_joining_constraint(codepoints[-1]),
+            chr(legacy_cp),
+        ))
+
+    # Forms are indexed by `2 * joins_on_left + joins_on_right`
+    forms = {}
+    for letter, letter_candidates in candidates.items():
+        forms[letter] = tuple([
+            max(letter_candidates, key=lambda candidate: (
+                _get_joining_score(candidate[0], joins_on_left) +
+                _get_joining_score(candidate[1], joins_on_right)
+            ))[2]
+            for joins_on_left in (False, True)
+            for joins_on_right in (False, True)
+        ])
+    return forms, sequences
+
+_SEMANTIC_TO_LEGACY_FORMS, _SEMANTIC_SEQUENCE_TO_LEGACY = _build_semantic_to_legacy_tables()
+_SEMANTIC_SEQUENCE_LENGTHS = sorted(
+    set(map(len, _SEMANTIC_SEQUENCE_TO_LEGACY)), reverse=True,
+)
+
+
+def _is_joined(chr_on_left, chr_on_right):
+    if chr_on_left is None or chr_on_right is None:
+        return False
+    return chr_on_left in _RIGHT_JOINER_CHARS and chr_on_right in _LEFT_JOINER_CHARS
+
+def _joins_on_left(semantic_text, idx):
+    chr_on_left = semantic_text[idx - 1] if idx > 0 else None
+    if chr_on_left in _JOINING_CONTROL_CHARS:
+        return chr_on_left == ZWJ_CHAR
+    return _is_joined(chr_on_left, semantic_text[idx])
+
+def _joins_on_right(semantic_text, idx):
+    chr_on_right = semantic_text[idx + 1] if idx < len(semantic_text) - 1 else None
+    if chr_on_right in _JOINING_CONTROL_CHARS:
+        return chr_on_right == ZWJ_CHAR
+    return _is_joined(semantic_text[idx], chr_on_right)
+
+def convert_semantic_lro_text_to_legacy(semantic_text, start=0, end=None):
+    """
+    Choose the contextual Presentation Form of every letter in a semantic
+    text in Left-to-Right order, the inverse of
+    `convert_legacy_text_to_semantic_lro()`.
+
+    Only the characters from `start` to `end` are converted, using the ones
+    around them as context.
+    """
+    if end is None:
+        end = len(semantic_text)
+    legacy_chars = []
+    idx = start
+    while idx < end:
+        char = semantic_text[idx]
+        if char in _JOINING_CONTROL_CHARS:
+            idx += 1
+            continue
+
+        # Longest match on multi-letter forms, like LAM WITH ALEF ligature
+        for sequence_len in _SEMANTIC_SEQUENCE_LENGTHS:
+            sequence = semantic_text[idx:idx + sequence_len]
+            if sequence in _SEMANTIC_SEQUENCE_TO_LEGACY:
+                legacy_chars.append(_SEMANTIC_SEQUENCE_TO_LEGACY[sequence])
+                idx += sequence_len
+                break
+        else:
+            forms = _SEMANTIC_TO_LEGACY_FORMS.get(char)
+            if forms is None:
+                legacy_chars.append(char)
+            else:
+                legacy_chars.append(forms[
+                    2 * _joins_on_left(semantic_text, idx) +
+                    _joins_on_right(semantic_text, idx)
+                ])
+            idx += 1
+    return ''.join(legacy_chars)
+
+def get_semantic_lro_text_safe_split(semantic_text):
+    """
+    Return the length of the longest prefix of a semantic text that can be
+    converted to legacy separately, using only its last character as context
+    for the rest of the text.
+    """
+    for idx in range(len(semantic_text), 0, -1):
+        chr_on_left = semantic_text[idx - 1]
+        chr_on_right = semantic_text[idx] if idx < len(semantic_text) else None
+        if chr_on_left in _JOINING_CONTROL_CHARS:
+            continue
+        if chr_on_right is None:
+            # The form of the last character depends on the next one
+            if chr_on_left in _SEMANTIC_TO_LEGACY_FORMS:
+                continue
+        elif chr_on_right in _JOINING_CONTROL_CHARS:
+            continue
+        if _is_in_sequence(semantic_text, idx):
+            continue
+        return idx
+    return 0
+
+def _is_in_sequence(semantic_text, idx):
+    # Whether a multi-letter form may span over the split point
+    for sequence_len in _SEMANTIC_SEQUENCE_LENGTHS:
+        for start in range(max(idx - sequence_len + 1, 0), idx):
+            sequence = semantic_text[start:start + sequence_len]
+            if len(sequence) < sequence_len:
+                if any([
+                    full_sequence.startswith(sequence)
+                    for full_sequence in _SEMANTIC_SEQUENCE_TO_LEGACY
+                ]):
+                    return True
+            elif sequence in _SEMANTIC_SEQUENCE_TO_LEGACY:
+                return True
+    return False
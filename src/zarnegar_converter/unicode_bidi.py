@@ -52,9 +52,7 @@ MIRROR_MAP = {
 
 
 def get_mirrored(text):
-    return ''.join([
-        unichr(MIRROR_MAP.get(ord(char), ord(char))) for char in text
-    ])
+    return text.translate(MIRROR_MAP)
 
 def get_reversed(text):
-    return get_mirrored(reversed(text))
+    return get_mirrored(text[::-1])
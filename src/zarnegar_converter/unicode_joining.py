@@ -105,6 +105,10 @@ RIGHT_JOINER = [
 ]
 
 
+_LEFT_JOINER_SET = frozenset(LEFT_JOINER)
+_RIGHT_JOINER_SET = frozenset(RIGHT_JOINER)
+
+
 def is_zwnj(char):
     return ord(char) == ZWNJ if char is not None else False
 
@@ -112,14 +116,16 @@ def is_zwj(char):
     return ord(char) == ZWJ if char is not None else False
 
 def is_left_joiner(char):
-    return ord(char) in LEFT_JOINER if char is not None else False
+    return ord(char) in _LEFT_JOINER_SET if char is not None else False
 
 def is_right_joiner(char):
-    return ord(char) in RIGHT_JOINER if char is not None else False
+    return ord(char) in _RIGHT_JOINER_SET if char is not None else False
 
 # Applies to a Left-to-Right text
 def remove_useless_joining_control_chars(text):
-    result = ''
+    if ZWNJ_CHAR not in text and ZWJ_CHAR not in text:
+        return text
+    result = []
     text = text.replace(ZWNJ_CHAR + ZWNJ_CHAR, ZWNJ_CHAR)
     text = text.replace(ZWJ_CHAR + ZWJ_CHAR, ZWJ_CHAR)
     text_len = len(text)
@@ -133,5 +139,8 @@ def remove_useless_joining_control_chars(text):
         if is_zwj(chr_current):
             if is_right_joiner(chr_on_left) and is_left_joiner(chr_on_right):
                 continue
-        result += chr_current
-    return result
+        result.append(chr_current)
+    return ''.join(result)
+
+def remove_joining_control_chars(text):
+    return text.replace(ZWNJ_CHAR, '').replace(ZWJ_CHAR, '')
@@ -0,0 +1,203 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import codecs
+
+from zarnegar_converter import unicode_arabic
+from zarnegar_converter import unicode_joining
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.zar1_encoding import ZAR1_LEGACY_DECODING_TABLE
+from zarnegar_converter.zar1_encoding import ZAR1_LEGACY_ENCODING_TABLE
+
+
+"""
+Python Codecs for Zarnegar1 Encoding
+
+Importing this module registers the following codecs:
+
+  * zar1, zar1_semantic   Unicode Arabic semantic (standard) encoding
+  * zar1_legacy           Legacy Unicode Arabic Presentation Form encoding
+
+Decoded text is in the visual, Left-to-Right order of the Zar1 bytes, same as
+the `*_lro` output formats, but without any bidi override characters.
+"""
+
+
+def _is_joining_control_char(char):
+    return unicode_joining.is_zwnj(char) or unicode_joining.is_zwj(char)
+
+def _get_semantic_text(byte):
+    legacy_char = ZAR1_LEGACY_DECODING_TABLE[byte]
+    return legacy_char.translate(unicode_arabic.LEGACY_TO_SEMANTIC_TABLE)
+
+# Bytes which expand to a joining control character at their start or end.
+# Removing useless joining control characters only looks at the immediate
+# neighbors, so the semantic text can be processed in separate pieces, as
+# long as they are split between two bytes that are not marked here.
+_STARTS_WITH_JOINING_CONTROL = [
+    _is_joining_control_char(_get_semantic_text(byte)[0])
+    for byte in range(0x100)
+]
+_ENDS_WITH_JOINING_CONTROL = [
+    _is_joining_control_char(_get_semantic_text(byte)[-1])
+    for byte in range(0x100)
+]
+
+
+def _get_safe_split(input):
+    data = memoryview(input)
+    for idx in range(len(data) - 1, 0, -1):
+        if not (
+            _ENDS_WITH_JOINING_CONTROL[data[idx - 1]] or
+            _STARTS_WITH_JOINING_CONTROL[data[idx]]
+        ):
+            return idx
+    return 0
+
+
+# == Zar1, Legacy ==
+
+def legacy_encode(input, errors='strict'):
+    return codecs.charmap_encode(input, errors, ZAR1_LEGACY_ENCODING_TABLE)
+
+def legacy_decode(input, errors='strict'):
+    return codecs.charmap_decode(input, errors, ZAR1_LEGACY_DECODING_TABLE)
+
+
+class LegacyIncrementalEncoder(codecs.IncrementalEncoder):
+    def encode(self, input, final=False):
+        return legacy_encode(input, self.errors)[0]
+
+class LegacyIncrementalDecoder(codecs.IncrementalDecoder):
+    def decode(self, input, final=False):
+        return legacy_decode(input, self.errors)[0]
+
+class LegacyStreamWriter(codecs.StreamWriter):
+    def encode(self, input, errors='strict'):
+        return legacy_encode(input, errors)
+
+class LegacyStreamReader(codecs.StreamReader):
+    def decode(self, input, errors='strict'):
+        return legacy_decode(input, errors)
+
+
+# == Zar1, Semantic ==
+
+def semantic_encode(input, errors='strict'):
+    return zar1_encoding.convert_semantic_lro_text_to_zar1(input, errors), len(input)
+
+def _semantic_buffer_decode(input, errors, final):
+    consumed = len(input) if final else _get_safe_split(input)
+    legacy_text, _ = codecs.charmap_decode(
+        input[:consumed], errors, ZAR1_LEGACY_DECODING_TABLE,
+    )
+    return unicode_arabic.convert_legacy_text_to_semantic_lro(legacy_text), consumed
+
+def semantic_decode(input, errors='strict'):
+    return _semantic_buffer_decode(input, errors, True)
+
+
+class SemanticIncrementalEncoder(codecs.IncrementalEncoder):
+    """
+    Keeps the characters whose form depends on the next input, and the last
+    encoded character as context for them.
+    """
+
+    def __init__(self, errors='strict'):
+        codecs.IncrementalEncoder.__init__(self, errors)
+        self._buffer = ''
+        self._context_len = 0
+
+    def encode(self, input, final=False):
+        text = self._buffer + input
+        if final:
+            end = len(text)
+        else:
+            end = unicode_arabic.get_semantic_lro_text_safe_split(text)
+        if end <= self._context_len:
+            self._buffer = text
+            return b''
+        legacy_text = unicode_arabic.convert_semantic_lro_text_to_legacy(
+            text, self._context_len, end,
+        )
+        if final:
+            self.reset()
+        else:
+            self._buffer = text[end - 1:]
+            self._context_len = 1
+        return zar1_encoding.convert_unicode_legacy_text_to_zar1(legacy_text, self.errors)
+
+    def reset(self):
+        self._buffer = ''
+        self._context_len = 0
+
+class SemanticIncrementalDecoder(codecs.BufferedIncrementalDecoder):
+    def _buffer_decode(self, input, errors, final):
+        return _semantic_buffer_decode(input, errors, final)
+
+class SemanticStreamWriter(codecs.StreamWriter):
+    def encode(self, input, errors='strict'):
+        return semantic_encode(input, errors)
+
+class SemanticStreamReader(codecs.StreamReader):
+    def decode(self, input, errors='strict'):
+        # `StreamReader.read()` keeps the undecoded bytes in `bytebuffer`, and
+        # only passes them alone to `decode()` at the end of the stream.
+        final = len(input) == len(self.bytebuffer)
+        return _semantic_buffer_decode(input, errors, final)
+
+
+# == Registration ==
+
+_LEGACY_CODEC_INFO = codecs.CodecInfo(
+    name='zar1_legacy',
+    encode=legacy_encode,
+    decode=legacy_decode,
+    incrementalencoder=LegacyIncrementalEncoder,
+    incrementaldecoder=LegacyIncrementalDecoder,
+    streamwriter=LegacyStreamWriter,
+    streamreader=LegacyStreamReader,
+)
+
+_SEMANTIC_CODEC_INFO = codecs.CodecInfo(
+    name='zar1',
+    encode=semantic_encode,
+    decode=semantic_decode,
+    incrementalencoder=SemanticIncrementalEncoder,
+    incrementaldecoder=SemanticIncrementalDecoder,
+    streamwriter=SemanticStreamWriter,
+    streamreader=SemanticStreamReader,
+)
+
+_CODECS = {
+    'zar1': _SEMANTIC_CODEC_INFO,
+    'zar1_semantic': _SEMANTIC_CODEC_INFO,
+    'zar1_legacy': _LEGACY_CODEC_INFO,
+}
+
+
+def search_function(encoding):
+    return _CODECS.get(encoding.lower().replace('-', '_'))
+
+codecs.register(search_function)
@@ -22,6 +22,9 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
+import codecs
+import hashlib
 import logging
 
 from zarnegar_converter import unicode_arabic
@@ -33,7 +36,8 @@ Convert Zarnegar Encoding to Unicode Arabic Presentation Form
 
 _AHAIF = unicode_arabic.ARABIC_HAMZA_ABOVE_ISOLATED_FORM_PUA
 
-_IRAN_SYSTEM_MAP = {
+# Iran System mapping of the high bytes, the base of the Zarnegar mapping
+IRAN_SYSTEM_MAP = {
     # Numerals
     0x80: 0x06F0,   # EXTENDED ARABIC-INDIC DIGIT ZERO
     0x81: 0x06F1,   # EXTENDED ARABIC-INDIC DIGIT ONE
@@ -184,7 +188,8 @@ _IRAN_SYSTEM_MAP = {
     0xFF: 0x00A0,   # NO-BREAK SPACE
 }
 
-_ZARNEGAR_OVERRIDES_MAP = {
+# Zarnegar mappings, overriding the Iran System and ASCII ones
+ZARNEGAR_OVERRIDES_MAP = {
     0x00: 0x0000,
     0x01: 0x0001,
 
@@ -229,50 +234,239 @@ _ZARNEGAR_OVERRIDES_MAP = {
 }
 
 _ZARNEGAR_MAP = dict(enumerate(range(0x80)))
-_ZARNEGAR_MAP.update(_IRAN_SYSTEM_MAP)
-_ZARNEGAR_MAP.update(_ZARNEGAR_OVERRIDES_MAP)
+_ZARNEGAR_MAP.update(IRAN_SYSTEM_MAP)
+_ZARNEGAR_MAP.update(ZARNEGAR_OVERRIDES_MAP)
 
+# Decoding table for `codecs.charmap_decode()`
+ZAR1_LEGACY_DECODING_TABLE = ''.join([
+    chr(_ZARNEGAR_MAP[byte]) for byte in range(0x100)
+])
 
-def _in_zar_override(char_byte):
-    return ord(char_byte) in _ZARNEGAR_OVERRIDES_MAP
+# Encoding table for `codecs.charmap_encode()`
+ZAR1_LEGACY_ENCODING_TABLE = codecs.charmap_build(ZAR1_LEGACY_DECODING_TABLE)
 
-def convert_zar_byte_to_legacy_char(char_byte, line_no):
-    codepoints = _ZARNEGAR_MAP[ord(char_byte)]
+
+# Bytes without a known mapping in Zarnegar, reported as errors when converted
+ZAR1_UNMAPPED_BYTES = bytes([
+    byte for byte in list(range(0x00, 0x20)) + list(range(0xB0, 0xE0))
+    if byte not in ZARNEGAR_OVERRIDES_MAP
+])
+
+def has_unmapped_zar_bytes(zar1_line):
+    return DEFAULT_PROFILE.has_unmapped_zar_bytes(zar1_line)
+
+def get_unmapped_zar_bytes(zar1_line):
+    """
+    Return the (column, byte value) pairs of the unmapped bytes of a line.
+    """
+    return DEFAULT_PROFILE.get_unmapped_zar_bytes(zar1_line)
+
+
+def _in_zar_override(zar_byte):
+    return zar_byte in ZARNEGAR_OVERRIDES_MAP
+
+def convert_zar_byte_to_legacy_char(zar_byte, line_no):
+    codepoints = _ZARNEGAR_MAP[zar_byte]
 
     if type(codepoints) is int:
         # "U+%04X" % ord(char) if char is not None else "NONE"
-        #if ord(char_byte) in range(0x00, 0x20):
-        if ord(char_byte) in range(0x00, 0x20) and not _in_zar_override(char_byte):
-            logging.error('zar_legacy: ERROR1: Line %4d:   0x%02X', line_no, ord(char_byte))
-        #if ord(char_byte) in range(0xB0, 0xE0):
-        if ord(char_byte) in range(0xB0, 0xE0) and not _in_zar_override(char_byte):
-            logging.error('zar_legacy: ERROR2: Line %4d:   0x%02X', line_no, ord(char_byte))
-        return unichr(codepoints)
+        #if zar_byte in range(0x00, 0x20):
+        if zar_byte in range(0x00, 0x20) and not _in_zar_override(zar_byte):
+            logging.error('zar_legacy: ERROR1: Line %4d:   0x%02X', line_no, zar_byte)
+        #if zar_byte in range(0xB0, 0xE0):
+        if zar_byte in range(0xB0, 0xE0) and not _in_zar_override(zar_byte):
+            logging.error('zar_legacy: ERROR2: Line %4d:   0x%02X', line_no, zar_byte)
+        return chr(codepoints)
 
     if type(codepoints) is list:
-        return ''.join(map(lambda cp: unichr(cp), codepoints))
+        return ''.join(map(chr, codepoints))
 
-    raise Error("invalid map value")
+    raise ValueError("invalid map value")
 
-def convert_zar1_line_to_unicode_legacy_lro(zar1_line, line_no):
-    legacy_text = ''.join([
+def convert_zar1_line_to_legacy_lro_per_byte(zar1_line, line_no):
+    """
+    Reference implementation of `convert_zar1_line_to_legacy_lro()`, one byte
+    at a time.
+    """
+    return ''.join([
         convert_zar_byte_to_legacy_char(zar_byte, line_no)
         for zar_byte in zar1_line
     ])
+
+def log_unmapped_zar_bytes(unmapped_zar_bytes, line_no):
+    for _, zar_byte in unmapped_zar_bytes:
+        error_name = 'ERROR1' if zar_byte < 0x20 else 'ERROR2'
+        logging.error('zar_legacy: %s: Line %4d:   0x%02X', error_name, line_no, zar_byte)
+
+def convert_zar1_line_to_legacy_lro(zar1_line, line_no):
+    return DEFAULT_PROFILE.convert_zar1_line_to_legacy_lro(zar1_line, line_no)
+
+
+# == Plain Lines ==
+
+LINE_KIND_ASCII = 'ascii'
+LINE_KIND_BOX_DRAWING = 'box_drawing'
+
+def get_plain_line_kind(zar1_line):
+    """
+    Return the kind of a plain line, or None for other lines.
+    """
+    return DEFAULT_PROFILE.get_plain_line_kind(zar1_line)
+
+def convert_plain_zar1_line_to_lro(zar1_line, line_no):
+    """
+    Return the (legacy and semantic) text of a plain line, or None for other
+    lines.
+    """
+    return DEFAULT_PROFILE.convert_plain_zar1_line_to_lro(zar1_line, line_no)
+
+
+# == Mapping Profiles ==
+
+def _is_box_drawing_char(char):
+    return 0x2500 <= ord(char) <= 0x259F
+
+class MappingProfile(object):
+    """
+    Mapping of the Zar1 bytes to Unicode (legacy) characters, with the bytes
+    without a known mapping, which are reported when converted.  Profiles
+    other than the default are compiled by `zar1_profile`.
+    """
+
+    def __init__(self, name, decoding_table, unmapped_bytes):
+        self.name = name
+        self.decoding_table = decoding_table
+        self.encoding_table = codecs.charmap_build(decoding_table)
+        self.unmapped_bytes = unmapped_bytes
+        canonical = json.dumps([name, decoding_table, list(unmapped_bytes)], separators=(',', ':'))
+        self.digest = hashlib.sha1(canonical.encode('utf8')).hexdigest()
+
+        # Lines of only these bytes (blank, ASCII, and box-drawing lines) have
+        # the same legacy and semantic text, without any joining control
+        # characters, so they skip the semantic mapping and the joining
+        # cleanup.
+        self._ascii_bytes = bytes([
+            byte for byte in range(0x20, 0x80)
+            if decoding_table[byte] == chr(byte) and byte not in unmapped_bytes
+        ])
+        self._plain_bytes = self._ascii_bytes + bytes([
+            byte for byte in range(0x80, 0x100)
+            if _is_box_drawing_char(decoding_table[byte])
+        ])
+
+    def __reduce__(self):
+        # The tables are rebuilt, as the encoding table cannot be pickled
+        return (MappingProfile, (self.name, self.decoding_table, self.unmapped_bytes))
+
+    def has_unmapped_zar_bytes(self, zar1_line):
+        return len(zar1_line.translate(None, self.unmapped_bytes)) != len(zar1_line)
+
+    def get_unmapped_zar_bytes(self, zar1_line):
+        """
+        Return the (column, byte value) pairs of the unmapped bytes of a line.
+        """
+        if not self.has_unmapped_zar_bytes(zar1_line):
+            return []
+        return [
+            (column, byte)
+            for column, byte in enumerate(zar1_line)
+            if byte in self.unmapped_bytes
+        ]
+
+    def convert_zar1_line_to_legacy_lro(self, zar1_line, line_no):
+        if self.has_unmapped_zar_bytes(zar1_line):
+            log_unmapped_zar_bytes(self.get_unmapped_zar_bytes(zar1_line), line_no)
+        return codecs.charmap_decode(zar1_line, 'strict', self.decoding_table)[0]
+
+    def get_plain_line_kind(self, zar1_line):
+        """
+        Return the kind of a plain line, or None for other lines.
+        """
+        if zar1_line.translate(None, self._plain_bytes):
+            return None
+        if zar1_line.translate(None, self._ascii_bytes):
+            return LINE_KIND_BOX_DRAWING
+        return LINE_KIND_ASCII
+
+    def convert_plain_zar1_line_to_lro(self, zar1_line, line_no):
+        """
+        Return the (legacy and semantic) text of a plain line, or None for
+        other lines.
+        """
+        line_kind = self.get_plain_line_kind(zar1_line)
+        if line_kind is None:
+            return None
+        if line_kind is LINE_KIND_ASCII:
+            return str(zar1_line, 'ascii')
+        # Box-drawing bytes are reported as unmapped, same as the per-byte path
+        return self.convert_zar1_line_to_legacy_lro(zar1_line, line_no)
+
+    def convert_zar1_line_to_legacy_text(self, zar1_line, line_no):
+        """
+        Return the legacy text of a line, and whether it is a plain line,
+        which is also its semantic text.
+        """
+        plain_text = self.convert_plain_zar1_line_to_lro(zar1_line, line_no)
+        if plain_text is not None:
+            return plain_text, True
+        return self.convert_zar1_line_to_legacy_lro(zar1_line, line_no), False
+
+    def convert_unicode_legacy_text_to_zar1(self, legacy_text, errors='strict'):
+        return codecs.charmap_encode(legacy_text, errors, self.encoding_table)[0]
+
+
+# The default Zarnegar mapping
+DEFAULT_PROFILE = MappingProfile('zarnegar', ZAR1_LEGACY_DECODING_TABLE, ZAR1_UNMAPPED_BYTES)
+
+
+# == Zar1 to Unicode ==
+
+# The optional `profile` is a `MappingProfile`, used instead of the default
+# Zarnegar mapping.
+
+def convert_zar1_line_to_unicode_legacy_lro(zar1_line, line_no, profile=DEFAULT_PROFILE):
+    legacy_text, _ = profile.convert_zar1_line_to_legacy_text(zar1_line, line_no)
     return unicode_bidi.LRO_CHAR + legacy_text
 
-def convert_zar1_line_to_semantic_lro(zar_text, line_no):
-    legacy_text = ''.join([
-        convert_zar_byte_to_legacy_char(zar_byte, line_no)
-        for zar_byte in zar_text
-    ])
-    return unicode_arabic.convert_legacy_line_to_semantic_lro(legacy_text, line_no)
+def convert_zar1_line_to_semantic_lro(zar_text, line_no, profile=DEFAULT_PROFILE):
+    legacy_text, is_plain = profile.convert_zar1_line_to_legacy_text(zar_text, line_no)
+    if is_plain:
+        return legacy_text
+    return unicode_arabic.convert_legacy_text_to_semantic_lro(legacy_text)
 
-def convert_zar1_line_to_unicode_lro(zar_text, line_no):
-    lro_text = convert_zar1_line_to_semantic_lro(zar_text, line_no)
+def convert_zar1_line_to_unicode_lro(zar_text, line_no, profile=DEFAULT_PROFILE):
+    lro_text = convert_zar1_line_to_semantic_lro(zar_text, line_no, profile)
     return unicode_bidi.LRO_CHAR + lro_text
 
-def convert_zar1_line_to_unicode_rlo(zar_text, line_no):
-    lro_text = convert_zar1_line_to_semantic_lro(zar_text, line_no)
+def convert_zar1_line_to_unicode_rlo(zar_text, line_no, profile=DEFAULT_PROFILE):
+    lro_text = convert_zar1_line_to_semantic_lro(zar_text, line_no, profile)
     rlo_text = unicode_bidi.get_reversed(lro_text)
     return unicode_bidi.RLO_CHAR + rlo_text
+
+
+# == Unicode to Zar1 ==
+
+def _strip_override_char(unicode_line, override_char):
+    if unicode_line.startswith(override_char):
+        return unicode_line[len(override_char):]
+    return unicode_line
+
+def convert_unicode_legacy_text_to_zar1(legacy_text, errors='strict', profile=DEFAULT_PROFILE):
+    return profile.convert_unicode_legacy_text_to_zar1(legacy_text, errors)
+
+def convert_semantic_lro_text_to_zar1(semantic_text, errors='strict', profile=DEFAULT_PROFILE):
+    legacy_text = unicode_arabic.convert_semantic_lro_text_to_legacy(semantic_text)
+    return convert_unicode_legacy_text_to_zar1(legacy_text, errors, profile)
+
+def convert_unicode_legacy_lro_line_to_zar1(unicode_line, errors='strict', profile=DEFAULT_PROFILE):
+    legacy_text = _strip_override_char(unicode_line, unicode_bidi.LRO_CHAR)
+    return convert_unicode_legacy_text_to_zar1(legacy_text, errors, profile)
+
+def convert_unicode_lro_line_to_zar1(unicode_line, errors='strict', profile=DEFAULT_PROFILE):
+    lro_text = _strip_override_char(unicode_line, unicode_bidi.LRO_CHAR)
+    return convert_semantic_lro_text_to_zar1(lro_text, errors, profile)
+
+def convert_unicode_rlo_line_to_zar1(unicode_line, errors='strict', profile=DEFAULT_PROFILE):
+    rlo_text = _strip_override_char(unicode_line, unicode_bidi.RLO_CHAR)
+    lro_text = unicode_bidi.get_reversed(rlo_text)
+    return convert_semantic_lro_text_to_zar1(lro_text, errors, profile)
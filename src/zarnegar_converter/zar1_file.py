@@ -22,18 +22,25 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import sys
 import struct
 import logging
+import binascii
+import itertools
+import collections
 
+from zarnegar_converter import unicode_arabic
+from zarnegar_converter import unicode_bidi
 from zarnegar_converter import zar1_encoding
-from zarnegar_converter.zar_file import ZarFile, ZarFileTypeError, OUTPUT_NEW_LINE
+from zarnegar_converter.zar_file import ZarFile, ZarFileTypeError, ZarFileFormatError
+from zarnegar_converter.zar_file import OUTPUT_NEW_LINE, OUTPUT_NEW_LINE_TEXT
+from zarnegar_converter.zar_file import PeekableFile, register_file_type
 
 
 """
 Read-only view on a Zarnegar File
 
 Generates a list of 80-byte-wide lines from a Zarnegar text or binary file.
+`Zar1BinaryWriter` writes lines back as a Zarnegar binary file.
 """
 
 
@@ -57,15 +64,49 @@ _BINARY_LINE_INFO_FMT = (
 )
 _binary_line_info_struct = struct.Struct(_BINARY_LINE_INFO_FMT)
 
+BINARY_HEADER_SIZE = len(_BINARY_MAGIC) + _binary_header_struct.size
+
+_BINARY_MAX_COUNT = 0xFFFF
+_BINARY_USER_DATA_SIZE = 10
+
+
+def get_binary_header_counts(head):
+    """
+    Return the lines count and the total text length in the header of a Zar1
+    Binary file, from its first `BINARY_HEADER_SIZE` bytes, or None if it is
+    not a Zar1 Binary file.
+    """
+    if len(head) < BINARY_HEADER_SIZE or head[:len(_BINARY_MAGIC)] != _BINARY_MAGIC:
+        return None
+    return _binary_header_struct.unpack_from(head, len(_BINARY_MAGIC))[:2]
+
 
 class Zar1File(ZarFile):
 
-    @staticmethod
-    def get(in_file):
-        try:
-            return Zar1BinaryFile(in_file)
-        except ZarFileTypeError:
-            return Zar1TextFile(in_file)
+    @classmethod
+    def from_bytes(cls, data, limits=None):
+        zar_file = cls.__new__(cls)
+        zar_file._file = None
+        zar_file._lines = []
+        zar_file._parse(data, limits)
+        return zar_file
+
+    def _read(self, limits):
+        if limits is None:
+            data = self._file.read()
+        else:
+            # Stop reading right after the limit
+            data = self._file.read(limits.max_bytes + 1)
+            limits.check_bytes(len(data))
+        self._parse(data, limits)
+
+    @classmethod
+    def _get_scan_metadata(cls, lines_count, text_length):
+        return collections.OrderedDict([
+            ('format', cls.FORMAT),
+            ('lines_count', lines_count),
+            ('text_length', text_length),
+        ])
 
     def _append_line(self, text):
         rest = b' ' * (_LINE_WIDTH - len(text))
@@ -86,13 +127,13 @@ class Zar1File(ZarFile):
 
     def get_unicode_legacy_lro_output(self):
         return ''.join([
-            line.rstrip() + OUTPUT_NEW_LINE
+            line.rstrip() + OUTPUT_NEW_LINE_TEXT
             for line in self.get_unicode_legacy_lro_lines()
         ])
 
     def get_unicode_legacy_lro_lines(self):
         return [
-            zar1_encoding.convert_zar1_line_to_unicode_legacy_lro(zar1_line, line_no)
+            zar1_encoding.convert_zar1_line_to_unicode_legacy_lro(zar1_line, line_no, self.profile)
             for line_no, zar1_line in enumerate(self._lines, start=1)
         ]
 
@@ -100,13 +141,13 @@ class Zar1File(ZarFile):
 
     def get_unicode_lro_output(self):
         return ''.join([
-            line.rstrip() + OUTPUT_NEW_LINE
+            line.rstrip() + OUTPUT_NEW_LINE_TEXT
             for line in self.get_unicode_lro_lines()
         ])
 
     def get_unicode_lro_lines(self):
         return [
-            zar1_encoding.convert_zar1_line_to_unicode_lro(zar1_line, line_no)
+            zar1_encoding.convert_zar1_line_to_unicode_lro(zar1_line, line_no, self.profile)
             for line_no, zar1_line in enumerate(self._lines, start=1)
         ]
 
@@ -114,63 +155,255 @@ class Zar1File(ZarFile):
 
     def get_unicode_rlo_output(self):
         return ''.join([
-            line.rstrip() + OUTPUT_NEW_LINE
+            line.rstrip() + OUTPUT_NEW_LINE_TEXT
             for line in self.get_unicode_rlo_lines()
         ])
 
     def get_unicode_rlo_lines(self):
         return [
-            zar1_encoding.convert_zar1_line_to_unicode_rlo(zar1_line, line_no)
+            zar1_encoding.convert_zar1_line_to_unicode_rlo(zar1_line, line_no, self.profile)
             for line_no, zar1_line in enumerate(self._lines, start=1)
         ]
 
+    # == Line Records ==
+
+    def iter_line_records(self):
+        """
+        Yield the metadata and the conversions of every line, converting each
+        line only once.
+        """
+        for line_no, zar1_line in enumerate(self._lines, start=1):
+            yield get_line_record(zar1_line, line_no, self.profile)
+
+
+def get_line_record(zar1_line, line_no, profile=zar1_encoding.DEFAULT_PROFILE):
+    """
+    Return the metadata and the conversions of a line.
+    """
+    legacy_text = profile.convert_zar1_line_to_legacy_lro(zar1_line, line_no)
+    lro_text = unicode_arabic.convert_legacy_text_to_semantic_lro(legacy_text)
+    zar1_text = zar1_line.rstrip()
+    return collections.OrderedDict([
+        ('line_no', line_no),
+        ('indent', len(zar1_text) - len(zar1_text.lstrip())),
+        ('zar1', binascii.hexlify(zar1_text).decode('ascii')),
+        ('legacy', legacy_text.rstrip()),
+        ('semantic', unicode_bidi.get_reversed(lro_text).rstrip()),
+        ('unmapped', [
+            collections.OrderedDict([('column', column), ('byte', '0x%02X' % byte)])
+            for column, byte in profile.get_unmapped_zar_bytes(zar1_line)
+        ]),
+    ])
+
 
 class Zar1TextFile(Zar1File):
 
-    def __init__(self, in_file):
-        self._file = in_file
-        self._lines = []
-        self._read()
+    FORMAT = 'zar1_text'
 
-    def _read(self):
-        logging.info(b'Reading Zar1 Text file...')
-        self._file.seek(0)
-        for line in self._file.readlines():
+    def __init__(self, in_file, limits=None):
+        self._file = PeekableFile.wrap(in_file)
+        self._lines = []
+        self._read(limits)
+
+    @classmethod
+    def _scan(cls, in_file):
+        lines_count = 0
+        text_length = 0
+        for line in in_file:
+            lines_count += 1
+            text_length += len(line.strip())
+        return cls._get_scan_metadata(lines_count, text_length)
+
+    def _parse(self, data, limits=None):
+        logging.info('Reading Zar1 Text file...')
+        if limits is not None:
+            deadline = limits.get_deadline()
+            limits.check_bytes(len(data))
+            limits.check_lines(data.count(b'\n') + (not data.endswith(b'\n')))
+        lines = data.split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        offset = 0
+        for line_idx, line in enumerate(lines):
             text = line.rstrip()  # Drop CRLF
             self._append_line(text)
+            offset += len(line) + 1
+            if limits is not None and line_idx % 1024 == 1023:
+                limits.check_deadline(deadline, offset)
+        if limits is not None:
+            limits.check_deadline(deadline, len(data))
 
 
 class Zar1BinaryFile(Zar1File):
 
-    def __init__(self, in_file):
-        self._file = in_file
-        self._verify_magic_number()
+    FORMAT = 'zar1_binary'
+
+    def __init__(self, in_file, limits=None):
+        self._file = PeekableFile.wrap(in_file)
+        self._verify_magic_number(self._file.peek(len(_BINARY_MAGIC)))
         self._lines = []
-        self._read()
+        self._read(limits)
+
+    @classmethod
+    def from_bytes(cls, data, limits=None):
+        cls._verify_magic_number(data[:len(_BINARY_MAGIC)])
+        return super(Zar1BinaryFile, cls).from_bytes(data, limits)
 
-    def _verify_magic_number(self):
-        self._file.seek(0)
-        magic = self._file.read(len(_BINARY_MAGIC))
+    @staticmethod
+    def _verify_magic_number(magic):
         if magic != _BINARY_MAGIC:
             raise ZarFileTypeError("Not a Zar1 Binary File")
 
-    def _read(self):
-        logging.info(b'Reading Zar1 Binary file...')
-        self._file.seek(len(_BINARY_MAGIC))
+    @classmethod
+    def _scan(cls, in_file):
+        # Only the header and the line info table are read
+        head = in_file.read(len(_BINARY_MAGIC) + _binary_header_struct.size)
+        cls._verify_magic_number(head[:len(_BINARY_MAGIC)])
+        if len(head) < len(_BINARY_MAGIC) + _binary_header_struct.size:
+            raise ZarFileTypeError("Truncated Zar1 Binary File")
+        lines_count = _binary_header_struct.unpack_from(head, len(_BINARY_MAGIC))[0]
+
+        line_infos = in_file.read(lines_count * _binary_line_info_struct.size)
+        if len(line_infos) < lines_count * _binary_line_info_struct.size:
+            raise ZarFileTypeError("Truncated Zar1 Binary File")
+        text_length = sum([
+            line_info[2]
+            for line_info in _binary_line_info_struct.iter_unpack(line_infos)
+        ])
+        return cls._get_scan_metadata(lines_count, text_length)
 
-        header = _binary_header_struct.unpack(
-            self._file.read(_binary_header_struct.size),
-        )
+    @staticmethod
+    def _validate(data, limits):
+        """
+        Check the header and the line info table against the size of the
+        data, before any line is allocated.
+        """
+        deadline = limits.get_deadline()
+        limits.check_bytes(len(data))
+        offset = len(_BINARY_MAGIC)
+        if len(data) < offset + _binary_header_struct.size:
+            raise ZarFileFormatError('truncated_header', "Truncated Zar1 Binary header", len(data))
+        lines_count, total_text_len, _ = _binary_header_struct.unpack_from(data, offset)
+        limits.check_lines(lines_count)
+
+        offset += _binary_header_struct.size
+        text_offset = offset + lines_count * _binary_line_info_struct.size
+        if text_offset > len(data):
+            raise ZarFileFormatError('truncated_line_table', "Truncated Zar1 Binary line table", len(data))
+
+        # Cumulative lengths are only checked to be in order, and within the
+        # total, as their exact meaning is not known
+        text_len_sum = 0
+        last_cumulative_len = 0
+        line_infos = _binary_line_info_struct.iter_unpack(memoryview(data)[offset:text_offset])
+        for line_idx, (_, cumulative_len, text_len) in enumerate(line_infos):
+            if not last_cumulative_len <= cumulative_len <= total_text_len:
+                raise ZarFileFormatError(
+                    'invalid_cumulative_length',
+                    "Invalid cumulative text length of line %d" % (line_idx + 1),
+                    offset + line_idx * _binary_line_info_struct.size,
+                )
+            last_cumulative_len = cumulative_len
+            text_len_sum += text_len
+            if line_idx % 1024 == 1023:
+                limits.check_deadline(deadline, offset + line_idx * _binary_line_info_struct.size)
+
+        if text_len_sum != total_text_len:
+            raise ZarFileFormatError(
+                'text_length_mismatch',
+                "Zar1 Binary header has %d bytes of text, lines have %d" % (total_text_len, text_len_sum),
+                len(_BINARY_MAGIC),
+            )
+        if text_offset + text_len_sum > len(data):
+            raise ZarFileFormatError('truncated_text', "Truncated Zar1 Binary text", len(data))
+        limits.check_deadline(deadline, text_offset)
+
+    def _parse(self, data, limits=None):
+        logging.info('Reading Zar1 Binary file...')
+        if limits is not None:
+            self._validate(data, limits)
+        offset = len(_BINARY_MAGIC)
+
+        header = _binary_header_struct.unpack_from(data, offset)
+        offset += _binary_header_struct.size
         lines_count = header[0]
+        self.user_data = header[2]
 
         line_infos = []
         for line_idx in range(lines_count):
-            read_bytes = self._file.read(_binary_line_info_struct.size)
-            line_info = _binary_line_info_struct.unpack(read_bytes)
+            line_info = _binary_line_info_struct.unpack_from(data, offset)
+            offset += _binary_line_info_struct.size
             line_infos.append(line_info)
 
         for line_info in line_infos:
             left_indent = line_info[0]
             text_len = line_info[2]
-            text = b' ' * left_indent + self._file.read(text_len)
+            text = b' ' * left_indent + data[offset:offset + text_len]
+            offset += text_len
             self._append_line(text)
+
+
+class Zar1BinaryWriter(object):
+    """
+    Write Zar1 lines as a Zar1 Binary file, with the installation/user data
+    of the header, like the `user_data` of a `Zar1BinaryFile`.
+
+    The leading spaces of every line are stored as its left indent, and the
+    trailing spaces are dropped, as `Zar1BinaryFile` pads the lines back to
+    the line width.  The cumulative text length of every line is the length
+    of the text before it.
+    """
+
+    def __init__(self, zar1_lines, user_data=b''):
+        if len(user_data) > _BINARY_USER_DATA_SIZE:
+            raise ValueError("Zar1 Binary user data is longer than %d bytes" % _BINARY_USER_DATA_SIZE)
+        self._user_data = user_data
+        self._line_infos = []
+        self._texts = []
+        self._text_len = 0
+        for line_no, zar1_line in enumerate(zar1_lines, start=1):
+            if len(zar1_line) > _LINE_WIDTH:
+                raise ValueError("Zar1 line %d is longer than %d bytes" % (line_no, _LINE_WIDTH))
+            line = zar1_line.rstrip(b' ')
+            text = line.lstrip(b' ')
+            self._line_infos.append((len(line) - len(text), self._text_len, len(text)))
+            self._texts.append(text)
+            self._text_len += len(text)
+        if len(self._line_infos) > _BINARY_MAX_COUNT:
+            raise ValueError("Too many lines for a Zar1 Binary file: %d" % len(self._line_infos))
+        if self._text_len > _BINARY_MAX_COUNT:
+            raise ValueError("Too much text for a Zar1 Binary file: %d bytes" % self._text_len)
+
+    def _pack(self):
+        lines_count = len(self._line_infos)
+        text_offset = (
+            len(_BINARY_MAGIC) +
+            _binary_header_struct.size +
+            lines_count * _binary_line_info_struct.size
+        )
+        data = bytearray(text_offset + self._text_len)
+        data[:len(_BINARY_MAGIC)] = _BINARY_MAGIC
+        _binary_header_struct.pack_into(
+            data, len(_BINARY_MAGIC), lines_count, self._text_len, self._user_data,
+        )
+        # The whole line info table is packed in one call
+        line_infos_struct = struct.Struct(
+            _BINARY_LINE_INFO_FMT[0] + _BINARY_LINE_INFO_FMT[1:] * lines_count
+        )
+        line_infos_struct.pack_into(
+            data,
+            len(_BINARY_MAGIC) + _binary_header_struct.size,
+            *itertools.chain.from_iterable(self._line_infos)
+        )
+        data[text_offset:] = b''.join(self._texts)
+        return data
+
+    def get_bytes(self):
+        return bytes(self._pack())
+
+    def write(self, out_file):
+        out_file.write(self._pack())
+
+
+register_file_type(_BINARY_MAGIC, Zar1BinaryFile)
+register_file_type(b'', Zar1TextFile)
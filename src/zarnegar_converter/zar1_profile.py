@@ -0,0 +1,198 @@
+# coding: utf-8
+
+# Copyright (C) 2017  Behnam Esfahbod
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Behnam Esfahbod <behnam@zwnj.org>
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import json
+import threading
+
+from zarnegar_converter import zar1_encoding
+from zarnegar_converter.zar1_encoding import MappingProfile, DEFAULT_PROFILE
+
+
+"""
+Mapping Profiles for Zarnegar Variants
+
+A mapping profile assigns a Unicode (legacy) character to every Zar1 byte, and
+lists the bytes without a known mapping, which are reported when converted.
+Profiles are JSON files, of the form:
+
+    {
+      "name": "iran_system",
+      "description": "Iran System, without the Zarnegar overrides",
+      "extends": "zarnegar",
+      "map": {"0xB0": "U+2591", ...},
+      "unmapped": ["0x00", ...]
+    }
+
+where `extends` and `unmapped` are optional.  The `map` entries are applied on
+top of the extended profile, and `unmapped`, if present, replaces its list.
+
+The built-in `zarnegar` profile, the default, is `zar1_encoding.DEFAULT_PROFILE`.  Other built-in profiles are in the `profiles`
+directory of the package.
+
+Every profile is compiled into decoding and encoding tables once, and kept in
+memory, by profile name or file name.  Its sources are only read again when
+the modification time of any of their files changes.  Compiled profiles are
+immutable, and `get_profile()` can be called from many threads.
+"""
+
+
+DEFAULT_PROFILE_NAME = DEFAULT_PROFILE.name
+
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# Compiled profiles, by digest
+_PROFILES = {}
+# Compiled profiles, with the modification times of their source files, by
+# profile name or absolute file name
+_PROFILE_SOURCES = {}
+_PROFILES_LOCK = threading.Lock()
+
+
+class ProfileError(Exception):
+    pass
+
+
+# == Profile Sources ==
+
+def _get_builtin_source():
+    return {
+        'name': DEFAULT_PROFILE_NAME,
+        'map': {
+            '0x%02X' % byte: 'U+%04X' % ord(char)
+            for byte, char in enumerate(zar1_encoding.ZAR1_LEGACY_DECODING_TABLE)
+        },
+        'unmapped': ['0x%02X' % byte for byte in zar1_encoding.ZAR1_UNMAPPED_BYTES],
+    }
+
+def _get_profile_filename(name_or_filename):
+    if name_or_filename.endswith('.json'):
+        return name_or_filename
+    return os.path.join(PROFILES_DIR, name_or_filename + '.json')
+
+def _get_source_mtime(filename):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except OSError:
+        return None
+
+def _load_source(name_or_filename, source_mtimes=None):
+    if name_or_filename == DEFAULT_PROFILE_NAME:
+        return _get_builtin_source()
+    filename = _get_profile_filename(name_or_filename)
+    if source_mtimes is not None:
+        # Taken before reading, so a concurrent change is read again next time
+        source_mtimes[filename] = _get_source_mtime(filename)
+    try:
+        with io.open(filename, encoding='utf8') as profile_file:
+            return json.load(profile_file)
+    except IOError:
+        raise ProfileError("cannot read mapping profile: %s" % name_or_filename)
+    except ValueError as err:
+        raise ProfileError("invalid mapping profile: %s: %s" % (filename, err))
+
+def _parse_int(value, prefix, limit, profile_name):
+    try:
+        if value.upper().startswith(prefix):
+            number = int(value[len(prefix):], 16)
+            if 0 <= number < limit:
+                return number
+    except (AttributeError, ValueError):
+        pass
+    raise ProfileError("invalid value in mapping profile %s: %r" % (profile_name, value))
+
+def resolve_profile_source(name_or_filename, _extended_names=(), _source_mtimes=None):
+    """
+    Load a profile and the profiles it extends, and return its name, mapping
+    (by byte value), and unmapped bytes.
+    """
+    if name_or_filename in _extended_names:
+        raise ProfileError("circular mapping profile: %s" % name_or_filename)
+    source = _load_source(name_or_filename, _source_mtimes)
+    name = source.get('name', name_or_filename)
+
+    mapping = {}
+    unmapped = []
+    if source.get('extends'):
+        _, mapping, unmapped = resolve_profile_source(
+            source['extends'], _extended_names + (name_or_filename,), _source_mtimes,
+        )
+    for byte, codepoint in source.get('map', {}).items():
+        mapping[_parse_int(byte, '0X', 0x100, name)] = _parse_int(codepoint, 'U+', 0x10000, name)
+    if 'unmapped' in source:
+        unmapped = sorted(_parse_int(byte, '0X', 0x100, name) for byte in source['unmapped'])
+    return name, mapping, unmapped
+
+
+# == Compiled Profiles ==
+
+def compile_profile(name, mapping, unmapped):
+    missing = [byte for byte in range(0x100) if byte not in mapping]
+    if missing:
+        raise ProfileError("mapping profile %s has no mapping for byte 0x%02X" % (name, missing[0]))
+    decoding_table = ''.join([
+        chr(mapping[byte]) for byte in range(0x100)
+    ])
+    return MappingProfile(name, decoding_table, bytes(unmapped))
+
+
+def get_profile(profile=None):
+    """
+    Return the compiled mapping profile for a profile name, a profile file
+    name (ending with `.json`), or a `MappingProfile`.  Returns
+    `DEFAULT_PROFILE` for None.
+    """
+    if isinstance(profile, MappingProfile):
+        return profile
+    if profile is None or profile == DEFAULT_PROFILE_NAME:
+        return DEFAULT_PROFILE
+
+    source_key = os.path.abspath(profile) if profile.endswith('.json') else profile
+    with _PROFILES_LOCK:
+        if source_key in _PROFILE_SOURCES:
+            source_mtimes, compiled = _PROFILE_SOURCES[source_key]
+            if all(
+                _get_source_mtime(filename) == mtime
+                for filename, mtime in source_mtimes.items()
+            ):
+                return compiled
+
+    source_mtimes = {}
+    compiled = compile_profile(*resolve_profile_source(profile, _source_mtimes=source_mtimes))
+    with _PROFILES_LOCK:
+        # Profiles with the same mappings are shared
+        compiled = _PROFILES.setdefault(compiled.digest, compiled)
+        _PROFILE_SOURCES[source_key] = (source_mtimes, compiled)
+        return compiled
+
+def get_profile_names():
+    names = [DEFAULT_PROFILE_NAME]
+    if os.path.isdir(PROFILES_DIR):
+        names.extend(sorted(
+            os.path.splitext(filename)[0]
+            for filename in os.listdir(PROFILES_DIR)
+            if filename.endswith('.json')
+        ))
+    return names
@@ -22,18 +22,167 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import sys
+import time
+
+from zarnegar_converter.zar1_profile import get_profile, DEFAULT_PROFILE
 
 
 OUTPUT_NEW_LINE = b'\r\n'
+OUTPUT_NEW_LINE_TEXT = '\r\n'
+
+
+# Registered file types, as (magic number, file class) pairs.  A file type
+# registered with an empty magic number is used as the fallback.
+_FILE_TYPES = []
+
+
+def register_file_type(magic, file_class):
+    _FILE_TYPES.append((magic, file_class))
+    _FILE_TYPES.sort(key=lambda file_type: -len(file_type[0]))
+
+def get_file_type(prefix):
+    for magic, file_class in _FILE_TYPES:
+        if prefix.startswith(magic):
+            return file_class
+    raise ZarFileTypeError("Unknown file type")
+
+def get_magic_size():
+    return max([len(magic) for magic, _ in _FILE_TYPES] + [0])
+
+
+class ParseLimits(object):
+    """
+    Resource limits for parsing untrusted files.  Parsing with limits also
+    validates the structure of the file against its real size, before
+    allocating the lines, and fails with `ZarFileFormatError`.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, max_lines=0xFFFF, max_seconds=1.0):
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.max_seconds = max_seconds
+
+    def get_deadline(self):
+        return time.monotonic() + self.max_seconds
+
+    def check_bytes(self, size):
+        if size > self.max_bytes:
+            raise ZarFileFormatError(
+                'too_large',
+                "File is larger than %d bytes" % self.max_bytes,
+                offset=self.max_bytes,
+            )
+
+    def check_lines(self, lines_count):
+        if lines_count > self.max_lines:
+            raise ZarFileFormatError(
+                'too_many_lines',
+                "File has %d lines, more than %d" % (lines_count, self.max_lines),
+            )
+
+    def check_deadline(self, deadline, offset=None):
+        if time.monotonic() > deadline:
+            raise ZarFileFormatError(
+                'timeout',
+                "Parsing took more than %s seconds" % self.max_seconds,
+                offset=offset,
+            )
+
+
+class PeekableFile(object):
+    """
+    Read-only wrapper for a (possibly non-seekable) binary file, which allows
+    looking at the beginning of the stream without rewinding it afterwards.
+    """
+
+    def __init__(self, in_file):
+        self._file = in_file
+        self._buffer = b''
+
+    @staticmethod
+    def wrap(in_file):
+        if isinstance(in_file, PeekableFile):
+            return in_file
+        return PeekableFile(in_file)
+
+    def _fill(self, size):
+        while len(self._buffer) < size:
+            data = self._file.read(size - len(self._buffer))
+            if not data:
+                break
+            self._buffer += data
+
+    def peek(self, size):
+        self._fill(size)
+        return self._buffer[:size]
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buffer + self._file.read()
+            self._buffer = b''
+            return data
+        self._fill(size)
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+    def readline(self):
+        newline_idx = self._buffer.find(b'\n')
+        if newline_idx >= 0:
+            line = self._buffer[:newline_idx + 1]
+            self._buffer = self._buffer[newline_idx + 1:]
+            return line
+        line = self._buffer + self._file.readline()
+        self._buffer = b''
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b'')
 
 
 class ZarFile(object):
 
+    # Name of the file format, as reported by `scan()`
+    FORMAT = None
+
+    # Compiled mapping profile
+    profile = DEFAULT_PROFILE
+
+    # The files are parsed with the optional `limits`, a `ParseLimits`
+
+    @staticmethod
+    def get(in_file, profile=None, limits=None):
+        # Importing the modules registers their file types
+        from zarnegar_converter import zar1_file
+        in_file = PeekableFile.wrap(in_file)
+        file_class = get_file_type(in_file.peek(get_magic_size()))
+        zar_file = file_class(in_file, limits)
+        zar_file.profile = get_profile(profile)
+        return zar_file
+
+    @staticmethod
+    def from_bytes(data, profile=None, limits=None):
+        # Importing the modules registers their file types
+        from zarnegar_converter import zar1_file
+        file_class = get_file_type(data[:get_magic_size()])
+        zar_file = file_class.from_bytes(data, limits)
+        zar_file.profile = get_profile(profile)
+        return zar_file
+
     @staticmethod
-    def get(in_file):
-        from zarnegar_converter.zar1_file import Zar1File
-        return Zar1File.get(in_file)
+    def scan(in_file):
+        """
+        Return the format, lines count, and text length of a file, reading
+        only its header, or its lines, without decoding them.
+        """
+        # Importing the modules registers their file types
+        from zarnegar_converter import zar1_file
+        in_file = PeekableFile.wrap(in_file)
+        return get_file_type(in_file.peek(get_magic_size()))._scan(in_file)
+
+    @classmethod
+    def _scan(cls, in_file):
+        raise NotImplementedError
 
     # == DEBUG ==
 
@@ -78,6 +227,23 @@ class ZarFile(object):
     def get_unicode_rlo_lines(self):
         raise NotImplementedError
 
+    # == Line Records ==
+
+    def iter_line_records(self):
+        raise NotImplementedError
+
 
 class ZarFileTypeError(Exception):
     pass
+
+
+class ZarFileFormatError(ZarFileTypeError):
+    """
+    Invalid or over-limit file, with the `reason` (a short identifier) and
+    the byte `offset` (if known) of the failure.
+    """
+
+    def __init__(self, reason, message, offset=None):
+        super(ZarFileFormatError, self).__init__(message)
+        self.reason = reason
+        self.offset = offset